@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""Queue-aware poll scheduling for prompts waiting on ComfyUI.
+
+Instead of hitting `/history` every `--poll-seconds`, the waiter reads
+`/queue` (one request shared by every prompt in flight), finds the prompt's
+position and sleeps in proportion to the work still ahead of it:
+
+- pending behind N prompts: about half of N expected runtimes
+- executing: about half of the expected remaining runtime, shrinking to
+  `min_seconds` as the expected finish approaches
+- gone from the queue: `/history` is read for the finished record, so a
+  prompt that is still queued costs one shared `/queue` read per check
+
+Expected runtimes per phase are the median of recent past runs, learned from
+the run manifests already under `books/` (`manifest_index.load_runtimes`
+reads them from the SQLite index instead when there is one).
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import json
+import re
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+RUNTIME_SAMPLES_PER_PHASE = 50
+DEFAULT_MIN_POLL_SECONDS = 0.25
+DEFAULT_MAX_POLL_SECONDS = 30.0
+
+# Run manifests are `<run_id>_<phase>_<prompt_id>.json`; journals, compiled
+# workflows, dry-run and cache-hit files in the same jobs/ dir don't match.
+MANIFEST_NAME_RE = re.compile(
+    r"^(\d{8}T\d{6}Z(?:-\d+)?)_(.+)_([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})\.json$"
+)
+
+
+def parse_utc(value: Any) -> Optional[float]:
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        return dt.datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+
+def execution_window(history_record: Optional[Dict[str, Any]]) -> Tuple[Optional[float], Optional[float]]:
+    """`(started, finished)` epoch seconds from a history record's status messages."""
+    started = finished = None
+    status = (history_record or {}).get("status")
+    messages = status.get("messages") if isinstance(status, dict) else None
+    for item in messages or []:
+        if not isinstance(item, list) or len(item) < 2 or not isinstance(item[1], dict):
+            continue
+        stamp = item[1].get("timestamp")
+        if not isinstance(stamp, (int, float)):
+            continue
+        if item[0] == "execution_start":
+            started = stamp / 1000.0
+        elif item[0] in ("execution_success", "execution_error", "execution_interrupted"):
+            finished = stamp / 1000.0
+    return started, finished
+
+
+def manifest_runtime(manifest: Dict[str, Any]) -> Optional[float]:
+    """Execution seconds for a finished run; falls back to queued -> completed."""
+    history = manifest.get("history")
+    if isinstance(history, dict):
+        started, finished = history.get("execution_started"), history.get("execution_finished")
+    else:
+        started, finished = execution_window(manifest.get("history_record"))
+    if started is not None and finished is not None and finished >= started:
+        return finished - started
+    queued = parse_utc(manifest.get("queued_at_utc"))
+    completed = parse_utc(manifest.get("completed_at_utc"))
+    if queued is None or completed is None or completed < queued:
+        return None
+    return completed - queued
+
+
+def load_phase_runtimes(books_dir: Path, samples: int = RUNTIME_SAMPLES_PER_PHASE) -> Dict[str, List[float]]:
+    """Runtimes of the latest `samples` completed runs per phase across all books."""
+    by_phase: Dict[str, List[Tuple[str, Path]]] = {}
+    for path in books_dir.glob("*/pages/*/jobs/*.json"):
+        match = MANIFEST_NAME_RE.match(path.name)
+        if match:
+            by_phase.setdefault(match.group(2), []).append((match.group(1), path))
+
+    runtimes: Dict[str, List[float]] = {}
+    for phase, entries in by_phase.items():
+        for _, path in sorted(entries, reverse=True)[:samples]:
+            try:
+                with path.open("r", encoding="utf-8") as handle:
+                    manifest = json.load(handle)
+            except (OSError, json.JSONDecodeError):
+                continue
+            if manifest.get("cache_hit") or manifest.get("dry_run"):
+                continue
+            runtime = manifest_runtime(manifest)
+            if runtime is not None:
+                runtimes.setdefault(phase, []).append(runtime)
+    return runtimes
+
+
+def queue_position(queue_payload: Dict[str, Any], prompt_id: str) -> Tuple[str, int]:
+    """`("running", 0)`, `("pending", prompts_ahead)` or `("absent", 0)`."""
+    running = [item for item in queue_payload.get("queue_running") or [] if isinstance(item, list) and len(item) > 1]
+    if any(item[1] == prompt_id for item in running):
+        return "running", 0
+    pending = [item for item in queue_payload.get("queue_pending") or [] if isinstance(item, list) and len(item) > 1]
+    pending.sort(key=lambda item: item[0] if isinstance(item[0], (int, float)) else 0)
+    for idx, item in enumerate(pending):
+        if item[1] == prompt_id:
+            return "pending", len(running) + idx
+    return "absent", 0
+
+
+class PollTracker:
+    """Per-prompt poll bookkeeping, written to the run manifest as `poll_stats`."""
+
+    def __init__(self, mode: str, expected_runtime: Optional[float] = None) -> None:
+        self.mode = mode
+        self.expected_runtime = expected_runtime
+        self.history_polls = 0
+        self.queue_polls = 0
+        self.running_since: Optional[float] = None
+        # Wall-clock twin of running_since, for the run manifest's timing spans.
+        self.running_seen_at: Optional[float] = None
+        self.detected_at: Optional[float] = None
+        self.next_check = 0.0
+        # Monotonic time of the last `/history` read (event mode's fallback recheck).
+        self.history_checked = 0.0
+
+    def due(self, now: float) -> bool:
+        return now >= self.next_check
+
+    def summary(self, history_record: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Poll counts plus `wasted_wait_seconds`: how long the finished prompt sat undetected."""
+        detected_at = time.time() if self.detected_at is None else self.detected_at
+        _, finished = execution_window(history_record)
+        wasted = round(max(0.0, detected_at - finished), 3) if finished is not None else None
+        return {
+            "mode": self.mode,
+            "history_polls": self.history_polls,
+            "queue_polls": self.queue_polls,
+            "expected_runtime_seconds": (
+                round(self.expected_runtime, 3) if self.expected_runtime is not None else None
+            ),
+            "wasted_wait_seconds": wasted,
+        }
+
+
+class AdaptivePoller:
+    """Decides when each in-flight prompt should next be checked.
+
+    `fetch_queue` returns the `/queue` payload; one snapshot is shared by all
+    prompts checked within `min_seconds` of each other.
+    """
+
+    def __init__(
+        self,
+        fetch_queue: Callable[[], Dict[str, Any]],
+        runtimes: Optional[Dict[str, List[float]]] = None,
+        fallback_seconds: float = 2.0,
+        min_seconds: float = DEFAULT_MIN_POLL_SECONDS,
+        max_seconds: float = DEFAULT_MAX_POLL_SECONDS,
+    ) -> None:
+        self.fetch_queue = fetch_queue
+        self.runtimes: Dict[str, List[float]] = {phase: list(v) for phase, v in (runtimes or {}).items()}
+        self.fallback_seconds = fallback_seconds
+        self.min_seconds = min_seconds
+        self.max_seconds = max(max_seconds, min_seconds)
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._snapshot_at = 0.0
+
+    def sibling(self, fetch_queue: Callable[[], Dict[str, Any]]) -> "AdaptivePoller":
+        """A poller for another server's queue that shares this one's runtime history."""
+        other = AdaptivePoller(
+            fetch_queue,
+            fallback_seconds=self.fallback_seconds,
+            min_seconds=self.min_seconds,
+            max_seconds=self.max_seconds,
+        )
+        other.runtimes = self.runtimes
+        return other
+
+    def expected_runtime(self, phase: Optional[str]) -> Optional[float]:
+        samples = self.runtimes.get(phase or "")
+        return statistics.median(samples) if samples else None
+
+    def observe(self, phase: str, runtime: Optional[float]) -> None:
+        """Feed a just-finished run back into the phase's estimate."""
+        if runtime is None:
+            return
+        samples = self.runtimes.setdefault(phase, [])
+        samples.insert(0, runtime)
+        del samples[RUNTIME_SAMPLES_PER_PHASE:]
+
+    def tracker(self, phase: Optional[str]) -> PollTracker:
+        return PollTracker("adaptive", self.expected_runtime(phase))
+
+    def queue_snapshot(self, tracker: PollTracker) -> Dict[str, Any]:
+        now = time.monotonic()
+        if self._snapshot is None or (now - self._snapshot_at) >= self.min_seconds:
+            self._snapshot = self.fetch_queue()
+            self._snapshot_at = now
+        tracker.queue_polls += 1
+        return self._snapshot
+
+    def locate(self, prompt_id: str, tracker: PollTracker) -> Tuple[str, int]:
+        """Queue state of `prompt_id`; `("absent", 0)` if `/queue` can't be read."""
+        try:
+            state, ahead = queue_position(self.queue_snapshot(tracker), prompt_id)
+        except Exception:  # pylint: disable=broad-except
+            return "absent", 0
+        if state == "running" and tracker.running_since is None:
+            tracker.running_since = time.monotonic()
+            tracker.running_seen_at = time.time()
+        return state, ahead
+
+    def delay(self, tracker: PollTracker, state: str, ahead: int) -> float:
+        expected = tracker.expected_runtime
+        if state == "running":
+            if expected is None:
+                delay = self.fallback_seconds
+            else:
+                elapsed = time.monotonic() - (tracker.running_since or time.monotonic())
+                remaining = expected - elapsed
+                # Past the estimate, back off gently in case this run is just slow.
+                delay = remaining / 2.0 if remaining > 0 else min(self.fallback_seconds, -remaining / 10.0)
+        elif state == "pending":
+            per_prompt = expected if expected is not None else self.fallback_seconds
+            delay = max(ahead, 1) * per_prompt / 2.0
+        else:
+            # Not queued yet not in history (e.g. ComfyUI restarted): don't spin.
+            delay = self.fallback_seconds
+        return min(self.max_seconds, max(self.min_seconds, delay))
+
+    def schedule(self, tracker: PollTracker, state: str, ahead: int) -> float:
+        delay = self.delay(tracker, state, ahead)
+        tracker.next_check = time.monotonic() + delay
+        return delay
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""Asyncio-native ComfyUI client for high fan-out orchestration.
+
+Standard library only. Mirrors `ComfyClient` (`queue_prompt`,
+`get_prompt_history`, `fetch_output`) plus `wait` / `run_prompt` coroutines,
+so one process can drive hundreds of outstanding prompts. Two semaphores
+bound the fan-out: `max_connections` caps concurrent HTTP requests (and
+pooled keep-alive sockets), `max_outstanding` caps prompts that
+`run_prompt` keeps queued on the server at once.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import ssl
+import tempfile
+import time
+import urllib.parse
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from comfy_http import DOWNLOAD_CHUNK_BYTES, IDEMPOTENT_METHODS
+from run_page import ComfyApiError, extract_history_record, record_is_complete
+
+
+Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+class AsyncComfyClient:
+    def __init__(
+        self,
+        base_url: str,
+        max_connections: int = 8,
+        max_outstanding: int = 64,
+        request_timeout: float = 60.0,
+    ) -> None:
+        parsed = urllib.parse.urlparse(base_url.rstrip("/"))
+        if parsed.scheme not in ("http", "https"):
+            raise ValueError(f"unsupported URL scheme: {base_url}")
+        self.base_url = base_url.rstrip("/")
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        self.netloc = parsed.netloc
+        self.base_path = parsed.path.rstrip("/")
+        self.ssl_context = ssl.create_default_context() if parsed.scheme == "https" else None
+        self.request_timeout = request_timeout
+        self._request_slots = asyncio.Semaphore(max(1, int(max_connections)))
+        self._prompt_slots = asyncio.Semaphore(max(1, int(max_outstanding)))
+        self._idle: List[Connection] = []
+
+    async def __aenter__(self) -> "AsyncComfyClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+        for _, writer in idle:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    def _checkout(self) -> Optional[Connection]:
+        """An idle pooled connection the server hasn't closed, or None."""
+        while self._idle:
+            conn = self._idle.pop()
+            if not conn[0].at_eof() and not conn[1].is_closing():
+                return conn
+            conn[1].close()
+        return None
+
+    async def _open(self) -> Connection:
+        return await asyncio.open_connection(self.host, self.port, ssl=self.ssl_context)
+
+    @staticmethod
+    async def _read_body(reader: asyncio.StreamReader, headers: Dict[str, str], sink: Any) -> None:
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size_line = await reader.readline()
+                size = int(size_line.split(b";", 1)[0].strip() or b"0", 16)
+                if size == 0:
+                    # Skip trailers up to the terminating blank line.
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    return
+                remaining = size
+                while remaining:
+                    chunk = await reader.read(min(remaining, DOWNLOAD_CHUNK_BYTES))
+                    if not chunk:
+                        raise ConnectionError("connection closed mid-chunk")
+                    sink(chunk)
+                    remaining -= len(chunk)
+                await reader.readexactly(2)
+        elif "content-length" in headers:
+            remaining = int(headers["content-length"])
+            while remaining:
+                chunk = await reader.read(min(remaining, DOWNLOAD_CHUNK_BYTES))
+                if not chunk:
+                    raise ConnectionError("connection closed mid-body")
+                sink(chunk)
+                remaining -= len(chunk)
+        else:
+            while True:
+                chunk = await reader.read(DOWNLOAD_CHUNK_BYTES)
+                if not chunk:
+                    return
+                sink(chunk)
+
+    async def _exchange(
+        self,
+        conn: Connection,
+        method: str,
+        path: str,
+        body: Optional[bytes],
+        headers: Dict[str, str],
+        sink: Any,
+        on_sent: Callable[[], None],
+    ) -> Tuple[int, bool]:
+        reader, writer = conn
+        lines = [f"{method} {self.base_path}{path} HTTP/1.1", f"Host: {self.netloc}"]
+        for name, value in headers.items():
+            lines.append(f"{name}: {value}")
+        lines.append(f"Content-Length: {len(body or b'')}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body or b""))
+        await writer.drain()
+        on_sent()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("server closed keep-alive connection")
+        parts = status_line.decode("latin-1").split(" ", 2)
+        if len(parts) < 2 or not parts[1].isdigit():
+            raise ConnectionError(f"bad HTTP status line: {status_line!r}")
+        status = int(parts[1])
+        resp_headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            resp_headers[name.strip().lower()] = value.strip()
+        await self._read_body(reader, resp_headers, sink)
+        keep_alive = (
+            resp_headers.get("connection", "").lower() != "close"
+            and ("content-length" in resp_headers or "transfer-encoding" in resp_headers)
+            and parts[0] == "HTTP/1.1"
+        )
+        return status, keep_alive
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        sink: Any = None,
+    ) -> Tuple[int, bytes]:
+        chunks: List[bytes] = []
+        received = sent = False
+
+        def write(chunk: bytes) -> None:
+            nonlocal received
+            received = True
+            if sink is None:
+                chunks.append(chunk)
+            else:
+                sink(chunk)
+
+        def mark_sent() -> None:
+            nonlocal sent
+            sent = True
+
+        async with self._request_slots:
+            conn = self._checkout()
+            reused = conn is not None
+            while True:
+                if conn is None:
+                    conn = await asyncio.wait_for(self._open(), self.request_timeout)
+                try:
+                    status, keep_alive = await asyncio.wait_for(
+                        self._exchange(conn, method, path, body, headers or {}, write, mark_sent),
+                        self.request_timeout,
+                    )
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError) as exc:
+                    conn[1].close()
+                    conn = None
+                    # A stale pooled socket is retried once, but a POST that reached the server is not resent.
+                    if not reused or received or (sent and method not in IDEMPOTENT_METHODS):
+                        raise ComfyApiError(f"{method} {path} failed: {exc}") from exc
+                    reused = sent = False
+                except BaseException:
+                    conn[1].close()
+                    raise
+            if keep_alive:
+                self._idle.append(conn)
+            else:
+                conn[1].close()
+        data = b"".join(chunks)
+        if status >= 400:
+            details = data.decode("utf-8", errors="replace")
+            raise ComfyApiError(f"{method} {path} failed: HTTP {status} {details}", status=status)
+        return status, data
+
+    async def _request_json(
+        self, method: str, path: str, payload: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        body = None
+        headers = {}
+        if payload is not None:
+            body = json.dumps(payload).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        try:
+            _, raw = await self._request(method, path, body=body, headers=headers)
+        except (OSError, asyncio.TimeoutError) as exc:
+            raise ComfyApiError(f"{method} {path} failed: {exc!r}") from exc
+        text = raw.decode("utf-8")
+        if not text:
+            return {}
+        try:
+            parsed = json.loads(text)
+        except json.JSONDecodeError as exc:
+            raise ComfyApiError(f"{method} {path} returned non-JSON payload") from exc
+        if not isinstance(parsed, dict):
+            raise ComfyApiError(f"{method} {path} returned non-object JSON")
+        return parsed
+
+    @staticmethod
+    def _view_path(ref: Dict[str, Any]) -> str:
+        query = {
+            "filename": str(ref.get("filename", "")),
+            "subfolder": str(ref.get("subfolder", "")),
+            "type": str(ref.get("type", "output")),
+        }
+        return "/view?" + urllib.parse.urlencode(query)
+
+    async def queue_prompt(self, prompt: Dict[str, Any], client_id: str, front: bool = False) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"prompt": prompt, "client_id": client_id}
+        if front:
+            payload["front"] = True
+        return await self._request_json("POST", "/prompt", payload)
+
+    async def get_prompt_history(self, prompt_id: str) -> Dict[str, Any]:
+        return await self._request_json("GET", f"/history/{prompt_id}")
+
+    async def get_queue(self) -> Dict[str, Any]:
+        return await self._request_json("GET", "/queue")
+
+    async def fetch_output(self, ref: Dict[str, Any]) -> bytes:
+        try:
+            _, data = await self._request("GET", self._view_path(ref))
+        except (OSError, asyncio.TimeoutError) as exc:
+            raise ComfyApiError(f"GET /view failed: {exc!r}") from exc
+        return data
+
+    async def download_output(self, ref: Dict[str, Any], target: Path) -> Dict[str, Any]:
+        """Stream one output into `target` (temp file + atomic rename) with its SHA-256."""
+        target.parent.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp_name = tempfile.mkstemp(prefix=f".{target.name}.", suffix=".part", dir=str(target.parent))
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as handle:
+
+                def sink(chunk: bytes) -> None:
+                    nonlocal size
+                    handle.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+
+                try:
+                    await self._request("GET", self._view_path(ref), sink=sink)
+                except (OSError, asyncio.TimeoutError) as exc:
+                    raise ComfyApiError(f"GET /view failed: {exc!r}") from exc
+            os.chmod(tmp_name, 0o644)
+            os.replace(tmp_name, target)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+        return {"path": str(target), "bytes": size, "sha256": digest.hexdigest()}
+
+    async def wait(
+        self,
+        prompt_id: str,
+        timeout_seconds: float = 1800.0,
+        poll_seconds: float = 2.0,
+    ) -> Dict[str, Any]:
+        """Poll `/history` until `prompt_id` finishes; returns its history record."""
+        start = time.monotonic()
+        while True:
+            history_payload = await self.get_prompt_history(prompt_id)
+            record = extract_history_record(history_payload, prompt_id)
+            if record and record_is_complete(record, prompt_id):
+                return record
+            if (time.monotonic() - start) > timeout_seconds:
+                raise TimeoutError(f"timed out waiting for prompt {prompt_id}")
+            await asyncio.sleep(poll_seconds)
+
+    async def run_prompt(
+        self,
+        prompt: Dict[str, Any],
+        client_id: str,
+        timeout_seconds: float = 1800.0,
+        poll_seconds: float = 2.0,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Queue and wait for one prompt under the `max_outstanding` bound."""
+        async with self._prompt_slots:
+            response = await self.queue_prompt(prompt, client_id)
+            prompt_id = response.get("prompt_id")
+            if not isinstance(prompt_id, str) or not prompt_id:
+                raise ComfyApiError(f"ComfyUI did not return prompt_id: {response}")
+            record = await self.wait(prompt_id, timeout_seconds=timeout_seconds, poll_seconds=poll_seconds)
+            return prompt_id, record
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""Bounded keep-alive HTTP connection pool for ComfyUI API calls."""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import http.client
+import os
+import select
+import tempfile
+import threading
+import urllib.parse
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+# Errors that mean a kept-alive socket was closed under us; safe to retry once on a fresh one
+# if the request never reached the server, or if repeating it is harmless.
+RESET_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    ConnectionAbortedError,
+    BrokenPipeError,
+)
+IDEMPOTENT_METHODS = ("GET", "HEAD")
+
+
+def is_stale(sock: Any) -> bool:
+    """True if an idle keep-alive socket was closed by the server (readable means EOF or junk)."""
+    if sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+class HttpStatusError(RuntimeError):
+    """Raised for HTTP responses with status >= 400."""
+
+    def __init__(self, method: str, path: str, status: int, body: bytes) -> None:
+        self.method = method
+        self.path = path
+        self.status = status
+        self.body = body
+        details = body.decode("utf-8", errors="replace")
+        super().__init__(f"{method} {path} failed: HTTP {status} {details}")
+
+
+class ResponseLostError(ConnectionError):
+    """A non-idempotent request was sent but no response came back; the server may have acted on it."""
+
+    def __init__(self, method: str, path: str, cause: BaseException) -> None:
+        super().__init__(f"{method} {path}: no response after the request was sent ({cause!r})")
+        self.method = method
+        self.path = path
+
+
+class ConnectionPool:
+    """Thread-safe pool of persistent `http.client` connections to one origin.
+
+    At most `max_size` connections exist at once; callers block until one is
+    free. Idle connections are reused (HTTP/1.1 keep-alive) and transparently
+    re-opened if the server reset them between requests. A POST that reached
+    the server is never resent, since `/prompt` would queue a second render.
+    """
+
+    def __init__(self, base_url: str, max_size: int = 4, timeout: float = 60.0) -> None:
+        parsed = urllib.parse.urlparse(base_url.rstrip("/"))
+        if parsed.scheme not in ("http", "https"):
+            raise ValueError(f"unsupported URL scheme: {base_url}")
+        self.scheme = parsed.scheme
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port
+        self.netloc = parsed.netloc
+        self.base_path = parsed.path.rstrip("/")
+        self.timeout = timeout
+        self.max_size = max(1, int(max_size))
+        # Plain (not bounded) so `grow` can add slots.
+        self._slots = threading.Semaphore(self.max_size)
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    def grow(self, max_size: int) -> None:
+        """Allow up to `max_size` concurrent connections; never shrinks."""
+        with self._lock:
+            extra = int(max_size) - self.max_size
+            if extra <= 0:
+                return
+            self.max_size += extra
+        self._slots.release(extra)
+
+    def _new_connection(self, timeout: float) -> http.client.HTTPConnection:
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _checkout(self) -> Tuple[Optional[http.client.HTTPConnection], bool]:
+        self._slots.acquire()
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                return None, False
+            # Drop sockets the server closed while idle rather than find out after sending on them.
+            if not is_stale(conn.sock):
+                return conn, True
+            conn.close()
+
+    def _checkin(self, conn: Optional[http.client.HTTPConnection], reusable: bool) -> None:
+        try:
+            if conn is not None:
+                if reusable:
+                    with self._lock:
+                        self._idle.append(conn)
+                else:
+                    conn.close()
+        finally:
+            self._slots.release()
+
+    @contextlib.contextmanager
+    def stream(
+        self,
+        method: str,
+        path: str,
+        body: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+    ) -> Iterator[http.client.HTTPResponse]:
+        """Send a request and yield the unread response.
+
+        The connection goes back to the pool only if the caller consumed the
+        whole body; otherwise it is closed.
+        """
+        method = method.upper()
+        timeout = self.timeout if timeout is None else timeout
+        # Stream bodies can only be resent on a stale socket if they can be rewound.
+        rewind_to = body.tell() if hasattr(body, "seek") and hasattr(body, "tell") else None
+        conn, reused = self._checkout()
+        resp: Optional[http.client.HTTPResponse] = None
+        try:
+            while True:
+                sent = False
+                if conn is None:
+                    conn = self._new_connection(timeout)
+                    reused = False
+                elif conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                try:
+                    conn.request(method, self.base_path + path, body=body, headers=headers or {})
+                    sent = True
+                    resp = conn.getresponse()
+                    break
+                except RESET_ERRORS as exc:
+                    conn.close()
+                    conn = None
+                    # Once the request went out the server may have acted on it, so only idempotent
+                    # methods are resent. Only a stale reused socket is retried; a fresh one failing is real.
+                    if sent and method not in IDEMPOTENT_METHODS:
+                        raise ResponseLostError(method, path, exc) from exc
+                    if not reused:
+                        raise
+                    if rewind_to is not None:
+                        body.seek(rewind_to)
+                    elif body is not None and not isinstance(body, (bytes, bytearray)):
+                        raise
+                except (OSError, http.client.HTTPException) as exc:
+                    # E.g. a read timeout on POST /prompt: the prompt may be queued even though we never heard.
+                    if sent and method not in IDEMPOTENT_METHODS:
+                        raise ResponseLostError(method, path, exc) from exc
+                    raise
+            yield resp
+        except BaseException:
+            self._checkin(conn, reusable=False)
+            raise
+        else:
+            reusable = resp is not None and resp.isclosed() and not resp.will_close
+            if resp is not None and not resp.isclosed():
+                resp.close()
+            self._checkin(conn, reusable=reusable)
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        body: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+    ) -> Tuple[int, bytes]:
+        """Send a request and return `(status, body)`; raises HttpStatusError for >= 400."""
+        with self.stream(method, path, body=body, headers=headers, timeout=timeout) as resp:
+            data = resp.read()
+            status = resp.status
+        if status >= 400:
+            raise HttpStatusError(method.upper(), path, status, data)
+        return status, data
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+class MultipartFileBody:
+    """Seekable `multipart/form-data` body that streams one file from disk.
+
+    Pass it as the request body with `headers()`; `http.client` reads it in
+    blocks, so the file is never loaded into memory.
+    """
+
+    def __init__(
+        self,
+        fields: Dict[str, str],
+        file_field: str,
+        file_path: Path,
+        filename: str,
+        content_type: str = "application/octet-stream",
+    ) -> None:
+        self.boundary = uuid.uuid4().hex
+        parts = []
+        for name, value in fields.items():
+            parts.append(
+                f"--{self.boundary}\r\n"
+                f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                f"{value}\r\n"
+            )
+        parts.append(
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        )
+        self._head = "".join(parts).encode("utf-8")
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+        self._file = open(file_path, "rb", buffering=0)  # pylint: disable=consider-using-with
+        self._file_size = os.fstat(self._file.fileno()).st_size
+        self.content_length = len(self._head) + self._file_size + len(self._tail)
+        self._pos = 0
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "Content-Type": f"multipart/form-data; boundary={self.boundary}",
+            "Content-Length": str(self.content_length),
+        }
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, pos: int) -> int:
+        self._pos = max(0, min(pos, self.content_length))
+        self._file.seek(max(0, min(self._pos - len(self._head), self._file_size)))
+        return self._pos
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.content_length - self._pos
+        head_end = len(self._head)
+        file_end = head_end + self._file_size
+        out = []
+        while size > 0 and self._pos < self.content_length:
+            if self._pos < head_end:
+                chunk = self._head[self._pos : self._pos + size]
+            elif self._pos < file_end:
+                chunk = self._file.read(min(size, file_end - self._pos))
+                if not chunk:
+                    raise OSError(f"{self._file.name} shrank during upload")
+            else:
+                offset = self._pos - file_end
+                chunk = self._tail[offset : offset + size]
+            out.append(chunk)
+            self._pos += len(chunk)
+            size -= len(chunk)
+        return b"".join(out)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "MultipartFileBody":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def download_to_file(
+    pool: ConnectionPool,
+    path: str,
+    target: Path,
+    timeout: Optional[float] = None,
+    chunk_size: int = DOWNLOAD_CHUNK_BYTES,
+) -> Dict[str, Any]:
+    """Stream a GET response into `target` without buffering it in memory.
+
+    Data goes to a temp file in the target directory that is atomically
+    renamed on success, so readers never see a partial output. The SHA-256
+    is computed on the fly. Returns `{"path", "bytes", "sha256"}`.
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{target.name}.", suffix=".part", dir=str(target.parent))
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            with pool.stream("GET", path, timeout=timeout) as resp:
+                if resp.status >= 400:
+                    raise HttpStatusError("GET", path, resp.status, resp.read())
+                while True:
+                    chunk = resp.read(chunk_size)
+                    if not chunk:
+                        break
+                    handle.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+        # mkstemp creates 0600 files; outputs should be readable like a plain write.
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, target)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp_name)
+        raise
+    return {"path": str(target), "bytes": size, "sha256": digest.hexdigest()}
+
+
+_POOLS: Dict[Tuple[str, str], ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def pool_for_url(url: str, max_size: int = 4, timeout: float = 60.0) -> Tuple[ConnectionPool, str]:
+    """Return the shared pool for `url`'s origin and the path+query to request on it.
+
+    A later call asking for a larger `max_size` grows the existing pool.
+    """
+    parsed = urllib.parse.urlparse(url)
+    key = (parsed.scheme, parsed.netloc)
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = ConnectionPool(f"{parsed.scheme}://{parsed.netloc}", max_size=max_size, timeout=timeout)
+            _POOLS[key] = pool
+    pool.grow(max_size)
+    path = parsed.path or "/"
+    if parsed.query:
+        path += "?" + parsed.query
+    return pool, path
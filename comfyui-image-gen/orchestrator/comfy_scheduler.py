@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""Least-loaded dispatch of compiled workflows across several ComfyUI servers.
+
+Each server is probed with `/queue` (prompts running + pending) and
+`/system_stats` (free VRAM), and `/object_info` once so workflows are only
+sent where every node class and model file they name exists. A server that
+fails a request is drained for `drain_seconds`; its jobs go elsewhere.
+`dispatch` can be told to favour a server that already has a job's models
+loaded when it is nearly as idle as the least-loaded one.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+
+DEFAULT_PROBE_SECONDS = 5.0
+DEFAULT_DRAIN_SECONDS = 60.0
+
+
+class NoServerError(RuntimeError):
+    """Raised by `dispatch` when no healthy, compatible server is left to try."""
+
+
+def split_urls(values: Optional[Iterable[str]], default: str) -> List[str]:
+    """Flatten repeated and comma-separated `--comfy-url` values, keeping order."""
+    urls: List[str] = []
+    for value in values or [default]:
+        for url in str(value).split(","):
+            url = url.strip().rstrip("/")
+            if url and url not in urls:
+                urls.append(url)
+    return urls
+
+
+def is_server_error(exc: BaseException) -> bool:
+    """True for failures that say the server is unwell (transport, 5xx).
+
+    Only client errors carrying a `status` (None for transport failures) count;
+    a rejected workflow (4xx) or a local error such as a failed journal write
+    is not the server's fault.
+    """
+    if not hasattr(exc, "status"):
+        return False
+    status = getattr(exc, "status")
+    return status is None or status >= 500
+
+
+def is_ambiguous(exc: BaseException) -> bool:
+    """True if the request reached the server without an answer, so it may already be queued there."""
+    return bool(getattr(exc, "ambiguous", False))
+
+
+def summarize_object_info(object_info: Dict[str, Any]) -> Dict[str, Dict[str, Set[str]]]:
+    """`{class_type: {input_name: allowed values}}` for combo inputs (model files etc.).
+
+    Upload-backed combos such as `LoadImage.image` are left out: their lists
+    change whenever a file is uploaded.
+    """
+    summary: Dict[str, Dict[str, Set[str]]] = {}
+    for class_type, info in object_info.items():
+        combos: Dict[str, Set[str]] = {}
+        inputs = info.get("input") if isinstance(info, dict) else None
+        for section in ("required", "optional"):
+            for name, spec in ((inputs or {}).get(section) or {}).items():
+                if not isinstance(spec, list) or not spec or not isinstance(spec[0], list):
+                    continue
+                options = spec[1] if len(spec) > 1 and isinstance(spec[1], dict) else {}
+                if any(key.endswith("upload") for key in options):
+                    continue
+                combos[name] = {str(value) for value in spec[0]}
+        summary[class_type] = combos
+    return summary
+
+
+def workflow_incompatibility(
+    workflow: Dict[str, Any], node_info: Dict[str, Dict[str, Set[str]]]
+) -> Optional[str]:
+    """Why `workflow` can't run on a server with `node_info`, or None if it can."""
+    for node_id, node in workflow.items():
+        if not isinstance(node, dict):
+            continue
+        class_type = node.get("class_type")
+        if class_type not in node_info:
+            return f"node {node_id}: unknown class_type {class_type!r}"
+        combos = node_info[class_type]
+        for name, value in (node.get("inputs") or {}).items():
+            if isinstance(value, str) and name in combos and value not in combos[name]:
+                return f"node {node_id}: {name}={value!r} not available"
+    return None
+
+
+class ServerState:
+    def __init__(self, url: str, client: Any) -> None:
+        self.url = url
+        self.client = client
+        self.queue_remaining = 0
+        self.vram_free: Optional[int] = None
+        self.node_info: Optional[Dict[str, Dict[str, Set[str]]]] = None
+        self.probed_at = 0.0
+        self.drained_until = 0.0
+        self.last_error: Optional[str] = None
+        self.dispatched = 0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.drained_until
+
+    def load_key(self) -> Tuple[int, float]:
+        """Sort key: shortest queue first, then most free VRAM."""
+        return self.queue_remaining, -(self.vram_free or 0)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "queue_remaining": self.queue_remaining,
+            "vram_free": self.vram_free,
+            "dispatched": self.dispatched,
+            "last_error": self.last_error,
+        }
+
+
+class ComfyScheduler:
+    """Pick a server per job and submit there, retrying on other servers if one fails.
+
+    `client_factory(url)` builds the per-server client (`run_page.ComfyClient`).
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        client_factory: Callable[[str], Any],
+        probe_seconds: float = DEFAULT_PROBE_SECONDS,
+        drain_seconds: float = DEFAULT_DRAIN_SECONDS,
+        check_compat: bool = True,
+    ) -> None:
+        if not urls:
+            raise ValueError("at least one ComfyUI URL is required")
+        self.servers = [ServerState(url, client_factory(url)) for url in urls]
+        self.by_url = {server.url: server for server in self.servers}
+        self.probe_seconds = probe_seconds
+        self.drain_seconds = drain_seconds
+        # Compatibility only matters when there is a choice of server.
+        self.check_compat = check_compat and len(self.servers) > 1
+
+    def client_for(self, url: Optional[str]) -> Any:
+        server = self.by_url.get((url or "").rstrip("/"))
+        return (server or self.servers[0]).client
+
+    def healthy_count(self) -> int:
+        return sum(1 for server in self.servers if server.healthy)
+
+    def drain(self, url: str, reason: Any) -> None:
+        server = self.by_url.get(url)
+        if server is None:
+            return
+        server.drained_until = time.monotonic() + self.drain_seconds
+        server.last_error = str(reason)
+        server.probed_at = 0.0
+
+    def probe(self, server: ServerState) -> bool:
+        try:
+            queue = server.client.get_queue()
+            stats = server.client.get_system_stats()
+            if self.check_compat and server.node_info is None:
+                server.node_info = summarize_object_info(server.client.get_object_info())
+        except Exception as exc:  # pylint: disable=broad-except
+            self.drain(server.url, exc)
+            return False
+        server.queue_remaining = len(queue.get("queue_running") or []) + len(queue.get("queue_pending") or [])
+        devices = stats.get("devices") or []
+        free = [dev.get("vram_free") for dev in devices if isinstance(dev, dict)]
+        server.vram_free = max((v for v in free if isinstance(v, (int, float))), default=None)
+        server.probed_at = time.monotonic()
+        server.drained_until = 0.0
+        return True
+
+    def ranked(self) -> List[ServerState]:
+        """Healthy servers by last known load, without probing."""
+        ready = [server for server in self.servers if server.healthy]
+        return sorted(ready, key=ServerState.load_key)
+
+    def candidates(self, workflow: Dict[str, Any], exclude: Iterable[str] = ()) -> List[ServerState]:
+        """Healthy, compatible servers for `workflow`, least loaded first."""
+        skip = set(exclude)
+        now = time.monotonic()
+        ready = []
+        for server in self.servers:
+            if server.url in skip or not server.healthy:
+                continue
+            if now - server.probed_at >= self.probe_seconds and not self.probe(server):
+                continue
+            if self.check_compat and server.node_info is not None:
+                if workflow_incompatibility(workflow, server.node_info) is not None:
+                    continue
+            ready.append(server)
+        return sorted(ready, key=ServerState.load_key)
+
+    def dispatch(
+        self,
+        job: Dict[str, Any],
+        submit: Callable[[Any, Dict[str, Any]], str],
+        prefer: Optional[Callable[[str], bool]] = None,
+        slack: int = 1,
+        exclude: Iterable[str] = (),
+    ) -> str:
+        """Submit `job` with `submit(client, job)` on the least-loaded server that accepts it.
+
+        A server for which `prefer(url)` is true wins if its queue is at most
+        `slack` prompts longer than the least-loaded one. Servers in `exclude`
+        (e.g. already at their in-flight bound) are skipped. Only server
+        failures move on to the next server; anything else is re-raised, as is
+        a failure after the prompt may already have been queued (`is_ambiguous`).
+        """
+        tried: List[str] = list(exclude)
+        errors: List[str] = []
+        while True:
+            ready = self.candidates(job["compiled_workflow"], exclude=tried)
+            if not ready:
+                detail = "; ".join(errors) or "no healthy server can run this workflow"
+                raise NoServerError(f"no ComfyUI server accepted the job: {detail}")
+            server = ready[0]
+            if prefer is not None:
+                server = next(
+                    (s for s in ready if s.queue_remaining <= server.queue_remaining + slack and prefer(s.url)),
+                    server,
+                )
+            tried.append(server.url)
+            try:
+                prompt_id = submit(server.client, job)
+            except Exception as exc:  # pylint: disable=broad-except
+                if not is_server_error(exc):
+                    raise
+                self.drain(server.url, exc)
+                if is_ambiguous(exc):
+                    raise
+                errors.append(f"{server.url}: {exc}")
+                continue
+            server.queue_remaining += 1
+            server.dispatched += 1
+            job["comfy_url"] = server.url
+            return prompt_id
+
+    def release(self, url: Optional[str]) -> None:
+        """A prompt dispatched to `url` left its queue; keeps load estimates current between probes."""
+        server = self.by_url.get(url or "")
+        if server is not None and server.queue_remaining > 0:
+            server.queue_remaining -= 1
+
+    def report(self) -> List[Dict[str, Any]]:
+        return [server.as_dict() for server in self.servers]
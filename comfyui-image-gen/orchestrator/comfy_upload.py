@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Content-addressed source image uploads through ComfyUI's `/upload/image`.
+
+Uploaded files are named after their SHA-256 (`src_<hash>.png`), so the same
+draft always maps to the same server-side name. A per-books-dir index
+(`<books_dir>/.comfy_uploads.json`) remembers which hashes each server already
+holds; repeated phases on the same source only send a `HEAD /view` to confirm
+the file is still there instead of re-uploading it. Because the name is known
+before anything is sent, workflows compile (and cache-hit) without a server.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import datetime as dt
+import fcntl
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+
+UPLOAD_INDEX_VERSION = 1
+UPLOAD_INDEX_NAME = ".comfy_uploads.json"
+UPLOAD_NAME_PREFIX = "src_"
+
+
+def upload_name_for(source: Path, sha256: str) -> str:
+    """Server-side input filename for a source image with digest `sha256`."""
+    return f"{UPLOAD_NAME_PREFIX}{sha256[:32]}{source.suffix.lower()}"
+
+
+def input_ref_name(name: str, subfolder: str = "") -> str:
+    """Name as LoadImage expects it: `subfolder/name` when uploaded into a subfolder."""
+    return f"{subfolder}/{name}" if subfolder else name
+
+
+class UploadIndex:
+    """JSON record of uploaded hashes per server: `{servers: {url: {sha256: ref}}}`.
+
+    Updates are read, changed and atomically replaced under an flock on
+    `<path>.lock`, so concurrent runs sharing a books dir merge their entries.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[None]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(f"{self.path}.lock", "a", encoding="utf-8") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            yield
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            with self.path.open("r", encoding="utf-8") as handle:
+                payload = json.load(handle)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"version": UPLOAD_INDEX_VERSION, "servers": {}}
+        if not isinstance(payload.get("servers"), dict):
+            payload["servers"] = {}
+        return payload
+
+    def _save(self, payload: Dict[str, Any]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(prefix=f".{self.path.name}.", suffix=".tmp", dir=str(self.path.parent))
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                json.dump(payload, handle, indent=2, ensure_ascii=True, sort_keys=True)
+                handle.write("\n")
+            os.replace(tmp_name, self.path)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+
+    def get(self, server: str, sha256: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._load()["servers"].get(server, {}).get(sha256)
+
+    def put(self, server: str, sha256: str, ref: Dict[str, Any]) -> None:
+        # Re-read under the lock so concurrent runs sharing the file merge instead of clobbering.
+        with self._locked():
+            payload = self._load()
+            payload["servers"].setdefault(server, {})[sha256] = ref
+            self._save(payload)
+
+    def forget(self, server: str, sha256: str) -> None:
+        with self._locked():
+            payload = self._load()
+            if payload["servers"].get(server, {}).pop(sha256, None) is not None:
+                self._save(payload)
+
+
+class SourceUploader:
+    """Make local source images available as ComfyUI inputs, uploading each at most once per server.
+
+    `client` arguments are `run_page.ComfyClient` instances (anything with
+    `base_url`, `upload_image` and `has_input`).
+    """
+
+    def __init__(self, index: UploadIndex, subfolder: str = "") -> None:
+        self.index = index
+        self.subfolder = subfolder
+
+    def name_for(self, source: Path, sha256: str) -> str:
+        """The LoadImage name `ensure` will make available; known before any upload."""
+        return input_ref_name(upload_name_for(source, sha256), self.subfolder)
+
+    def ensure(self, client: Any, source: Path, sha256: str) -> Dict[str, Any]:
+        """Upload `source` unless `client`'s server already holds it; returns `{server, name, transferred}`."""
+        server = client.base_url
+        name = upload_name_for(source, sha256)
+        known = self.index.get(server, sha256)
+        if known is not None:
+            known_name = str(known.get("name") or name)
+            known_subfolder = str(known.get("subfolder") or "")
+            if client.has_input(known_name, known_subfolder):
+                return {"server": server, "name": input_ref_name(known_name, known_subfolder), "transferred": False}
+            # The server's input dir was cleaned since we last uploaded.
+            self.index.forget(server, sha256)
+
+        response = client.upload_image(source, name, subfolder=self.subfolder)
+        uploaded_name = str(response.get("name") or name)
+        uploaded_subfolder = str(response.get("subfolder") or "")
+        self.index.put(
+            server,
+            sha256,
+            {
+                "name": uploaded_name,
+                "subfolder": uploaded_subfolder,
+                "type": str(response.get("type") or "input"),
+                "bytes": source.stat().st_size,
+                "uploaded_at_utc": dt.datetime.now(dt.timezone.utc).isoformat(),
+            },
+        )
+        return {"server": server, "name": input_ref_name(uploaded_name, uploaded_subfolder), "transferred": True}
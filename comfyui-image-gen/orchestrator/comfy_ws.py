@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""Minimal ComfyUI websocket listener for event-driven prompt completion.
+
+Standard library only: performs the RFC 6455 handshake on `/ws?clientId=...`
+and tracks `execution_start` / `executing` / `executed` / `execution_success` /
+`execution_error` / `execution_interrupted` events per prompt id.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import os
+import socket
+import ssl
+import struct
+import threading
+import time
+import urllib.parse
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+TERMINAL_STATES = ("success", "error", "interrupted")
+
+OP_CONT = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+class WebSocketError(RuntimeError):
+    """Raised when the websocket handshake or framing fails."""
+
+
+def ws_url(base_url: str, client_id: str) -> str:
+    parsed = urllib.parse.urlparse(base_url.rstrip("/"))
+    scheme = "wss" if parsed.scheme == "https" else "ws"
+    query = urllib.parse.urlencode({"clientId": client_id})
+    return f"{scheme}://{parsed.netloc}{parsed.path}/ws?{query}"
+
+
+class ComfyEventListener:
+    """Background reader for ComfyUI execution events of one client id.
+
+    Connect before queueing prompts with the same `client_id`; events that
+    arrive before anyone waits are kept, so fast prompts are never missed.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        client_id: str,
+        connect_timeout: float = 10.0,
+        condition: Optional[threading.Condition] = None,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.client_id = client_id
+        self.connect_timeout = connect_timeout
+        self._sock: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+        # A shared condition lets ListenerGroup wake on events from any server.
+        self._cond = condition or threading.Condition()
+        self._connected = False
+        self._buffer = b""
+        self._prompts: Dict[str, Dict[str, Any]] = {}
+        self.last_error: Optional[str] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._connected
+
+    def connected_for(self, base_url: str) -> bool:
+        """True while events for prompts on `base_url` can arrive (its socket is this one, and up)."""
+        return self._connected and base_url.rstrip("/") == self.base_url
+
+    def start(self) -> bool:
+        """Connect and start the reader thread. Returns False if the socket can't be opened."""
+        try:
+            self._sock = self._handshake()
+        except (OSError, WebSocketError) as exc:
+            self.last_error = str(exc)
+            return False
+        self._connected = True
+        self._thread = threading.Thread(target=self._reader, name="comfy-ws", daemon=True)
+        self._thread.start()
+        return True
+
+    def close(self) -> None:
+        sock = self._sock
+        self._sock = None
+        if sock is not None:
+            try:
+                self._send_frame(sock, OP_CLOSE, b"")
+            except OSError:
+                pass
+            try:
+                sock.close()
+            except OSError:
+                pass
+        with self._cond:
+            self._connected = False
+            self._cond.notify_all()
+
+    def __enter__(self) -> "ComfyEventListener":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def status(self, prompt_id: str) -> Optional[str]:
+        with self._cond:
+            state = self._prompts.get(prompt_id)
+            return state.get("status") if state else None
+
+    def timeline(self, prompt_id: str) -> Dict[str, Any]:
+        with self._cond:
+            return dict(self._prompts.get(prompt_id, {}))
+
+    def error_message(self, prompt_id: str) -> Optional[str]:
+        with self._cond:
+            state = self._prompts.get(prompt_id, {})
+            return state.get("error")
+
+    def wait(self, prompt_ids: Iterable[str], timeout: float) -> bool:
+        """Block until any of `prompt_ids` reaches a terminal state.
+
+        Returns False on timeout or if the connection drops, so callers can
+        fall back to `/history` polling.
+        """
+        ids = list(prompt_ids)
+        deadline = time.monotonic() + max(0.0, timeout)
+        with self._cond:
+            while True:
+                if any(self._prompts.get(pid, {}).get("status") in TERMINAL_STATES for pid in ids):
+                    return True
+                remaining = deadline - time.monotonic()
+                if not self._connected or remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+
+    def _handshake(self) -> socket.socket:
+        parsed = urllib.parse.urlparse(ws_url(self.base_url, self.client_id))
+        secure = parsed.scheme == "wss"
+        host = parsed.hostname or "127.0.0.1"
+        port = parsed.port or (443 if secure else 80)
+        sock = socket.create_connection((host, port), timeout=self.connect_timeout)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+        key = base64.b64encode(os.urandom(16)).decode("ascii")
+        request = (
+            f"GET {parsed.path}?{parsed.query} HTTP/1.1\r\n"
+            f"Host: {parsed.netloc}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n"
+            "\r\n"
+        )
+        sock.sendall(request.encode("ascii"))
+        head = b""
+        while b"\r\n\r\n" not in head:
+            chunk = sock.recv(4096)
+            if not chunk:
+                sock.close()
+                raise WebSocketError("connection closed during websocket handshake")
+            head += chunk
+            if len(head) > 65536:
+                sock.close()
+                raise WebSocketError("oversized websocket handshake response")
+        header_blob, self._buffer = head.split(b"\r\n\r\n", 1)
+        lines = header_blob.decode("latin-1").split("\r\n")
+        if " 101 " not in f"{lines[0]} ":
+            sock.close()
+            raise WebSocketError(f"websocket upgrade refused: {lines[0]}")
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        expected = base64.b64encode(hashlib.sha1((key + WS_GUID).encode("ascii")).digest()).decode("ascii")
+        if headers.get("sec-websocket-accept") != expected:
+            sock.close()
+            raise WebSocketError("websocket handshake returned a bad Sec-WebSocket-Accept")
+        sock.settimeout(None)
+        return sock
+
+    def _recv_exact(self, sock: socket.socket, size: int) -> bytes:
+        while len(self._buffer) < size:
+            chunk = sock.recv(max(65536, size - len(self._buffer)))
+            if not chunk:
+                raise ConnectionError("websocket closed by server")
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def _read_frame(self, sock: socket.socket) -> Tuple[bool, int, bytes]:
+        b0, b1 = self._recv_exact(sock, 2)
+        fin = bool(b0 & 0x80)
+        opcode = b0 & 0x0F
+        length = b1 & 0x7F
+        if length == 126:
+            (length,) = struct.unpack("!H", self._recv_exact(sock, 2))
+        elif length == 127:
+            (length,) = struct.unpack("!Q", self._recv_exact(sock, 8))
+        mask = self._recv_exact(sock, 4) if b1 & 0x80 else None
+        payload = self._recv_exact(sock, length)
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return fin, opcode, payload
+
+    @staticmethod
+    def _send_frame(sock: socket.socket, opcode: int, payload: bytes) -> None:
+        # Client-to-server frames must be masked (RFC 6455 section 5.3).
+        mask = os.urandom(4)
+        header = bytes([0x80 | opcode])
+        if len(payload) < 126:
+            header += bytes([0x80 | len(payload)])
+        elif len(payload) < 65536:
+            header += bytes([0x80 | 126]) + struct.pack("!H", len(payload))
+        else:
+            header += bytes([0x80 | 127]) + struct.pack("!Q", len(payload))
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        sock.sendall(header + mask + masked)
+
+    def _reader(self) -> None:
+        sock = self._sock
+        fragments: List[bytes] = []
+        fragment_op = None
+        try:
+            while sock is not None:
+                fin, opcode, payload = self._read_frame(sock)
+                if opcode == OP_PING:
+                    self._send_frame(sock, OP_PONG, payload)
+                    continue
+                if opcode == OP_CLOSE:
+                    break
+                if opcode in (OP_TEXT, OP_BINARY):
+                    fragment_op, fragments = opcode, [payload]
+                elif opcode == OP_CONT:
+                    fragments.append(payload)
+                else:
+                    continue
+                if not fin:
+                    continue
+                # Binary frames carry preview images; only text frames are events.
+                if fragment_op == OP_TEXT:
+                    self._handle_message(b"".join(fragments))
+                fragments, fragment_op = [], None
+        except (OSError, ConnectionError, ValueError) as exc:
+            if self._sock is not None:
+                self.last_error = str(exc)
+        finally:
+            with self._cond:
+                self._connected = False
+                self._cond.notify_all()
+
+    def _handle_message(self, raw: bytes) -> None:
+        try:
+            message = json.loads(raw.decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return
+        if not isinstance(message, dict):
+            return
+        data = message.get("data")
+        if not isinstance(data, dict):
+            return
+        prompt_id = data.get("prompt_id")
+        if not isinstance(prompt_id, str) or not prompt_id:
+            return
+        kind = message.get("type")
+        now = time.time()
+        with self._cond:
+            state = self._prompts.setdefault(prompt_id, {"status": "queued"})
+            if kind == "execution_start":
+                state["status"] = "running"
+                state.setdefault("started_at", now)
+            elif kind == "executing":
+                if data.get("node") is None:
+                    state["status"] = "success" if state.get("status") != "error" else "error"
+                    state.setdefault("finished_at", now)
+                else:
+                    state.setdefault("started_at", now)
+                    if state.get("status") == "queued":
+                        state["status"] = "running"
+            elif kind == "executed":
+                state["executed_nodes"] = state.get("executed_nodes", 0) + 1
+            elif kind == "execution_success":
+                state["status"] = "success"
+                state.setdefault("finished_at", now)
+            elif kind == "execution_error":
+                state["status"] = "error"
+                state["error"] = str(
+                    data.get("exception_message") or data.get("exception_type") or "execution_error"
+                )
+                state.setdefault("finished_at", now)
+            elif kind == "execution_interrupted":
+                state["status"] = "interrupted"
+                state.setdefault("finished_at", now)
+            else:
+                return
+            self._cond.notify_all()
+
+
+class ListenerGroup:
+    """One `ComfyEventListener` per ComfyUI server behind the single-listener interface.
+
+    `status`, `error_message` and `wait` look across every server, so batch
+    code written for one listener works unchanged when prompts are spread
+    over several servers. `connected` is true while any socket is up;
+    `connected_for(url)` tells whether that server's own socket is.
+    """
+
+    def __init__(self, base_urls: Iterable[str], client_id: str, connect_timeout: float = 10.0) -> None:
+        self._cond = threading.Condition()
+        self.listeners = [
+            ComfyEventListener(url, client_id, connect_timeout=connect_timeout, condition=self._cond)
+            for url in base_urls
+        ]
+        self.last_error: Optional[str] = None
+
+    @property
+    def connected(self) -> bool:
+        return any(listener.connected for listener in self.listeners)
+
+    def connected_for(self, base_url: str) -> bool:
+        return any(listener.connected_for(base_url) for listener in self.listeners)
+
+    def start(self) -> bool:
+        """Connect every listener; True if at least one socket is open."""
+        started = [listener.start() for listener in self.listeners]
+        errors = [f"{l.base_url}: {l.last_error}" for l in self.listeners if l.last_error]
+        self.last_error = "; ".join(errors) or None
+        return any(started)
+
+    def close(self) -> None:
+        for listener in self.listeners:
+            listener.close()
+
+    def status(self, prompt_id: str) -> Optional[str]:
+        for listener in self.listeners:
+            state = listener.status(prompt_id)
+            if state is not None:
+                return state
+        return None
+
+    def timeline(self, prompt_id: str) -> Dict[str, Any]:
+        for listener in self.listeners:
+            state = listener.timeline(prompt_id)
+            if state:
+                return state
+        return {}
+
+    def error_message(self, prompt_id: str) -> Optional[str]:
+        for listener in self.listeners:
+            message = listener.error_message(prompt_id)
+            if message:
+                return message
+        return None
+
+    def wait(self, prompt_ids: Iterable[str], timeout: float) -> bool:
+        ids = list(prompt_ids)
+        deadline = time.monotonic() + max(0.0, timeout)
+        with self._cond:
+            while True:
+                if any(self.status(pid) in TERMINAL_STATES for pid in ids):
+                    return True
+                remaining = deadline - time.monotonic()
+                if not self.connected or remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
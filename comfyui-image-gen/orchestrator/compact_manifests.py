@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""Compact run manifests: references and hashes instead of embedded ComfyUI payloads.
+
+Manifests used to embed the whole `/history` record, whose `prompt` repeats
+the compiled workflow already saved as `jobs/*_compiled_workflow.json`, and
+were written with `indent=2`. Version-2 manifests replace `history_record`
+with a small `history` summary (status, execution window, error messages,
+SHA-256 of the prompt graph), optionally keep the raw record gzipped next to
+the manifest as `<manifest>.history.json.gz`, and are written without
+whitespace.
+
+Run directly to migrate existing `jobs/` directories in place:
+
+    python orchestrator/compact_manifests.py --books-dir books [--book-id ID] [--no-raw-history] [--dry-run]
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from adaptive_poll import execution_window
+from manifest_index import is_run_manifest
+
+
+MANIFEST_VERSION = 2
+RAW_HISTORY_SUFFIX = ".history.json.gz"
+DRY_RUN_SUFFIX = "_dry_run.json"
+
+
+def json_sha256(payload: Any) -> str:
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=True)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def summarize_history(history_record: Dict[str, Any]) -> Dict[str, Any]:
+    """What a manifest keeps of a `/history` record; outputs live in `output_refs`."""
+    status = history_record.get("status") if isinstance(history_record.get("status"), dict) else {}
+    started, finished = execution_window(history_record)
+    prompt = history_record.get("prompt")
+    graph = prompt[2] if isinstance(prompt, list) and len(prompt) > 2 else None
+    errors = [
+        item[1]
+        for item in status.get("messages") or []
+        if isinstance(item, list) and len(item) > 1 and item[0] in ("execution_error", "execution_interrupted")
+    ]
+    return {
+        "status_str": status.get("status_str"),
+        "completed": status.get("completed"),
+        "execution_started": started,
+        "execution_finished": finished,
+        "prompt_sha256": json_sha256(graph) if graph is not None else None,
+        "errors": errors,
+    }
+
+
+def raw_history_path_for(manifest_path: Path) -> Path:
+    return manifest_path.with_name(manifest_path.name[: -len(".json")] + RAW_HISTORY_SUFFIX)
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
+
+def write_raw_history(path: Path, history_record: Dict[str, Any]) -> Dict[str, Any]:
+    """Gzip the untouched record to `path`; returns the reference stored in the manifest."""
+    raw = json.dumps(history_record, ensure_ascii=True).encode("utf-8")
+    # mtime=0 keeps the archive byte-identical for identical records.
+    _atomic_write(path, gzip.compress(raw, mtime=0))
+    return {"path": path.name, "sha256": hashlib.sha256(raw).hexdigest(), "bytes": len(raw)}
+
+
+def write_manifest(path: Path, manifest: Dict[str, Any]) -> None:
+    manifest["manifest_version"] = MANIFEST_VERSION
+    encoded = json.dumps(manifest, separators=(",", ":"), ensure_ascii=True) + "\n"
+    _atomic_write(path, encoded.encode("utf-8"))
+
+
+def attach_history(
+    manifest: Dict[str, Any], manifest_path: Path, history_record: Dict[str, Any], raw_history: bool = True
+) -> None:
+    """Set `manifest["history"]` from a `/history` record, gzipping the raw record alongside if asked."""
+    manifest.pop("history_record", None)
+    manifest["history"] = summarize_history(history_record)
+    if raw_history:
+        manifest["history"]["raw"] = write_raw_history(raw_history_path_for(manifest_path), history_record)
+
+
+def read_raw_history(manifest_path: Path, manifest: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The full `/history` record of a run, from the manifest or its gzip sidecar."""
+    if isinstance(manifest.get("history_record"), dict):
+        return manifest["history_record"]
+    raw = (manifest.get("history") or {}).get("raw")
+    if not raw:
+        return None
+    with gzip.open(manifest_path.with_name(raw["path"]), "rt", encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def migrate_manifest(path: Path, raw_history: bool = True, dry_run: bool = False) -> Optional[int]:
+    """Rewrite one manifest in compact form; returns bytes saved, or None if already compact."""
+    before = path.stat().st_size
+    with path.open("r", encoding="utf-8") as handle:
+        text = handle.read()
+    manifest = json.loads(text)
+    if manifest.get("manifest_version") == MANIFEST_VERSION and "history_record" not in manifest:
+        return None
+    record = manifest.get("history_record")
+    if dry_run:
+        if isinstance(record, dict):
+            manifest.pop("history_record")
+            manifest["history"] = summarize_history(record)
+        manifest["manifest_version"] = MANIFEST_VERSION
+        return before - len(json.dumps(manifest, separators=(",", ":"), ensure_ascii=True)) - 1
+    if isinstance(record, dict):
+        attach_history(manifest, path, record, raw_history=raw_history)
+    write_manifest(path, manifest)
+    return before - path.stat().st_size
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Shrink existing run manifests to the compact format.")
+    parser.add_argument("--books-dir", default="books", help="Root books directory")
+    parser.add_argument("--book-id", default=None, help="Only migrate this book")
+    parser.add_argument(
+        "--no-raw-history",
+        action="store_true",
+        help="Drop embedded history records instead of gzipping them next to each manifest",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Report the savings without rewriting anything")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    books_dir = Path(args.books_dir)
+    pattern = f"{args.book_id or '*'}/pages/*/jobs/*.json"
+    migrated = skipped = errors = saved = 0
+    for path in sorted(books_dir.glob(pattern)):
+        if not (is_run_manifest(path) or path.name.endswith(DRY_RUN_SUFFIX)):
+            continue
+        try:
+            delta = migrate_manifest(path, raw_history=not args.no_raw_history, dry_run=args.dry_run)
+        except (OSError, json.JSONDecodeError) as exc:
+            print(f"warning: {path}: {exc}", file=sys.stderr)
+            errors += 1
+            continue
+        if delta is None:
+            skipped += 1
+            continue
+        migrated += 1
+        saved += delta
+    verb = "would migrate" if args.dry_run else "migrated"
+    print(f"{verb}={migrated} already_compact={skipped} errors={errors} bytes_saved={saved}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    try:
+        raise SystemExit(main())
+    except Exception as exc:  # pylint: disable=broad-except
+        print(f"error: {exc}", file=sys.stderr)
+        raise SystemExit(1)
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""Compile and validate every page x phase of a book without contacting ComfyUI.
+
+Meant for CI and for checking a book before a long batch. Nothing under the
+book is written. The checks are:
+
+- each phase's bindings against its workflow graph: the node exists, the
+  input exists on it, `from` paths and template placeholders start at a
+  context root. This runs once per phase and ignores `optional`, which
+  otherwise hides typos as skips at run time.
+- each `renderspec.json` (and `review.json`, if present) against `schemas/`,
+  using a validator compiled once per worker (see `schema_validator.py`).
+- a full compile of every page x phase, exactly as `run_page.py` would
+  compile it. A non-optional binding that fails is an error. An optional one
+  that is skipped is a warning, or an error with `--strict`.
+
+Pages are spread over `--workers` processes:
+
+    python orchestrator/compile_all.py --book-dir books/gingerbear_01 --strict --json compile_report.json
+
+Phases that take a source image get placeholder `phase_inputs.source_image_*`
+values unless `--source-glob` finds a real one.
+"""
+
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from render_cache import workflow_hash
+from run_book import discover_pages, pick_source_image, resolve_book
+from run_page import (
+    PHASE_CHOICES,
+    BindingPlan,
+    build_page_context,
+    find_workflow_file,
+    load_phase_assets,
+    maybe_copy_source_image,
+    read_json,
+)
+from schema_validator import load_validator
+
+SKILL_DIR = Path(__file__).resolve().parent.parent
+# Top-level keys of run_page.build_page_context.
+CONTEXT_ROOTS = ("book_id", "page", "phase", "render", "review", "phase_inputs", "paths", "runtime")
+PLACEHOLDER_SOURCE = {
+    "source_image_path": "/compile-all/source.png",
+    "source_image_stem": "source",
+    "source_image_suffix": ".png",
+    "source_image_name": "source.png",
+    "source_image_sha256": "0" * 64,
+}
+
+_VALIDATORS: Dict[str, Callable[[Any], List[str]]] = {}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Compile every page x phase of a book and validate bindings and renderspecs, offline."
+    )
+    parser.add_argument(
+        "--book-dir",
+        default=None,
+        help="Book directory (books/<book_id>); alternative to --books-dir + --book-id",
+    )
+    parser.add_argument("--book-id", default=None, help="Book identifier")
+    parser.add_argument(
+        "--books-dir",
+        default="books",
+        help="Root books directory (ignored when --book-dir is set)",
+    )
+    parser.add_argument(
+        "--pages",
+        nargs="*",
+        default=None,
+        help="Page numbers/ids to check; default is every page with a renderspec.json",
+    )
+    parser.add_argument(
+        "--phases",
+        nargs="+",
+        choices=PHASE_CHOICES,
+        default=None,
+        help="Phases to compile; default is every phase with a workflow in --workflow-dir",
+    )
+    parser.add_argument(
+        "--workflow-dir",
+        default="workflows",
+        help="Directory containing <phase>.api.json and optional <phase>.bindings.json",
+    )
+    parser.add_argument(
+        "--schema-dir",
+        default=str(SKILL_DIR / "schemas"),
+        help="Directory containing renderspec.v0.json and review.v0.json",
+    )
+    parser.add_argument(
+        "--source-glob",
+        default=None,
+        help="Optional glob relative to each page dir supplying a real source image (default: placeholders)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes (1 compiles in this process)",
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="Treat skipped optional bindings and other warnings as failures",
+    )
+    parser.add_argument("--json", default=None, help="Also write the full report to this JSON file")
+    return parser.parse_args()
+
+
+def lint_binding_plan(
+    workflow: Dict[str, Any], plan: BindingPlan
+) -> Tuple[List[str], List[str], List[Tuple[str, str]]]:
+    """Check every binding against the workflow graph.
+
+    Returns `(errors, warnings, broken)`; `broken` lists the `(node, input)`
+    of failing bindings so per-page compiles don't repeat them as skips.
+    """
+    errors: List[str] = []
+    warnings: List[str] = []
+    broken: List[Tuple[str, str]] = []
+    for idx, step in enumerate(plan.steps):
+        label = f"binding #{idx} ({step.node_id}.{step.input_name})"
+        node = workflow.get(step.node_id)
+        if step.error is not None or not isinstance(node, dict):
+            problem = str(step.error) if step.error is not None else f"workflow has no node {step.node_id}"
+            errors.append(f"{label}: {problem}")
+            broken.append((step.node_id, step.input_name))
+            continue
+        failures = len(errors)
+        inputs = node.get("inputs") if isinstance(node.get("inputs"), dict) else {}
+        if step.input_name not in inputs:
+            known = ", ".join(sorted(inputs)) or "none"
+            errors.append(
+                f"{label}: node {step.node_id} ({node.get('class_type')}) has no input "
+                f"{step.input_name!r} (inputs: {known})"
+            )
+        elif isinstance(inputs[step.input_name], list):
+            warnings.append(f"{label}: replaces a link from node {inputs[step.input_name][0]}")
+        paths = [step.source] if step.source is not None else []
+        if step.template is not None:
+            paths += [(text, parts) for text, parts in step.template.parts if parts]
+        for dotted, parts in paths:
+            if parts[0] not in CONTEXT_ROOTS:
+                errors.append(f"{label}: {dotted!r} does not start at a context root ({', '.join(CONTEXT_ROOTS)})")
+        if len(errors) > failures:
+            broken.append((step.node_id, step.input_name))
+    return errors, warnings, broken
+
+
+def available_phases(workflow_dir: Path) -> List[str]:
+    phases = []
+    for phase in PHASE_CHOICES:
+        try:
+            find_workflow_file(workflow_dir, phase)
+        except FileNotFoundError:
+            continue
+        phases.append(phase)
+    return phases
+
+
+def validator_for(path: Path) -> Callable[[Any], List[str]]:
+    """Compiled once per process and reused for every page it checks."""
+    key = str(path)
+    validate = _VALIDATORS.get(key)
+    if validate is None:
+        validate = _VALIDATORS[key] = load_validator(path)
+    return validate
+
+
+def check_page(
+    books_dir: Path,
+    book_id: str,
+    pid: str,
+    phases: List[str],
+    workflow_dir: Path,
+    schema_dir: Path,
+    source_glob: Optional[str],
+    broken: Dict[str, List[Tuple[str, str]]],
+) -> Dict[str, Any]:
+    """Validate and compile one page for every phase; returns its report entry.
+
+    Skips of the `broken[phase]` bindings (already reported once) are left out.
+    """
+    page_dir = books_dir / book_id / "pages" / pid
+    seconds = {"load": 0.0, "schema": 0.0, "compile": 0.0}
+    result: Dict[str, Any] = {"page": pid, "errors": [], "warnings": [], "phases": {}, "seconds": seconds}
+
+    started = time.perf_counter()
+    try:
+        render = read_json(page_dir / "renderspec.json")
+        review_path = page_dir / "review.json"
+        review = read_json(review_path) if review_path.exists() else None
+        source = pick_source_image(page_dir, source_glob) if source_glob else None
+    except (OSError, ValueError) as exc:
+        result["errors"].append(str(exc))
+        return result
+    seconds["load"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for name, document in (("renderspec", render), ("review", review)):
+        if document is None:
+            continue
+        for error in validator_for(schema_dir / f"{name}.v0.json")(document):
+            result["errors"].append(f"{name}.json {error}")
+    seconds["schema"] = time.perf_counter() - started
+
+    for phase in phases:
+        started = time.perf_counter()
+        try:
+            _, workflow_payload, _, plan = load_phase_assets(workflow_dir, phase)
+            if source is not None:
+                phase_inputs = maybe_copy_source_image(source, None, pid, phase)
+            else:
+                phase_inputs = dict(PLACEHOLDER_SOURCE)
+            context = build_page_context(
+                book_id, pid, phase, render, review, phase_inputs, books_dir=books_dir, page_dir=page_dir
+            )
+            compiled, applied = plan.apply(workflow_payload, context)
+            skipped = [item for item in applied if item.get("skipped_optional")]
+            for item in skipped:
+                if (item["node"], item["input"]) in broken.get(phase, ()):
+                    continue
+                result["warnings"].append(
+                    f"{phase}: optional binding {item['node']}.{item['input']} skipped: {item['reason']}"
+                )
+            result["phases"][phase] = {
+                "workflow_hash": workflow_hash(compiled, context),
+                "bindings_applied": len(applied) - len(skipped),
+                "bindings_skipped": len(skipped),
+            }
+        except Exception as exc:  # pylint: disable=broad-except
+            result["errors"].append(f"{phase}: {exc}")
+        seconds["compile"] += time.perf_counter() - started
+    return result
+
+
+def main() -> int:
+    args = parse_args()
+    started = time.perf_counter()
+    books_dir, book_id = resolve_book(args)
+    pages = discover_pages(books_dir, book_id, args.pages)
+    workflow_dir = Path(args.workflow_dir)
+    schema_dir = Path(args.schema_dir)
+    phases = args.phases or available_phases(workflow_dir)
+    if not phases:
+        raise FileNotFoundError(f"no phase workflows found in {workflow_dir}")
+    for name in ("renderspec", "review"):
+        # Compile up front so a schema this validator can't handle fails once, not per page.
+        validator_for(schema_dir / f"{name}.v0.json")
+
+    static: Dict[str, Dict[str, List[str]]] = {}
+    broken: Dict[str, List[Tuple[str, str]]] = {}
+    for phase in phases:
+        _, workflow_payload, _, plan = load_phase_assets(workflow_dir, phase)
+        errors, warnings, broken[phase] = lint_binding_plan(workflow_payload, plan)
+        static[phase] = {"errors": errors, "warnings": warnings}
+
+    task_args = (phases, workflow_dir, schema_dir, args.source_glob, broken)
+    workers = max(1, min(args.workers, len(pages)))
+    if workers == 1:
+        results = [check_page(books_dir, book_id, pid, *task_args) for pid in pages]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(check_page, books_dir, book_id, pid, *task_args) for pid in pages]
+            results = [future.result() for future in futures]
+    wall = time.perf_counter() - started
+
+    error_count = sum(len(entry["errors"]) for entry in static.values())
+    warning_count = sum(len(entry["warnings"]) for entry in static.values())
+    for phase, entry in static.items():
+        for error in entry["errors"]:
+            print(f"{phase}: error: {error}")
+        for warning in entry["warnings"]:
+            print(f"{phase}: warning: {warning}")
+    for result in results:
+        error_count += len(result["errors"])
+        warning_count += len(result["warnings"])
+        for error in result["errors"]:
+            print(f"{result['page']}: error: {error}")
+        for warning in result["warnings"]:
+            print(f"{result['page']}: warning: {warning}")
+
+    compiled = sum(len(result["phases"]) for result in results)
+    stage_seconds = {
+        stage: round(sum(result["seconds"][stage] for result in results), 4) for stage in ("load", "schema", "compile")
+    }
+    slowest = max(results, key=lambda result: sum(result["seconds"].values()), default=None)
+    summary = {
+        "book_id": book_id,
+        "pages": len(pages),
+        "phases": phases,
+        "compiled": compiled,
+        "errors": error_count,
+        "warnings": warning_count,
+        "workers": workers,
+        "wall_seconds": round(wall, 4),
+        "stage_seconds": stage_seconds,
+        "slowest_page": slowest["page"] if slowest else None,
+    }
+    print(
+        f"pages={len(pages)} phases={len(phases)} compiled={compiled} errors={error_count} "
+        f"warnings={warning_count} workers={workers} seconds={wall:.3f}"
+    )
+    print(" ".join(f"{stage}_seconds={value}" for stage, value in stage_seconds.items()))
+    if args.json:
+        report = {"summary": summary, "bindings": static, "pages": results}
+        Path(args.json).write_text(json.dumps(report, indent=2, ensure_ascii=True) + "\n", encoding="utf-8")
+    failed = error_count > 0 or (args.strict and warning_count > 0)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    try:
+        raise SystemExit(main())
+    except Exception as exc:  # pylint: disable=broad-except
+        print(f"error: {exc}", file=sys.stderr)
+        raise SystemExit(1)
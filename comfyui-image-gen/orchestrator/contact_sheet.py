@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""Thumbnails and tiled contact sheets for reviewing a run's outputs.
+
+Derivatives are cached per book by source content, under
+`books/<book_id>/thumbnails/`:
+
+- `<sha[:2]>/<sha>_<size>.jpg`: one thumbnail per distinct output image
+- `sheets/<key>.jpg`: one contact sheet per distinct set of tiles, labels and layout
+
+A rerun (or a render-cache hit) with the same outputs reuses both without
+decoding anything. The page sees hardlinks: `pages/<page>/thumbs/<phase dir>/`
+mirrors the outputs' names, and `pages/<page>/thumbs/<run_id>_<phase>_contact.jpg`
+is the run's sheet. Each tile is labelled with its output's `{idx:03d}`
+prefix (`vNN/` in front for seed variants).
+
+Needs `Pillow`, imported only when sheets are asked for. To build a sheet
+for images already on disk:
+
+    python orchestrator/contact_sheet.py --page-dir books/gingerbear_01/pages/0007 --phase-dir draft
+"""
+
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import math
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from render_cache import link_or_copy, sha256_file
+
+THUMBNAIL_DIR = "thumbnails"
+PAGE_THUMBS_DIR = "thumbs"
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".webp")
+DEFAULT_THUMB_SIZE = 256
+DEFAULT_THUMB_WORKERS = 4
+LABEL_HEIGHT = 16
+TILE_GAP = 4
+JPEG_QUALITY = 85
+BACKGROUND = (32, 32, 32)
+LABEL_COLOR = (235, 235, 235)
+
+
+def _require_pillow() -> Any:
+    try:
+        from PIL import Image  # pylint: disable=import-outside-toplevel
+    except ImportError as exc:
+        raise RuntimeError("contact sheets need Pillow (pip install pillow)") from exc
+    return Image
+
+
+def check_dependencies() -> None:
+    _require_pillow()
+
+
+def _save_jpeg(image: Any, target: Path) -> None:
+    """Write `image` as JPEG via a temp file so readers never see a partial file."""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{target.name}.", suffix=".tmp", dir=str(target.parent))
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            image.save(handle, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, target)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
+
+def label_for(path: Path) -> str:
+    """The `{idx:03d}` prefix of an output's file name (the whole stem if it has none)."""
+    prefix = path.stem.split("_", 1)[0]
+    return prefix if prefix.isdigit() else path.stem
+
+
+class ContactSheets:
+    """Builds cached thumbnails (on a thread pool) and contact sheets for one book at a time."""
+
+    def __init__(self, size: int = DEFAULT_THUMB_SIZE, columns: int = 0, workers: int = DEFAULT_THUMB_WORKERS) -> None:
+        self.size = size
+        self.columns = columns
+        self.workers = max(1, workers)
+
+    def thumbnail_path(self, book_dir: Path, sha256: str) -> Path:
+        return book_dir / THUMBNAIL_DIR / sha256[:2] / f"{sha256}_{self.size}.jpg"
+
+    def _render_thumbnail(self, source: Path, target: Path) -> bool:
+        """Create `target` from `source` unless it's cached; returns True if it was rendered."""
+        if target.is_file():
+            return False
+        image_module = _require_pillow()
+        with image_module.open(source) as image:
+            # JPEG sources decode straight at reduced scale; a no-op for PNG.
+            image.draft("RGB", (self.size, self.size))
+            thumb = image.convert("RGB")
+            thumb.thumbnail((self.size, self.size), image_module.Resampling.LANCZOS)
+            _save_jpeg(thumb, target)
+        return True
+
+    def thumbnails(self, book_dir: Path, items: List[Dict[str, Any]]) -> Tuple[List[Path], int]:
+        """Cached thumbnail for each `{path, sha256}` item; returns `(paths, rendered count)`."""
+        targets = [self.thumbnail_path(book_dir, item["sha256"]) for item in items]
+        # Identical outputs share one thumbnail; render it once, not once per copy.
+        unique = {item["sha256"]: (Path(item["path"]), target) for item, target in zip(items, targets)}
+        if self.workers <= 1 or len(unique) <= 1:
+            rendered = [self._render_thumbnail(source, target) for source, target in unique.values()]
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.workers, len(unique))) as pool:
+                rendered = list(pool.map(lambda pair: self._render_thumbnail(*pair), unique.values()))
+        return targets, sum(rendered)
+
+    def sheet(self, book_dir: Path, tiles: List[Tuple[str, Path, str]]) -> Tuple[Path, bool]:
+        """Cached contact sheet for `(label, thumbnail, sha256)` tiles; returns `(path, rendered)`."""
+        columns = self.columns or max(1, math.ceil(math.sqrt(len(tiles))))
+        key_source = json.dumps(
+            {"size": self.size, "columns": columns, "tiles": [(label, sha) for label, _, sha in tiles]},
+            separators=(",", ":"),
+        )
+        key = hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+        target = book_dir / THUMBNAIL_DIR / "sheets" / f"{key}.jpg"
+        if target.is_file():
+            return target, False
+        image_module = _require_pillow()
+        from PIL import ImageDraw  # pylint: disable=import-outside-toplevel
+
+        rows = max(1, math.ceil(len(tiles) / columns))
+        cell_w, cell_h = self.size + TILE_GAP, self.size + LABEL_HEIGHT + TILE_GAP
+        sheet = image_module.new("RGB", (columns * cell_w + TILE_GAP, rows * cell_h + TILE_GAP), BACKGROUND)
+        draw = ImageDraw.Draw(sheet)
+        for idx, (label, thumb_path, _) in enumerate(tiles):
+            x = TILE_GAP + (idx % columns) * cell_w
+            y = TILE_GAP + (idx // columns) * cell_h
+            with image_module.open(thumb_path) as thumb:
+                sheet.paste(thumb, (x + (self.size - thumb.width) // 2, y + (self.size - thumb.height) // 2))
+            draw.text((x + 2, y + self.size + 2), label, fill=LABEL_COLOR)
+        _save_jpeg(sheet, target)
+        return target, True
+
+    def build(
+        self,
+        page_dir: Path,
+        phase_dir_name: str,
+        items: List[Dict[str, Any]],
+        sheet_name: str,
+        labels: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """Thumbnails and one contact sheet for `items`, hardlinked under `pages/<page>/thumbs/`.
+
+        Each item (`path`, `sha256`) gets a `thumbnail` path. Returns the
+        summary recorded in the run manifest as `contact_sheet`.
+        """
+        book_dir = page_dir.parent.parent
+        thumbs_dir = page_dir / PAGE_THUMBS_DIR
+        labels = labels or [label_for(Path(item["path"])) for item in items]
+        cached, rendered = self.thumbnails(book_dir, items)
+        tiles = []
+        for item, label, blob in zip(items, labels, cached):
+            link = thumbs_dir / phase_dir_name / f"{Path(item['path']).stem}.jpg"
+            link_or_copy(blob, link)
+            item["thumbnail"] = str(link)
+            tiles.append((label, blob, item["sha256"]))
+        sheet_blob, sheet_rendered = self.sheet(book_dir, tiles)
+        sheet_path = thumbs_dir / sheet_name
+        link_or_copy(sheet_blob, sheet_path)
+        return {
+            "path": str(sheet_path),
+            "images": len(items),
+            "thumb_size": self.size,
+            "thumbnails_rendered": rendered,
+            "sheet_rendered": sheet_rendered,
+        }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build thumbnails and a contact sheet for a page phase directory.")
+    parser.add_argument("--page-dir", required=True, help="Page directory (books/<book_id>/pages/<page>)")
+    parser.add_argument("--phase-dir", default="draft", help="Phase subdirectory to sheet (draft, refine, final)")
+    parser.add_argument("--size", type=int, default=DEFAULT_THUMB_SIZE, help="Thumbnail long edge in pixels")
+    parser.add_argument("--columns", type=int, default=0, help="Sheet columns (0 = roughly square)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_THUMB_WORKERS, help="Thumbnail worker threads")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    page_dir = Path(args.page_dir)
+    phase_dir = page_dir / args.phase_dir
+    images = sorted(
+        path
+        for path in phase_dir.glob("*")
+        if path.is_file() and not path.name.startswith(".") and path.suffix.lower() in IMAGE_SUFFIXES
+    )
+    if not images:
+        raise FileNotFoundError(f"no images in {phase_dir}")
+    items = [{"path": str(path), "sha256": sha256_file(path)} for path in images]
+    sheets = ContactSheets(size=args.size, columns=args.columns, workers=args.workers)
+    summary = sheets.build(page_dir, args.phase_dir, items, f"{args.phase_dir}_contact.jpg")
+    print(
+        f"images={summary['images']} thumbnails_rendered={summary['thumbnails_rendered']} "
+        f"sheet_rendered={summary['sheet_rendered']}"
+    )
+    print(f"contact_sheet={summary['path']}")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        raise SystemExit(main())
+    except Exception as exc:  # pylint: disable=broad-except
+        print(f"error: {exc}", file=sys.stderr)
+        raise SystemExit(1)
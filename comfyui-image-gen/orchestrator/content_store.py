@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Per-book content store that deduplicates output images with hardlinks.
+
+Every downloaded output is hashed on the way in (see
+`comfy_http.download_to_file`) and kept once under
+`books/<book_id>/objects/<sha[:2]>/<sha><suffix>`. The page files in
+`draft/`, `refine/`, `final/` are hardlinks to that blob, so reruns and
+retries that produce identical images cost no extra disk.
+
+A blob whose link count has dropped to 1 is no longer referenced by any page
+file (or render-cache entry) and is reclaimed by `gc`:
+
+    python orchestrator/content_store.py --book-dir books/gingerbear_01 stats
+    python orchestrator/content_store.py --book-dir books/gingerbear_01 dedupe
+    python orchestrator/content_store.py --book-dir books/gingerbear_01 gc [--dry-run]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from render_cache import link_or_copy, sha256_file
+
+
+CONTENT_STORE_DIR = "objects"
+# Page subdirectories holding images (see run_page.ensure_page_layout); jobs/ is metadata.
+PAGE_IMAGE_DIRS = ("draft", "selected", "refine", "final")
+
+
+class ContentStore:
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    @classmethod
+    def for_book(cls, book_dir: Path) -> "ContentStore":
+        return cls(book_dir / CONTENT_STORE_DIR)
+
+    def blob_path(self, sha256: str, suffix: str = "") -> Path:
+        return self.root / sha256[:2] / f"{sha256}{suffix.lower()}"
+
+    def ingest(self, path: Path, sha256: str) -> Optional[Path]:
+        """Make `path` a hardlink of the blob for `sha256`, adding the blob if it's new.
+
+        Returns the blob, or None when the filesystem can't hardlink (the file
+        is then left alone and simply not deduplicated).
+        """
+        blob = self.blob_path(sha256, path.suffix)
+        try:
+            if not blob.exists():
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    os.link(path, blob)
+                    return blob
+                except FileExistsError:
+                    pass  # Another run added the same content first.
+            if not os.path.samefile(blob, path):
+                link_or_copy(blob, path)
+        except OSError:
+            return None
+        return blob
+
+    def blobs(self) -> Iterator[Path]:
+        for path in self.root.glob("*/*"):
+            if path.is_file() and not path.name.startswith("."):
+                yield path
+
+    def gc(self, dry_run: bool = False) -> Dict[str, int]:
+        """Remove blobs no page file links to any more."""
+        removed = reclaimed = kept = 0
+        for blob in self.blobs():
+            stat = blob.stat()
+            if stat.st_nlink > 1:
+                kept += 1
+                continue
+            if not dry_run:
+                blob.unlink()
+            removed += 1
+            reclaimed += stat.st_size
+        return {"blobs_removed": removed, "bytes_reclaimed": reclaimed, "blobs_kept": kept}
+
+    def stats(self) -> Dict[str, int]:
+        blobs = stored = links = 0
+        for blob in self.blobs():
+            stat = blob.stat()
+            blobs += 1
+            stored += stat.st_size
+            # Page files (and cache entries) sharing the blob, beyond the blob itself.
+            links += stat.st_nlink - 1
+        return {"blobs": blobs, "bytes_stored": stored, "links": links}
+
+
+def page_images(book_dir: Path) -> Iterator[Path]:
+    for sub in PAGE_IMAGE_DIRS:
+        for path in sorted(book_dir.glob(f"pages/*/{sub}/*")):
+            if path.is_file() and not path.name.startswith("."):
+                yield path
+
+
+def dedupe(store: ContentStore, book_dir: Path) -> Dict[str, int]:
+    """Ingest page images written before the store existed (or copied by hand into `selected/`)."""
+    files = linked = saved = 0
+    for path in page_images(book_dir):
+        files += 1
+        stat = path.stat()
+        sha256 = sha256_file(path)
+        blob = store.blob_path(sha256, path.suffix)
+        shared = blob.exists() and not os.path.samefile(blob, path)
+        if store.ingest(path, sha256) is None:
+            continue
+        linked += 1
+        if shared and stat.st_nlink == 1:
+            saved += stat.st_size
+    return {"files": files, "linked": linked, "bytes_saved": saved}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Inspect, backfill and garbage-collect a book's content store.")
+    parser.add_argument("--book-dir", required=True, help="Book directory (books/<book_id>)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Blob count, stored bytes and page links")
+    commands.add_parser("dedupe", help="Hash existing page images into the store and hardlink duplicates")
+    gc = commands.add_parser("gc", help="Delete blobs no page file references")
+    gc.add_argument("--dry-run", action="store_true", help="Report what would be reclaimed without deleting")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    book_dir = Path(args.book_dir)
+    if not (book_dir / "pages").is_dir():
+        raise FileNotFoundError(f"book pages directory not found: {book_dir / 'pages'}")
+    store = ContentStore.for_book(book_dir)
+    if args.command == "stats":
+        counts = store.stats()
+    elif args.command == "dedupe":
+        counts = dedupe(store, book_dir)
+    else:
+        counts = store.gc(dry_run=args.dry_run)
+    print(" ".join(f"{key}={value}" for key, value in counts.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        raise SystemExit(main())
+    except Exception as exc:  # pylint: disable=broad-except
+        print(f"error: {exc}", file=sys.stderr)
+        raise SystemExit(1)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Write-ahead job journal so interrupted runs can re-attach to their prompt.
+
+Each queued job gets `pages/<page>/jobs/<run_id>_<phase>.journal.json`,
+rewritten atomically (temp file + fsync + rename + directory fsync) at every
+state change:
+
+- `compiled`: written before `/prompt` is called
+- `queued`: `/prompt` returned a `prompt_id`
+- `completed`: outputs downloaded and run manifest written
+- `failed`: ComfyUI reported an error (not written for timeouts/interrupts,
+  which stay resumable)
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+JOURNAL_VERSION = 1
+JOURNAL_SUFFIX = ".journal.json"
+UNFINISHED_STATES = ("compiled", "queued")
+
+
+def journal_path_for(jobs_dir: Path, run_id: str, phase: str, tag: str = "") -> Path:
+    """`tag` tells apart several prompts of one run (seed variants)."""
+    return jobs_dir / f"{run_id}_{phase}{tag}{JOURNAL_SUFFIX}"
+
+
+def read_journal(path: Path) -> Dict[str, Any]:
+    with path.open("r", encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def fsync_dir(path: Path) -> None:
+    """Flush `path`'s directory entries, so a rename into it survives a crash."""
+    fd = os.open(str(path), os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_journal(path: Path, entry: Dict[str, Any]) -> None:
+    entry = dict(entry)
+    entry["journal_version"] = JOURNAL_VERSION
+    entry["updated_at_utc"] = dt.datetime.now(dt.timezone.utc).isoformat()
+    created_dir = not path.parent.is_dir()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            json.dump(entry, handle, indent=2, ensure_ascii=True)
+            handle.write("\n")
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+    # The rename only lasts once the directory is on disk too (and a new jobs/ dir in its parent).
+    fsync_dir(path.parent)
+    if created_dir:
+        fsync_dir(path.parent.parent)
+
+
+def update_journal(path: Path, state: str, **fields: Any) -> Dict[str, Any]:
+    entry = read_journal(path) if path.exists() else {}
+    entry.update(fields)
+    entry["state"] = state
+    write_journal(path, entry)
+    return entry
+
+
+def find_unfinished(page_dir: Path, phase: Optional[str] = None) -> List[Path]:
+    """Journal entries under `page_dir/jobs` that never reached completed/failed."""
+    found = []
+    for path in sorted((page_dir / "jobs").glob(f"*{JOURNAL_SUFFIX}")):
+        try:
+            entry = read_journal(path)
+        except (OSError, json.JSONDecodeError):
+            continue
+        if entry.get("state") not in UNFINISHED_STATES:
+            continue
+        if phase is not None and entry.get("phase") != phase:
+            continue
+        found.append(path)
+    return found
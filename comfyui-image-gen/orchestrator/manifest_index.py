@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""SQLite index over run manifests for cross-book queries.
+
+`<books_dir>/.manifest_index.sqlite` holds one row per finished run (run
+manifests and cache-hit manifests under `*/pages/*/jobs/`), its output files
+with their hashes, the seeds and model files of its compiled workflow, and
+its execution time. `run_page.finalize_page_job` upserts each new manifest;
+`index` rescans incrementally, re-reading only files whose size or mtime
+changed and dropping rows for files that are gone.
+
+    python orchestrator/manifest_index.py index --books-dir books
+    python orchestrator/manifest_index.py query missing-final --book-id gingerbear_01
+    python orchestrator/manifest_index.py query durations --phase refine --since-days 7
+    python orchestrator/manifest_index.py query file books/gingerbear_01/pages/0007/final/001_x.png
+    python orchestrator/manifest_index.py query sql "SELECT phase, count(*) FROM runs GROUP BY phase"
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from adaptive_poll import (
+    MANIFEST_NAME_RE,
+    RUNTIME_SAMPLES_PER_PHASE,
+    load_phase_runtimes,
+    manifest_runtime,
+    parse_utc,
+)
+from model_affinity import model_signature
+from render_cache import sha256_file
+
+
+INDEX_NAME = ".manifest_index.sqlite"
+SCHEMA_VERSION = 1
+CACHE_HIT_SUFFIX = "_cache_hit.json"
+# Phases whose outputs land in final/ (see run_page.PHASE_TO_DIR).
+FINAL_PHASES = ("inpaint", "upscale_print")
+SEED_INPUTS = ("seed", "noise_seed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    book_id TEXT NOT NULL,
+    page TEXT NOT NULL,
+    PRIMARY KEY (book_id, page)
+);
+CREATE TABLE IF NOT EXISTS runs (
+    manifest_path TEXT PRIMARY KEY REFERENCES files(path) ON DELETE CASCADE,
+    book_id TEXT,
+    page TEXT,
+    phase TEXT,
+    run_id TEXT,
+    prompt_id TEXT,
+    status TEXT,
+    comfy_url TEXT,
+    workflow_hash TEXT,
+    seeds TEXT,
+    models TEXT,
+    source_image_sha256 TEXT,
+    queued_at REAL,
+    completed_at REAL,
+    duration_seconds REAL
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    manifest_path TEXT NOT NULL REFERENCES runs(manifest_path) ON DELETE CASCADE,
+    idx INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    sha256 TEXT,
+    bytes INTEGER,
+    PRIMARY KEY (manifest_path, idx)
+);
+CREATE INDEX IF NOT EXISTS runs_page ON runs(book_id, page, phase);
+CREATE INDEX IF NOT EXISTS runs_completed ON runs(phase, completed_at);
+CREATE INDEX IF NOT EXISTS outputs_sha ON outputs(sha256);
+CREATE INDEX IF NOT EXISTS outputs_path ON outputs(path);
+"""
+
+QUERIES = {
+    "missing-final": (
+        "Pages with no completed inpaint/upscale_print run",
+        """
+        SELECT p.book_id, p.page,
+               (SELECT group_concat(DISTINCT r.phase) FROM runs r
+                 WHERE r.book_id = p.book_id AND r.page = p.page) AS phases_run
+          FROM pages p
+         WHERE (:book_id IS NULL OR p.book_id = :book_id)
+           AND NOT EXISTS (SELECT 1 FROM runs r
+                            WHERE r.book_id = p.book_id AND r.page = p.page
+                              AND r.phase IN ({final}))
+         ORDER BY p.book_id, p.page
+        """.format(final=", ".join(f"'{phase}'" for phase in FINAL_PHASES)),
+    ),
+    "durations": (
+        "Execution time per phase for runs that reached ComfyUI",
+        """
+        SELECT phase, count(*) AS runs,
+               round(avg(duration_seconds), 2) AS avg_seconds,
+               round(min(duration_seconds), 2) AS min_seconds,
+               round(max(duration_seconds), 2) AS max_seconds
+          FROM runs
+         WHERE status = 'completed' AND duration_seconds IS NOT NULL
+           AND (:book_id IS NULL OR book_id = :book_id)
+           AND (:phase IS NULL OR phase = :phase)
+           AND (:since IS NULL OR completed_at >= :since)
+         GROUP BY phase ORDER BY phase
+        """,
+    ),
+    "file": (
+        "Run, seeds and models that produced an output file (path, path suffix or SHA-256)",
+        """
+        SELECT o.path, o.sha256, r.book_id, r.page, r.phase, r.run_id, r.prompt_id,
+               r.status, r.seeds, r.models, r.manifest_path
+          FROM outputs o JOIN runs r ON r.manifest_path = o.manifest_path
+         WHERE o.sha256 = :sha256 OR o.path = :path OR o.path LIKE '%' || :suffix
+         ORDER BY r.completed_at DESC
+        """,
+    ),
+}
+
+
+def is_run_manifest(path: Path) -> bool:
+    """Run or cache-hit manifest (not a journal, compiled workflow or dry run)."""
+    return bool(MANIFEST_NAME_RE.match(path.name)) or path.name.endswith(CACHE_HIT_SUFFIX)
+
+
+def workflow_for(manifest: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    compiled = manifest.get("compiled_workflow_path")
+    if compiled:
+        try:
+            with Path(compiled).open("r", encoding="utf-8") as handle:
+                return json.load(handle)
+        except (OSError, json.JSONDecodeError):
+            pass
+    prompt = (manifest.get("history_record") or {}).get("prompt")
+    if isinstance(prompt, list) and len(prompt) > 2 and isinstance(prompt[2], dict):
+        return prompt[2]
+    return None
+
+
+def workflow_seeds(workflow: Dict[str, Any]) -> List[int]:
+    seeds = []
+    for node in workflow.values():
+        for name, value in ((node.get("inputs") or {}) if isinstance(node, dict) else {}).items():
+            if name in SEED_INPUTS and isinstance(value, int) and value not in seeds:
+                seeds.append(value)
+    return seeds
+
+
+def output_records(manifest: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """`output_files` entries; older manifests only list `downloaded_files` paths."""
+    records = manifest.get("output_files")
+    if isinstance(records, list):
+        return [item for item in records if isinstance(item, dict) and item.get("path")]
+    return [{"path": path} for path in manifest.get("downloaded_files") or []]
+
+
+class ManifestIndex:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), timeout=30.0)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.conn.executescript(SCHEMA)
+            self.conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+            self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "ManifestIndex":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _ingest(self, path: Path, stat: Any) -> None:
+        with path.open("r", encoding="utf-8") as handle:
+            manifest = json.load(handle)
+        key = str(path)
+        self.conn.execute("DELETE FROM files WHERE path = ?", (key,))
+        self.conn.execute(
+            "INSERT INTO files (path, size, mtime_ns) VALUES (?, ?, ?)", (key, stat.st_size, stat.st_mtime_ns)
+        )
+        if manifest.get("dry_run"):
+            return
+        workflow = workflow_for(manifest) or {}
+        cache_hit = bool(manifest.get("cache_hit"))
+        book_id, page = manifest.get("book_id"), manifest.get("page")
+        if book_id and page:
+            self.conn.execute("INSERT OR IGNORE INTO pages (book_id, page) VALUES (?, ?)", (book_id, page))
+        self.conn.execute(
+            """INSERT INTO runs (manifest_path, book_id, page, phase, run_id, prompt_id, status, comfy_url,
+                                 workflow_hash, seeds, models, source_image_sha256, queued_at, completed_at,
+                                 duration_seconds)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                key,
+                book_id,
+                page,
+                manifest.get("phase"),
+                manifest.get("run_id"),
+                manifest.get("prompt_id"),
+                "cache_hit" if cache_hit else "completed",
+                manifest.get("comfy_url"),
+                manifest.get("workflow_hash"),
+                json.dumps(workflow_seeds(workflow)),
+                json.dumps(list(model_signature(workflow))),
+                (manifest.get("phase_inputs") or {}).get("source_image_sha256"),
+                parse_utc(manifest.get("queued_at_utc")),
+                parse_utc(manifest.get("completed_at_utc")),
+                None if cache_hit else manifest_runtime(manifest),
+            ),
+        )
+        self.conn.executemany(
+            "INSERT INTO outputs (manifest_path, idx, path, sha256, bytes) VALUES (?, ?, ?, ?, ?)",
+            [
+                (key, idx, str(item["path"]), item.get("sha256"), item.get("bytes"))
+                for idx, item in enumerate(output_records(manifest))
+            ],
+        )
+
+    def upsert(self, manifest_path: Path) -> None:
+        """Index (or re-index) one manifest now, e.g. right after a run writes it."""
+        path = manifest_path.resolve()
+        with self.conn:
+            self._ingest(path, path.stat())
+
+    def scan(self, books_dir: Path, full: bool = False) -> Dict[str, int]:
+        """Bring the index in line with the manifests under `books_dir`."""
+        books_dir = books_dir.resolve()
+        known = {
+            row["path"]: (row["size"], row["mtime_ns"])
+            for row in self.conn.execute("SELECT path, size, mtime_ns FROM files")
+        }
+        counts = {"manifests": 0, "ingested": 0, "removed": 0, "errors": 0}
+        seen = set()
+        with self.conn:
+            for renderspec in books_dir.glob("*/pages/*/renderspec.json"):
+                page_dir = renderspec.parent
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO pages (book_id, page) VALUES (?, ?)",
+                    (page_dir.parent.parent.name, page_dir.name),
+                )
+            for path in books_dir.glob("*/pages/*/jobs/*.json"):
+                if not is_run_manifest(path):
+                    continue
+                key = str(path)
+                seen.add(key)
+                counts["manifests"] += 1
+                stat = path.stat()
+                if not full and known.get(key) == (stat.st_size, stat.st_mtime_ns):
+                    continue
+                try:
+                    self._ingest(path, stat)
+                except (OSError, json.JSONDecodeError, sqlite3.Error) as exc:
+                    print(f"warning: skipping {path}: {exc}", file=sys.stderr)
+                    counts["errors"] += 1
+                    continue
+                counts["ingested"] += 1
+            prefix = str(books_dir) + "/"
+            for key in known:
+                if key.startswith(prefix) and key not in seen:
+                    self.conn.execute("DELETE FROM files WHERE path = ?", (key,))
+                    counts["removed"] += 1
+        return counts
+
+    def phase_runtimes(self, samples: int = RUNTIME_SAMPLES_PER_PHASE) -> Dict[str, List[float]]:
+        """Execution seconds of the latest `samples` completed runs per phase."""
+        runtimes: Dict[str, List[float]] = {}
+        rows = self.conn.execute(
+            """SELECT phase, duration_seconds FROM runs
+                WHERE status = 'completed' AND duration_seconds IS NOT NULL AND phase IS NOT NULL
+                ORDER BY phase, completed_at DESC"""
+        )
+        for row in rows:
+            durations = runtimes.setdefault(row["phase"], [])
+            if len(durations) < samples:
+                durations.append(float(row["duration_seconds"]))
+        return runtimes
+
+    def query(self, sql: str, params: Any = ()) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+        cursor = self.conn.execute(sql, params)
+        columns = [col[0] for col in cursor.description or []]
+        return columns, [tuple(row) for row in cursor.fetchall()]
+
+
+def _deny_attach(action: int, *_: Any) -> int:
+    # ATTACH would open (and could create) another database file read-write.
+    return sqlite3.SQLITE_DENY if action in (sqlite3.SQLITE_ATTACH, sqlite3.SQLITE_DETACH) else sqlite3.SQLITE_OK
+
+
+def read_only_query(db_path: Path, sql: str) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+    """Run one user-supplied statement on a read-only connection, so it can't change the index."""
+    conn = sqlite3.connect(f"{db_path.resolve().as_uri()}?mode=ro", uri=True, timeout=30.0)
+    try:
+        conn.set_authorizer(_deny_attach)
+        cursor = conn.execute(sql)
+        columns = [col[0] for col in cursor.description or []]
+        return columns, [tuple(row) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def index_path_for(books_dir: Path) -> Path:
+    return books_dir / INDEX_NAME
+
+
+def load_runtimes(books_dir: Path, samples: int = RUNTIME_SAMPLES_PER_PHASE) -> Dict[str, List[float]]:
+    """Per-phase runtimes for the adaptive poller, from the index when `books_dir` has one.
+
+    Without an index (or if it can't be read) this falls back to parsing every
+    run manifest with `adaptive_poll.load_phase_runtimes`.
+    """
+    path = index_path_for(books_dir)
+    if path.exists():
+        try:
+            with ManifestIndex(path) as index:
+                return index.phase_runtimes(samples)
+        except sqlite3.Error as exc:
+            print(f"warning: manifest index unreadable, scanning manifests: {exc}", file=sys.stderr)
+    return load_phase_runtimes(books_dir, samples)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Index run manifests into SQLite and query them.")
+    parser.add_argument("--books-dir", default="books", help="Root books directory")
+    parser.add_argument("--db", default=None, help=f"Index database (default: <books-dir>/{INDEX_NAME})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    index = commands.add_parser("index", help="Ingest new or changed manifests")
+    index.add_argument("--full", action="store_true", help="Re-read every manifest, not just changed ones")
+
+    query = commands.add_parser("query", help="Run a canned query or raw SQL")
+    query.add_argument(
+        "name",
+        choices=sorted(QUERIES) + ["sql"],
+        help="; ".join(f"{name}: {doc}" for name, (doc, _) in sorted(QUERIES.items())) + "; sql: one raw SELECT (read-only)",
+    )
+    query.add_argument("arg", nargs="?", default=None, help="File path/SHA-256 for 'file', statement for 'sql'")
+    query.add_argument("--book-id", default=None, help="Restrict to one book")
+    query.add_argument("--phase", default=None, help="Restrict 'durations' to one phase")
+    query.add_argument("--since-days", type=float, default=None, help="Restrict 'durations' to recent runs")
+    query.add_argument("--json", action="store_true", help="Print rows as JSON objects instead of TSV")
+    query.add_argument("--no-refresh", action="store_true", help="Query the index as is, without a rescan")
+    return parser.parse_args()
+
+
+def query_params(args: argparse.Namespace) -> Dict[str, Any]:
+    params: Dict[str, Any] = {
+        "book_id": args.book_id,
+        "phase": args.phase,
+        "since": time.time() - args.since_days * 86400 if args.since_days is not None else None,
+        "sha256": None,
+        "path": None,
+        "suffix": None,
+    }
+    if args.name == "file":
+        if not args.arg:
+            raise ValueError("query file needs a path or SHA-256")
+        target = Path(args.arg)
+        if target.is_file():
+            params.update(sha256=sha256_file(target), path=str(target), suffix="/" + target.name)
+        else:
+            params.update(sha256=args.arg.lower(), path=args.arg, suffix=args.arg)
+    return params
+
+
+def main() -> int:
+    args = parse_args()
+    books_dir = Path(args.books_dir)
+    db_path = Path(args.db) if args.db else index_path_for(books_dir)
+    with ManifestIndex(db_path) as index:
+        if args.command == "index":
+            counts = index.scan(books_dir, full=args.full)
+            print(" ".join(f"{key}={value}" for key, value in counts.items()))
+            print(f"index={db_path}")
+            return 1 if counts["errors"] else 0
+
+        if not args.no_refresh:
+            index.scan(books_dir)
+        if args.name != "sql":
+            columns, rows = index.query(QUERIES[args.name][1], query_params(args))
+    if args.name == "sql":
+        if not args.arg:
+            raise ValueError("query sql needs a statement")
+        columns, rows = read_only_query(db_path, args.arg)
+    if args.json:
+        for row in rows:
+            print(json.dumps(dict(zip(columns, row)), ensure_ascii=True))
+    else:
+        print("\t".join(columns))
+        for row in rows:
+            print("\t".join("" if value is None else str(value) for value in row))
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        raise SystemExit(main())
+    except Exception as exc:  # pylint: disable=broad-except
+        print(f"error: {exc}", file=sys.stderr)
+        raise SystemExit(1)
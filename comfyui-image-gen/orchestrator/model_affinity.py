@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""Order batch jobs so each ComfyUI server switches model weights as rarely as possible.
+
+A job's model signature is the set of model files its loader nodes name
+(`UNETLoader.unet_name`, `CheckpointLoaderSimple.ckpt_name`, `VAELoader`,
+`DualCLIPLoader`, `LoraLoader`, ...), read from the compiled workflow. Each
+server remembers the signature of the last job sent to it (seeded from its
+most recent `/history` entry), and the next job handed to a server is one
+that needs what it already has loaded, if any is waiting.
+
+Within that, jobs are ordered for ComfyUI's node cache. A node is skipped
+when its class, inputs and everything upstream of it match a node of the
+previous prompt. Each job's node signatures are hashed the same way
+(`node_signatures`). The next job is the one that shares the most nodes
+with the last one sent to the server: same text encodes, same latent, same
+loaders with a different seed. The report counts the nodes expected to be
+reused, next to the same jobs in page order.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+
+DEFAULT_MODEL_LOAD_SECONDS = 20.0
+MODEL_FILE_SUFFIXES = (".safetensors", ".sft", ".ckpt", ".pt", ".pth", ".bin", ".gguf")
+
+Signature = Tuple[str, ...]
+NodeSet = FrozenSet[str]
+
+
+def model_signature(workflow: Dict[str, Any]) -> Signature:
+    """Sorted `input=file` pairs for every model file a loader node in `workflow` reads."""
+    names = set()
+    for node in workflow.values():
+        if not isinstance(node, dict) or "Loader" not in str(node.get("class_type") or ""):
+            continue
+        for name, value in (node.get("inputs") or {}).items():
+            if isinstance(value, str) and value.lower().endswith(MODEL_FILE_SUFFIXES):
+                names.add(f"{name}={value}")
+    return tuple(sorted(names))
+
+
+def node_signatures(workflow: Dict[str, Any]) -> NodeSet:
+    """Hash of each node's class, inputs and (recursively) upstream nodes.
+
+    Two prompts' nodes with equal hashes compute the same value, so ComfyUI
+    can reuse the first one's output. Node ids don't matter: a link input
+    hashes as the upstream node's signature plus the output slot.
+    """
+    memo: Dict[str, str] = {}
+
+    def sign(node_id: str, seen: Tuple[str, ...]) -> str:
+        if node_id in memo:
+            return memo[node_id]
+        node = workflow.get(node_id)
+        if not isinstance(node, dict) or node_id in seen:
+            # Dangling or cyclic link: ComfyUI rejects the prompt, so it can't share anything.
+            return f"unresolved:{node_id}"
+        inputs = {}
+        for name, value in (node.get("inputs") or {}).items():
+            if isinstance(value, list) and len(value) == 2 and str(value[0]) in workflow:
+                value = ["link", sign(str(value[0]), seen + (node_id,)), value[1]]
+            inputs[name] = value
+        blob = json.dumps([node.get("class_type"), inputs], sort_keys=True, separators=(",", ":"), ensure_ascii=True)
+        memo[node_id] = hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+        return memo[node_id]
+
+    return frozenset(sign(str(node_id), ()) for node_id in workflow)
+
+
+def signature_label(signature: Signature) -> str:
+    return " + ".join(signature) if signature else "(no model loaders)"
+
+
+def history_workflow(history_payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Workflow of the newest prompt in a `/history?max_items=1` payload, if any."""
+    for record in history_payload.values():
+        prompt = record.get("prompt") if isinstance(record, dict) else None
+        # ComfyUI stores [number, prompt_id, workflow, extra_data, outputs_to_execute].
+        if isinstance(prompt, list) and len(prompt) > 2 and isinstance(prompt[2], dict):
+            return prompt[2]
+    return None
+
+
+def history_signature(history_payload: Dict[str, Any]) -> Optional[Signature]:
+    """Signature of the newest prompt in a `/history?max_items=1` payload, if any."""
+    workflow = history_workflow(history_payload)
+    return (model_signature(workflow) or None) if workflow is not None else None
+
+
+def count_model_loads(signatures: Iterable[Signature], start: Optional[Signature] = None) -> int:
+    """Times the loaded model set changes running `signatures` in order from `start`.
+
+    Jobs without loader nodes leave the loaded models alone.
+    """
+    loads = 0
+    current = start
+    for signature in signatures:
+        if signature and signature != current:
+            loads += 1
+            current = signature
+    return loads
+
+
+def count_reused_nodes(node_sets: Iterable[NodeSet], start: Optional[NodeSet] = None) -> Tuple[int, int]:
+    """`(reused, total)` nodes running `node_sets` in order from `start`.
+
+    A node counts as reused when the prompt before it had the same node
+    signature, which is all ComfyUI's default cache keeps.
+    """
+    reused = total = 0
+    previous = start or frozenset()
+    for nodes in node_sets:
+        reused += len(nodes & previous)
+        total += len(nodes)
+        previous = nodes
+    return reused, total
+
+
+def format_node_reuse(report: Dict[str, Any]) -> str:
+    """One-line summary of a `report()`'s node reuse, e.g. `41/96 (page order 30/96)`."""
+    reuse = report["node_reuse"]
+    return f"{reuse['reused']}/{reuse['nodes']} (page order {reuse['reused_in_page_order']}/{reuse['nodes']})"
+
+
+class ModelAffinity:
+    """Per-server model residency plus the job picking and batch report built on it.
+
+    With `enabled=False` jobs keep page order; loads are still counted so
+    the report shows what grouping would have saved.
+    """
+
+    def __init__(self, enabled: bool = True, load_seconds: float = DEFAULT_MODEL_LOAD_SECONDS) -> None:
+        self.enabled = enabled
+        self.load_seconds = load_seconds
+        self.resident: Dict[str, Signature] = {}
+        self.initial: Dict[str, Signature] = {}
+        self.resident_nodes: Dict[str, NodeSet] = {}
+        self.initial_nodes: Dict[str, NodeSet] = {}
+        # Per server: (arrival order, signature, nodes) of each job in the order it was sent there.
+        self.sent: Dict[str, List[Tuple[int, Signature, NodeSet]]] = {}
+        self.groups: Dict[Signature, int] = {}
+        self._arrivals = 0
+
+    def seed(self, url: str, signature: Optional[Signature], nodes: Optional[NodeSet] = None) -> None:
+        """What `url` already has loaded (and cached, `nodes`) before the batch starts."""
+        if signature:
+            self.resident[url] = signature
+            self.initial[url] = signature
+        if nodes:
+            self.resident_nodes[url] = nodes
+            self.initial_nodes[url] = nodes
+
+    def seed_from_client(self, client: Any) -> None:
+        try:
+            payload = client.get_history(max_items=1)
+        except Exception:  # pylint: disable=broad-except
+            return
+        workflow = history_workflow(payload)
+        if workflow is not None:
+            self.seed(client.base_url, model_signature(workflow) or None, node_signatures(workflow))
+
+    def register(self, job: Dict[str, Any]) -> Signature:
+        if "model_signature" not in job:
+            job["model_signature"] = model_signature(job["compiled_workflow"])
+            job["node_signatures"] = node_signatures(job["compiled_workflow"])
+            job["arrival"] = self._arrivals
+            self._arrivals += 1
+            self.groups[job["model_signature"]] = self.groups.get(job["model_signature"], 0) + 1
+        return job["model_signature"]
+
+    def pick(self, pending: Sequence[Dict[str, Any]], target: Optional[str], others: Iterable[str] = ()) -> int:
+        """Index in `pending` of the job to send to server `target` next.
+
+        Prefers a job needing `target`'s resident models, then one whose models
+        aren't resident on any of the `others` servers, then any job. Among
+        those, it takes the one sharing the most nodes with `target`'s last
+        prompt, the oldest on a tie.
+        """
+        if not self.enabled or target is None:
+            return 0
+        resident = self.resident.get(target)
+        if resident:
+            matching = [idx for idx, job in enumerate(pending) if self.register(job) == resident]
+            if matching:
+                return self._most_reuse(pending, matching, target)
+        claimed = {self.resident[url] for url in others if url in self.resident}
+        if claimed:
+            unclaimed = [idx for idx, job in enumerate(pending) if self.register(job) not in claimed]
+            if unclaimed:
+                return self._most_reuse(pending, unclaimed, target)
+        return self._most_reuse(pending, range(len(pending)), target)
+
+    def _most_reuse(self, pending: Sequence[Dict[str, Any]], indices: Iterable[int], target: str) -> int:
+        cached = self.resident_nodes.get(target, frozenset())
+        best, best_reused = 0, -1
+        for idx in indices:
+            self.register(pending[idx])
+            reused = len(pending[idx]["node_signatures"] & cached)
+            if reused > best_reused:
+                best, best_reused = idx, reused
+        return best
+
+    def plan(self, jobs: Iterable[Dict[str, Any]], url: str) -> List[Dict[str, Any]]:
+        """`jobs` in the order they would be sent to `url`, recorded as if they were."""
+        pending = list(jobs)
+        order = []
+        while pending:
+            job = pending.pop(self.pick(pending, url))
+            self.record(url, job)
+            order.append(job)
+        return order
+
+    def prefers(self, job: Dict[str, Any], url: str) -> bool:
+        signature = self.register(job)
+        return self.enabled and bool(signature) and self.resident.get(url) == signature
+
+    def record(self, url: str, job: Dict[str, Any]) -> None:
+        """`job` was queued on `url`; its models are what that server will hold next."""
+        signature = self.register(job)
+        self.sent.setdefault(url, []).append((job["arrival"], signature, job["node_signatures"]))
+        if signature:
+            self.resident[url] = signature
+        self.resident_nodes[url] = job["node_signatures"]
+
+    def report(self) -> Dict[str, Any]:
+        servers = []
+        loads = loads_in_order = 0
+        nodes = reused = reused_in_order = 0
+        for url, sent in self.sent.items():
+            start = self.initial.get(url)
+            actual = count_model_loads((sig for _, sig, _ in sent), start)
+            # Same jobs on the same server, but in the order they were added.
+            page_order = sorted(sent, key=lambda item: item[0])
+            in_order = count_model_loads((sig for _, sig, _ in page_order), start)
+            server_reused, server_nodes = count_reused_nodes((n for _, _, n in sent), self.initial_nodes.get(url))
+            server_in_order, _ = count_reused_nodes((n for _, _, n in page_order), self.initial_nodes.get(url))
+            servers.append(
+                {
+                    "url": url,
+                    "jobs": len(sent),
+                    "model_loads": actual,
+                    "model_loads_in_page_order": in_order,
+                    "nodes": server_nodes,
+                    "nodes_reused": server_reused,
+                    "nodes_reused_in_page_order": server_in_order,
+                }
+            )
+            loads += actual
+            loads_in_order += in_order
+            nodes += server_nodes
+            reused += server_reused
+            reused_in_order += server_in_order
+        return {
+            "enabled": self.enabled,
+            "groups": {signature_label(sig): count for sig, count in self.groups.items()},
+            "servers": servers,
+            "model_loads": loads,
+            "model_loads_in_page_order": loads_in_order,
+            "model_load_seconds": self.load_seconds,
+            "estimated_seconds_saved": round((loads_in_order - loads) * self.load_seconds, 1),
+            "node_reuse": {
+                "nodes": nodes,
+                "reused": reused,
+                "reused_in_page_order": reused_in_order,
+                "reuse_ratio": round(reused / nodes, 3) if nodes else 0.0,
+            },
+        }
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""Cull near-duplicate images from a page's phase directory with perceptual hashes.
+
+Every image in the directory (or only the given ones, e.g. one run's
+outputs) gets a 64-bit DCT perceptual hash. All images are decoded into one
+`(N, 32, 32)` array and transformed with two matrix products, so the cost
+is one NumPy call per batch rather than Python loops over pixels. Images
+are clustered with complete linkage: every pair within a cluster lies
+within `max_distance` bits (Hamming), so A~B~C never lumps together an A
+and C that differ. Each cluster keeps one representative in place: the
+member closest to all the others, or the oldest on a tie. The rest move to
+`<phase dir>/near_duplicates/` (renamed `-2`, `-3`, ... if a culled file
+of that name is already there); nothing is deleted, so a culled draft can
+simply be moved back.
+
+Needs `numpy` and `Pillow`, imported only when culling is asked for:
+
+    python orchestrator/near_duplicates.py --page-dir books/gingerbear_01/pages/0007 --phase-dir draft [--dry-run]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+CULLED_DIR = "near_duplicates"
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".webp")
+HASH_SIDE = 8
+SAMPLE_SIDE = 32
+DEFAULT_MAX_DISTANCE = 6
+MISSING_DEPENDENCIES = "near-duplicate culling needs numpy and Pillow (pip install numpy pillow)"
+
+
+def _require_numpy() -> Any:
+    try:
+        import numpy  # pylint: disable=import-outside-toplevel
+    except ImportError as exc:
+        raise RuntimeError(MISSING_DEPENDENCIES) from exc
+    return numpy
+
+
+def _require_pillow() -> Any:
+    try:
+        from PIL import Image  # pylint: disable=import-outside-toplevel
+    except ImportError as exc:
+        raise RuntimeError(MISSING_DEPENDENCIES) from exc
+    return Image
+
+
+def check_dependencies() -> None:
+    """Fail before anything is rendered if culling was asked for but can't run."""
+    _require_numpy()
+    _require_pillow()
+
+
+def dct_matrix(np: Any, size: int) -> Any:
+    """Orthonormal DCT-II basis; `M @ x @ M.T` is the 2-D DCT of a `size`x`size` block."""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2.0 / size)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+def load_samples(paths: List[Path]) -> Any:
+    """Decode every image to a grayscale `SAMPLE_SIDE` square; returns an `(N, side, side)` float32 array."""
+    np = _require_numpy()
+    image_module = _require_pillow()
+    samples = np.empty((len(paths), SAMPLE_SIDE, SAMPLE_SIDE), dtype=np.float32)
+    for idx, path in enumerate(paths):
+        with image_module.open(path) as image:
+            # Lets JPEG decode at reduced scale; a no-op for other formats.
+            image.draft("L", (SAMPLE_SIDE * 2, SAMPLE_SIDE * 2))
+            small = image.convert("L").resize((SAMPLE_SIDE, SAMPLE_SIDE), image_module.Resampling.LANCZOS)
+            samples[idx] = np.asarray(small, dtype=np.float32)
+    return samples
+
+
+def phash_batch(samples: Any) -> Any:
+    """64-bit perceptual hashes (uint64) for an `(N, side, side)` batch of grayscale samples."""
+    np = _require_numpy()
+    basis = dct_matrix(np, samples.shape[-1])
+    coefficients = basis @ samples @ basis.T
+    low = coefficients[:, :HASH_SIDE, :HASH_SIDE].reshape(len(samples), HASH_SIDE * HASH_SIDE)
+    # The DC term only tracks overall brightness; leave it out of the threshold.
+    medians = np.median(low[:, 1:], axis=1, keepdims=True)
+    bits = np.packbits(low > medians, axis=1)
+    return bits.view(">u8").reshape(len(samples)).astype(np.uint64)
+
+
+def hamming_matrix(hashes: Any) -> Any:
+    """Pairwise Hamming distances between uint64 hashes as an `(N, N)` array."""
+    np = _require_numpy()
+    xor = hashes[:, None] ^ hashes[None, :]
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(xor).astype(np.int64)
+    return np.unpackbits(xor.view(np.uint8).reshape(*xor.shape, 8), axis=-1).sum(axis=-1)
+
+
+def cluster(distances: Any, max_distance: int) -> List[Tuple[int, List[int]]]:
+    """Complete-linkage clusters over `distances`; returns `(representative, members)` per cluster.
+
+    Images are taken in index order and join the first cluster whose every
+    member is within `max_distance`, else start a new one. Indices are
+    positions in `distances`; a lower index wins ties for the
+    representative, so callers order images oldest first.
+    """
+    np = _require_numpy()
+    close = distances <= max_distance
+    groups: List[List[int]] = []
+    for idx in range(len(distances)):
+        home = next((members for members in groups if close[idx, members].all()), None)
+        if home is None:
+            groups.append([idx])
+        else:
+            home.append(idx)
+    clusters = []
+    for members in groups:
+        totals = distances[np.ix_(members, members)].sum(axis=1)
+        clusters.append((members[int(np.argmin(totals))], members))
+    return clusters
+
+
+def phase_images(phase_dir: Path) -> List[Path]:
+    """Images directly in `phase_dir`, oldest first."""
+    if not phase_dir.is_dir():
+        return []
+    images = [
+        path
+        for path in phase_dir.iterdir()
+        if path.is_file() and not path.name.startswith(".") and path.suffix.lower() in IMAGE_SUFFIXES
+    ]
+    return sorted(images, key=lambda path: (path.stat().st_mtime_ns, path.name))
+
+
+def culled_target(culled_dir: Path, name: str) -> Path:
+    """`culled_dir/name`, or `<stem>-2<suffix>`, `-3`, ... if an earlier cull already took that name."""
+    target = culled_dir / name
+    attempt = 1
+    while target.exists():
+        attempt += 1
+        target = culled_dir / f"{Path(name).stem}-{attempt}{Path(name).suffix}"
+    return target
+
+
+def cull_phase_dir(
+    phase_dir: Path,
+    max_distance: int = DEFAULT_MAX_DISTANCE,
+    dry_run: bool = False,
+    only: Optional[List[Path]] = None,
+) -> Dict[str, Any]:
+    """Hash, cluster and cull `phase_dir`; returns the cluster map recorded in run manifests.
+
+    With `only`, just those images are considered, so a run never moves
+    another run's picks. Paths in the map are relative to the page dir.
+    `moved` maps each culled image's old path to its new one under
+    `near_duplicates/`.
+    """
+    page_dir = phase_dir.parent
+    images = phase_images(phase_dir)
+    if only is not None:
+        wanted = {path.resolve() for path in only}
+        images = [path for path in images if path.resolve() in wanted]
+    summary: Dict[str, Any] = {
+        "algorithm": f"dct-phash-{HASH_SIDE * HASH_SIDE}",
+        "max_distance": max_distance,
+        "images": len(images),
+        "kept": len(images),
+        "clusters": [],
+        "moved": {},
+    }
+    if len(images) < 2:
+        return summary
+    hashes = phash_batch(load_samples(images))
+    distances = hamming_matrix(hashes)
+    culled_dir = phase_dir / CULLED_DIR
+    for representative, members in cluster(distances, max_distance):
+        if len(members) < 2:
+            continue
+        rep_path = str(images[representative].relative_to(page_dir))
+        summary["clusters"].append(
+            {
+                "representative": rep_path,
+                "members": [
+                    {
+                        "path": str(images[idx].relative_to(page_dir)),
+                        "phash": f"{int(hashes[idx]):016x}",
+                        "distance": int(distances[representative, idx]),
+                    }
+                    for idx in members
+                ],
+            }
+        )
+        for idx in members:
+            if idx == representative:
+                continue
+            target = culled_target(culled_dir, images[idx].name)
+            if not dry_run:
+                culled_dir.mkdir(exist_ok=True)
+                os.replace(images[idx], target)
+            summary["moved"][str(images[idx].relative_to(page_dir))] = str(target.relative_to(page_dir))
+    summary["kept"] = len(images) - len(summary["moved"])
+    return summary
+
+
+def apply_cull(output_files: List[Dict[str, Any]], page_dir: Path, summary: Dict[str, Any]) -> None:
+    """Point moved `output_files` records at their new path and mark what they duplicate."""
+    representative_of = {
+        member["path"]: entry["representative"] for entry in summary["clusters"] for member in entry["members"]
+    }
+    for item in output_files:
+        path = Path(item["path"])
+        try:
+            rel = str(path.relative_to(page_dir))
+        except ValueError:
+            continue
+        moved = summary["moved"].get(rel)
+        if moved is not None:
+            item["path"] = str(page_dir / moved)
+            item["near_duplicate_of"] = representative_of[rel]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Move near-duplicate images of a page phase into near_duplicates/.")
+    parser.add_argument("--page-dir", required=True, help="Page directory (books/<book_id>/pages/<page>)")
+    parser.add_argument("--phase-dir", default="draft", help="Phase subdirectory to cull (draft, refine, final)")
+    parser.add_argument(
+        "--max-distance",
+        type=int,
+        default=DEFAULT_MAX_DISTANCE,
+        help="Largest Hamming distance (of 64 bits) at which two images count as near-duplicates",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Report the clusters without moving anything")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    phase_dir = Path(args.page_dir) / args.phase_dir
+    if not phase_dir.is_dir():
+        raise FileNotFoundError(f"phase directory not found: {phase_dir}")
+    summary = cull_phase_dir(phase_dir, max_distance=args.max_distance, dry_run=args.dry_run)
+    for entry in summary["clusters"]:
+        print(f"keep {entry['representative']}")
+        for member in entry["members"]:
+            if member["path"] != entry["representative"]:
+                print(f"  near-duplicate {member['path']} distance={member['distance']}")
+    verb = "would_move" if args.dry_run else "moved"
+    print(f"images={summary['images']} kept={summary['kept']} {verb}={len(summary['moved'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        raise SystemExit(main())
+    except Exception as exc:  # pylint: disable=broad-except
+        print(f"error: {exc}", file=sys.stderr)
+        raise SystemExit(1)
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""Content-addressed render cache keyed on the compiled workflow.
+
+Entries live under `<cache_dir>/<key[:2]>/<key>/` with the output files
+(hardlinked from the page directory when possible) and an `entry.json`.
+The entry's mtime doubles as its LRU timestamp. `max_bytes` bounds the bytes
+only the cache keeps alive: a file still hardlinked from a page directory or
+the content store would not be freed by eviction, so it doesn't count.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_MAX_BYTES = 20 * 1024 ** 3
+HASH_CHUNK_BYTES = 1024 * 1024
+
+# Inputs that only name the server-side output file; they don't change pixels.
+IGNORED_INPUTS = ("filename_prefix",)
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _scrub(value: Any, replacements: Dict[str, str]) -> Any:
+    if isinstance(value, str):
+        for needle, marker in replacements.items():
+            if needle and needle in value:
+                value = value.replace(needle, marker)
+        return value
+    if isinstance(value, list):
+        return [_scrub(item, replacements) for item in value]
+    if isinstance(value, dict):
+        return {key: _scrub(item, replacements) for key, item in value.items()}
+    return value
+
+
+def canonical_workflow(compiled_workflow: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the workflow with volatile fields normalized for hashing.
+
+    - `runtime.timestamp_utc` / `runtime.client_id` (and anything templated
+      from them) are replaced with fixed markers.
+    - `filename_prefix` inputs are dropped.
+    - An input equal to `phase_inputs.source_image_name` is replaced by the
+      source file's SHA-256, so a changed image under the same name misses.
+
+    Model names are ordinary node inputs and stay part of the hash.
+    """
+    runtime = context.get("runtime") or {}
+    replacements = {
+        str(runtime.get("client_id") or ""): "<client_id>",
+        str(runtime.get("timestamp_utc") or ""): "<timestamp_utc>",
+    }
+    phase_inputs = context.get("phase_inputs") or {}
+    source_name = phase_inputs.get("source_image_name")
+    source_path = phase_inputs.get("source_image_path")
+    source_marker = None
+    if source_name and phase_inputs.get("source_image_sha256"):
+        source_marker = "sha256:" + phase_inputs["source_image_sha256"]
+    elif source_name and source_path and Path(source_path).is_file():
+        source_marker = "sha256:" + sha256_file(Path(source_path))
+
+    canonical: Dict[str, Any] = {}
+    for node_id, node in compiled_workflow.items():
+        if not isinstance(node, dict):
+            canonical[node_id] = _scrub(node, replacements)
+            continue
+        node_copy = {key: value for key, value in node.items() if key != "_meta"}
+        inputs = node.get("inputs")
+        if isinstance(inputs, dict):
+            clean_inputs = {}
+            for name, value in inputs.items():
+                if name in IGNORED_INPUTS:
+                    continue
+                if source_marker is not None and value == source_name:
+                    value = source_marker
+                clean_inputs[name] = value
+            node_copy["inputs"] = clean_inputs
+        canonical[node_id] = _scrub(node_copy, replacements)
+    return canonical
+
+
+def workflow_hash(compiled_workflow: Dict[str, Any], context: Dict[str, Any]) -> str:
+    canonical = canonical_workflow(compiled_workflow, context)
+    blob = json.dumps(
+        {"cache_version": CACHE_VERSION, "workflow": canonical},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=True,
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def link_or_copy(src: Path, dst: Path) -> None:
+    """Hardlink `src` to `dst` (replacing it atomically); copy across devices."""
+    if dst.exists() and os.path.samefile(src, dst):
+        # rename() onto another link to the same inode is a no-op that leaves the temp name behind.
+        return
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{dst.name}.", suffix=".link", dir=str(dst.parent))
+    os.close(fd)
+    os.unlink(tmp_name)
+    try:
+        try:
+            os.link(src, tmp_name)
+        except OSError:
+            shutil.copy2(src, tmp_name)
+        os.replace(tmp_name, dst)
+    except BaseException:
+        if os.path.lexists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
+
+def exclusive_bytes(path: Path) -> int:
+    """Bytes deleting `path` would free: its size if no other hardlink keeps it alive, else 0."""
+    info = path.stat()
+    if not stat.S_ISREG(info.st_mode) or info.st_nlink > 1:
+        return 0
+    return info.st_size
+
+
+class RenderCache:
+    def __init__(self, root: Path, max_bytes: int = DEFAULT_CACHE_MAX_BYTES) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def entry_dir(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the entry for `key` if every cached file is still present."""
+        entry_path = self.entry_dir(key) / "entry.json"
+        try:
+            with entry_path.open("r", encoding="utf-8") as handle:
+                entry = json.load(handle)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        files = entry.get("files")
+        if not isinstance(files, list):
+            return None
+        for item in files:
+            if not (self.entry_dir(key) / item["name"]).is_file():
+                return None
+        os.utime(entry_path)
+        return entry
+
+    def materialize(self, key: str, entry: Dict[str, Any], output_dir: Path) -> List[Dict[str, Any]]:
+        """Hardlink a hit's files into `output_dir`; returns `output_files` records."""
+        records = []
+        for item in entry["files"]:
+            target = output_dir / item["name"]
+            link_or_copy(self.entry_dir(key) / item["name"], target)
+            records.append({"path": str(target), "bytes": item["bytes"], "sha256": item["sha256"]})
+        return records
+
+    def store(self, key: str, output_files: List[Dict[str, Any]], meta: Dict[str, Any]) -> None:
+        final_dir = self.entry_dir(key)
+        if (final_dir / "entry.json").is_file():
+            return
+        final_dir.parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=f".{key}.", dir=str(final_dir.parent)))
+        try:
+            files = []
+            for item in output_files:
+                src = Path(item["path"])
+                link_or_copy(src, staging / src.name)
+                files.append({"name": src.name, "bytes": item["bytes"], "sha256": item["sha256"]})
+            entry = dict(meta)
+            entry.update({"key": key, "cache_version": CACHE_VERSION, "files": files})
+            with (staging / "entry.json").open("w", encoding="utf-8") as handle:
+                json.dump(entry, handle, indent=2, ensure_ascii=True)
+                handle.write("\n")
+            try:
+                os.rename(staging, final_dir)
+            except OSError:
+                # Another run stored the same key first.
+                shutil.rmtree(staging, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self.evict()
+
+    def evict(self) -> List[str]:
+        """Drop least-recently-used entries until the bytes only the cache holds fit in `max_bytes`."""
+        entries = []
+        total = 0
+        for entry_json in self.root.glob("*/*/entry.json"):
+            entry_dir = entry_json.parent
+            try:
+                size = sum(exclusive_bytes(p) for p in entry_dir.iterdir())
+                last_used = entry_json.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            entries.append((last_used, size, entry_dir))
+            total += size
+        evicted = []
+        for _, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if size == 0:
+                # Every file is still linked elsewhere; removing the entry would free nothing.
+                continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            evicted.append(entry_dir.name)
+        return evicted
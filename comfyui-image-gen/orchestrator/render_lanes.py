@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Priority lanes for render jobs, on both sides of the ComfyUI queue.
+
+- `interactive` (refine, inpaint by default): fixes an agent is waiting on.
+  They go to the front of the ComfyUI queue (`"front": true` on `/prompt`),
+  so they start as soon as the prompt currently executing finishes, however
+  much bulk work is queued behind it. ComfyUI never preempts a running
+  prompt.
+- `bulk` (draft, upscale_print by default): whole-book batches, queued
+  normally.
+
+Within a batch runner, not-yet-submitted jobs wait in a `LaneQueue`, where
+`interactive` always drains first. Interactive jobs may also go
+`INTERACTIVE_HEADROOM` prompts over a server's `--max-in-flight`, so they
+are never stuck behind a full batch of bulk prompts.
+"""
+
+from __future__ import annotations
+
+import collections
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Sequence
+
+LANES = ("interactive", "bulk")
+PHASE_LANES = {
+    "draft": "bulk",
+    "refine": "interactive",
+    "inpaint": "interactive",
+    "upscale_print": "bulk",
+}
+INTERACTIVE_HEADROOM = 1
+
+
+def lane_for(phase: str, override: Optional[str] = None) -> str:
+    """`override` if given, else the phase's default lane."""
+    if override is not None:
+        if override not in LANES:
+            raise ValueError(f"unknown lane {override!r}; expected one of {', '.join(LANES)}")
+        return override
+    return PHASE_LANES.get(phase, "bulk")
+
+
+def job_lane(job: Dict[str, Any]) -> str:
+    return job["run_manifest"].get("lane") or lane_for(job["phase"])
+
+
+def lane_limit(lane: str, max_in_flight: int) -> int:
+    """How many prompts one server may have in flight before it takes no more `lane` jobs."""
+    return max_in_flight + (INTERACTIVE_HEADROOM if lane == "interactive" else 0)
+
+
+class LaneQueue:
+    """Jobs not yet submitted: one FIFO per lane, drained in `LANES` order.
+
+    Jobs pushed with `front=True` (requeues, pipeline follow-ups) leave
+    their lane first, before a `pick` gets a say, so model affinity can't
+    starve them behind same-model work.
+    """
+
+    def __init__(self) -> None:
+        self.lanes: Dict[str, Deque[Dict[str, Any]]] = {lane: collections.deque() for lane in LANES}
+        # How many jobs at the head of each lane were pushed to the front.
+        self.fronted: Dict[str, int] = {lane: 0 for lane in LANES}
+
+    def push(self, job: Dict[str, Any], front: bool = False) -> None:
+        """Add `job` to its lane; `front=True` puts it ahead of that lane's other jobs."""
+        name = job_lane(job)
+        if front:
+            self.lanes[name].appendleft(job)
+            self.fronted[name] += 1
+        else:
+            self.lanes[name].append(job)
+
+    def top_lane(self) -> Optional[str]:
+        """The lane the next job comes from, or None when empty."""
+        return next((lane for lane in LANES if self.lanes[lane]), None)
+
+    def pop(self, pick: Optional[Callable[[Sequence[Dict[str, Any]]], int]] = None) -> Dict[str, Any]:
+        """Take the next job from the top lane; `pick(jobs)` may choose one other than the first."""
+        lane = self.top_lane()
+        if lane is None:
+            raise IndexError("pop from an empty LaneQueue")
+        jobs = self.lanes[lane]
+        if self.fronted[lane]:
+            self.fronted[lane] -= 1
+            return jobs.popleft()
+        idx = pick(jobs) if pick is not None else 0
+        job = jobs[idx]
+        del jobs[idx]
+        return job
+
+    def counts(self) -> Dict[str, int]:
+        return {lane: len(jobs) for lane, jobs in self.lanes.items()}
+
+    def __len__(self) -> int:
+        return sum(len(jobs) for jobs in self.lanes.values())
+
+    def __bool__(self) -> bool:
+        return any(self.lanes.values())
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for lane in LANES:
+            yield from self.lanes[lane]
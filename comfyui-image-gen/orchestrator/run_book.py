@@ -0,0 +1,711 @@
+#!/usr/bin/env python3
+"""Batch runner that pipelines many book pages through ComfyUI concurrently."""
+
+from __future__ import annotations
+
+import argparse
+import collections
+import datetime as dt
+import functools
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from adaptive_poll import AdaptivePoller, PollTracker, manifest_runtime
+from comfy_scheduler import ComfyScheduler, NoServerError, is_server_error
+from comfy_ws import ComfyEventListener, ListenerGroup
+from contact_sheet import ContactSheets
+from job_journal import find_unfinished, read_journal, update_journal
+from model_affinity import DEFAULT_MODEL_LOAD_SECONDS, ModelAffinity, format_node_reuse
+from render_cache import RenderCache
+from render_lanes import LaneQueue, job_lane, lane_limit
+from singleflight import Singleflight
+from run_page import (
+    PHASE_CHOICES,
+    ComfyApiError,
+    ComfyClient,
+    add_cache_args,
+    add_contact_sheet_args,
+    add_cull_args,
+    add_lane_args,
+    add_metrics_args,
+    add_output_args,
+    add_poll_args,
+    add_server_args,
+    add_singleflight_args,
+    check_contact_sheet_args,
+    check_cull_args,
+    check_prompt,
+    cull_distance,
+    finalize_page_job,
+    job_journal_path,
+    join_inflight,
+    mark_job_failed,
+    now_utc_iso,
+    make_contact_sheets,
+    make_poller,
+    make_scheduler,
+    make_source_uploader,
+    open_metrics,
+    open_render_cache,
+    open_singleflight,
+    page_id,
+    prepare_page_job,
+    release_inflight,
+    resolve_server_args,
+    resume_page_job,
+    submit_page_job,
+    try_cache_hit,
+    write_dry_run_manifest,
+    write_json,
+)
+from timing_spans import MetricsSink
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Run one ComfyUI phase for many pages of a book, keeping several prompts in flight."
+    )
+    parser.add_argument(
+        "--book-dir",
+        default=None,
+        help="Book directory (books/<book_id>); alternative to --books-dir + --book-id",
+    )
+    parser.add_argument("--book-id", default=None, help="Book identifier")
+    parser.add_argument(
+        "--books-dir",
+        default="books",
+        help="Root books directory (ignored when --book-dir is set)",
+    )
+    parser.add_argument(
+        "--pages",
+        nargs="*",
+        default=None,
+        help="Page numbers/ids to run; default is every page with a renderspec.json",
+    )
+    parser.add_argument(
+        "--phase",
+        required=True,
+        choices=PHASE_CHOICES,
+        help="Workflow phase to execute for every page",
+    )
+    parser.add_argument(
+        "--source-glob",
+        default=None,
+        help=(
+            "Optional glob relative to each page dir (e.g. 'selected/*.png'); "
+            "the first sorted match is used as that page's --source-image"
+        ),
+    )
+    parser.add_argument(
+        "--comfy-input-dir",
+        default=None,
+        help="Optional ComfyUI input directory path for source image copies",
+    )
+    parser.add_argument(
+        "--upload-source",
+        action="store_true",
+        help="Upload source images through ComfyUI /upload/image, skipping ones the server already holds",
+    )
+    add_server_args(parser)
+    parser.add_argument(
+        "--workflow-dir",
+        default="workflows",
+        help="Directory containing <phase>.api.json and optional <phase>.bindings.json",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=2,
+        help="Max prompts kept queued/running at once on each ComfyUI server",
+    )
+    parser.add_argument(
+        "--timeout-seconds",
+        type=int,
+        default=1800,
+        help="Max wait time per prompt, measured from when it was queued",
+    )
+    parser.add_argument(
+        "--poll-seconds",
+        type=float,
+        default=2.0,
+        help=(
+            "Polling interval with --poll-mode fixed; with adaptive polling, the interval "
+            "used while the phase has no runtime history"
+        ),
+    )
+    add_poll_args(parser)
+    parser.add_argument(
+        "--download-workers",
+        type=int,
+        default=4,
+        help="Parallel output downloads per finished prompt",
+    )
+    parser.add_argument(
+        "--no-model-affinity",
+        action="store_true",
+        help="Queue pages in page order instead of grouping pages that share models and cached nodes",
+    )
+    parser.add_argument(
+        "--model-load-seconds",
+        type=float,
+        default=DEFAULT_MODEL_LOAD_SECONDS,
+        help="Estimated cost of one model switch, for the batch summary's time-saved figure",
+    )
+    add_lane_args(parser)
+    add_cache_args(parser)
+    add_singleflight_args(parser)
+    add_output_args(parser)
+    add_cull_args(parser)
+    add_contact_sheet_args(parser)
+    add_metrics_args(parser)
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Re-attach to unfinished journaled jobs for these pages instead of compiling new runs",
+    )
+    parser.add_argument(
+        "--websocket",
+        action="store_true",
+        help="Listen on ComfyUI /ws for completion events instead of polling /history",
+    )
+    parser.add_argument(
+        "--ws-fallback-seconds",
+        type=float,
+        default=30.0,
+        help="With --websocket, re-check /history at least this often in case an event is missed",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Compile every page workflow and write artifacts without queueing ComfyUI jobs",
+    )
+    args = parser.parse_args()
+    if args.upload_source and args.comfy_input_dir:
+        parser.error("--upload-source and --comfy-input-dir are mutually exclusive")
+    check_cull_args(parser, args)
+    check_contact_sheet_args(parser, args)
+    resolve_server_args(args)
+    return args
+
+
+def resolve_book(args: argparse.Namespace) -> Tuple[Path, str]:
+    if args.book_dir:
+        book_dir = Path(args.book_dir)
+        return book_dir.parent, book_dir.name
+    if not args.book_id:
+        raise ValueError("either --book-dir or --book-id is required")
+    return Path(args.books_dir), args.book_id
+
+
+def discover_pages(books_dir: Path, book_id: str, pages: Optional[List[str]]) -> List[str]:
+    pages_root = books_dir / book_id / "pages"
+    if pages:
+        return [page_id(raw) for raw in pages]
+    if not pages_root.is_dir():
+        raise FileNotFoundError(f"book pages directory not found: {pages_root}")
+    return sorted(p.name for p in pages_root.iterdir() if (p / "renderspec.json").is_file())
+
+
+def pick_source_image(page_dir: Path, source_glob: Optional[str]) -> Optional[Path]:
+    if not source_glob:
+        return None
+    matches = sorted(p for p in page_dir.glob(source_glob) if p.is_file())
+    if not matches:
+        raise FileNotFoundError(f"no source image matches {source_glob!r} in {page_dir}")
+    return matches[0]
+
+
+def open_listener(args: argparse.Namespace, client_id: str) -> Optional[ComfyEventListener]:
+    """Websocket listener for `--websocket` (one socket per server), or None to poll."""
+    if not args.websocket:
+        return None
+    if len(args.comfy_urls) > 1:
+        listener = ListenerGroup(args.comfy_urls, client_id)
+    else:
+        listener = ComfyEventListener(args.comfy_url, client_id)
+    if not listener.start():
+        print(f"warning: websocket unavailable ({listener.last_error}); polling /history", file=sys.stderr)
+        return None
+    return listener
+
+
+class BatchRunner:
+    """Keep up to `max_in_flight` prepared jobs on the ComfyUI queue.
+
+    Jobs come from `prepare_page_job`. Each finished prompt is downloaded and
+    its manifest written via `finalize_page_job`, exactly as `run_page.py` does.
+    `on_complete` may add follow-up jobs while the batch is running.
+
+    `max_in_flight` bounds each server's prompts in flight. Jobs waiting to be
+    submitted sit in a `LaneQueue`: `interactive` jobs (refine, inpaint) go
+    before any `bulk` job and may use `INTERACTIVE_HEADROOM` extra slots.
+
+    With a multi-server `scheduler`, each job goes to the least-loaded server
+    with a free slot, and a job whose server stops answering is requeued on
+    another one.
+
+    With `affinity`, the next job sent to a server is one that uses the models
+    it already has loaded, so mixed-model batches run in model groups.
+    """
+
+    def __init__(
+        self,
+        client: ComfyClient,
+        max_in_flight: int,
+        timeout_seconds: int,
+        poll_seconds: float,
+        on_complete: Optional[Callable[["BatchRunner", Dict[str, Any]], None]] = None,
+        listener: Optional[ComfyEventListener] = None,
+        ws_fallback_seconds: float = 30.0,
+        download_workers: int = 4,
+        cache: Optional[RenderCache] = None,
+        poller: Optional[AdaptivePoller] = None,
+        scheduler: Optional[ComfyScheduler] = None,
+        affinity: Optional[ModelAffinity] = None,
+        raw_history: bool = True,
+        content_store: bool = True,
+        metrics: Optional[MetricsSink] = None,
+        cull_distance: Optional[int] = None,
+        sheets: Optional[ContactSheets] = None,
+        flight: Optional[Singleflight] = None,
+    ) -> None:
+        self.client = client
+        self.poller = poller
+        self.scheduler = scheduler if scheduler is not None and len(scheduler.servers) > 1 else None
+        self._pollers: Dict[str, AdaptivePoller] = {}
+        self.affinity = affinity
+        self.cache = cache
+        self.raw_history = raw_history
+        self.content_store = content_store
+        self.metrics = metrics
+        self.cull_distance = cull_distance
+        self.sheets = sheets
+        self.flight = flight
+        self.download_workers = download_workers
+        self.listener = listener
+        self.ws_fallback_seconds = ws_fallback_seconds
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.timeout_seconds = timeout_seconds
+        self.poll_seconds = poll_seconds
+        self.on_complete = on_complete
+        self.pending = LaneQueue()
+        self.in_flight: List[Dict[str, Any]] = []
+        self.results: List[Dict[str, Any]] = []
+
+    def add(self, job: Dict[str, Any], front: bool = False) -> None:
+        """Queue a prepared job in its lane; `front=True` puts it ahead of the lane's pending jobs."""
+        if self.affinity is not None:
+            self.affinity.register(job)
+        self.pending.push(job, front=front)
+
+    def attach(self, job: Dict[str, Any]) -> None:
+        """Track a job whose prompt is already on the ComfyUI queue (from `--resume`)."""
+        job["submitted_monotonic"] = time.monotonic()
+        job["poll_tracker"] = self._tracker(job)
+        if self.affinity is not None:
+            self.affinity.record(self._client(job).base_url, job)
+        self.in_flight.append(job)
+
+    def _client(self, job: Dict[str, Any]) -> ComfyClient:
+        if self.scheduler is not None and job.get("comfy_url"):
+            return self.scheduler.client_for(job["comfy_url"])
+        return self.client
+
+    def _poller(self, job: Dict[str, Any]) -> Optional[AdaptivePoller]:
+        client = self._client(job)
+        if self.poller is None or client is self.client:
+            return self.poller
+        if client.base_url not in self._pollers:
+            self._pollers[client.base_url] = self.poller.sibling(client.get_queue)
+        return self._pollers[client.base_url]
+
+    def _open_urls(self, lane: str) -> List[str]:
+        """Servers (least loaded first) with a free slot for a `lane` job."""
+        limit = lane_limit(lane, self.max_in_flight)
+        if self.scheduler is None:
+            return [self.client.base_url] if len(self.in_flight) < limit else []
+        counts = collections.Counter(job.get("comfy_url") for job in self.in_flight)
+        # With every server drained, offer them all so dispatch fails the job instead of waiting forever.
+        servers = self.scheduler.ranked() or self.scheduler.servers
+        return [server.url for server in servers if counts[server.url] < limit]
+
+    def _follow_urls(self) -> List[str]:
+        """Servers whose prompts we may attach to: ours (that's where we poll) and not drained."""
+        if self.scheduler is None:
+            return [self.client.base_url]
+        return [server.url for server in self.scheduler.servers if server.healthy]
+
+    def _tracker(self, job: Dict[str, Any]) -> PollTracker:
+        if self.listener is not None:
+            return PollTracker("websocket")
+        poller = self._poller(job)
+        if poller is not None:
+            return poller.tracker(job["phase"])
+        return PollTracker("fixed")
+
+    def _release(self, job: Dict[str, Any]) -> None:
+        if self.scheduler is not None:
+            self.scheduler.release(job.get("comfy_url"))
+
+    def _requeue_elsewhere(self, job: Dict[str, Any], exc: BaseException) -> bool:
+        """Drain a failing server and put its job back in line; False if retries are used up."""
+        if self.scheduler is None or not isinstance(exc, ComfyApiError) or not is_server_error(exc):
+            return False
+        attempts = job["dispatch_attempts"] = job.get("dispatch_attempts", 0) + 1
+        if attempts >= len(self.scheduler.servers):
+            return False
+        self._release(job)
+        url = job.pop("comfy_url", None)
+        self.scheduler.drain(url, exc)
+        for key in ("prompt_id", "queue_response"):
+            job.pop(key, None)
+        for key in ("comfy_url", "singleflight"):
+            job["run_manifest"].pop(key, None)
+        # Back to `compiled`, so `--resume` never re-attaches to the prompt on the drained server.
+        update_journal(
+            job_journal_path(job),
+            "compiled",
+            comfy_url=None,
+            prompt_id=None,
+            queue_response=None,
+            run_manifest=job["run_manifest"],
+        )
+        self.pending.push(job, front=True)
+        print(f"server {url} failed ({exc}); requeueing page={job['page']} phase={job['phase']}", file=sys.stderr)
+        return True
+
+    def _wait_for_capacity(self, job: Dict[str, Any], open_urls: List[str], exc: BaseException) -> bool:
+        """After a failed dispatch: if the open servers just died but busy healthy ones remain, wait for those.
+
+        Only `NoServerError` qualifies; any other failure (a rejected workflow, a
+        local error, a prompt that may already be queued) fails the job.
+        """
+        if self.scheduler is None or not isinstance(exc, NoServerError) or self.scheduler.healthy_count() == 0:
+            return False
+        if any(self.scheduler.by_url[url].healthy for url in open_urls):
+            return False
+        self.pending.push(job, front=True)
+        return True
+
+    def _next_job(self, open_urls: List[str]) -> Dict[str, Any]:
+        """Next job of the top lane; with affinity, the one best suited to the first open server."""
+        affinity = self.affinity
+        if affinity is None:
+            return self.pending.pop()
+        target, others = open_urls[0], open_urls[1:]
+        return self.pending.pop(lambda jobs: affinity.pick(jobs, target, others))
+
+    def _record(self, job: Dict[str, Any], **fields: Any) -> Dict[str, Any]:
+        result = {
+            "page": job["page"],
+            "phase": job["phase"],
+            "run_id": job["run_id"],
+            "lane": job_lane(job),
+            "prompt_id": job.get("prompt_id"),
+        }
+        result.update(fields)
+        self.results.append(result)
+        if self.on_complete:
+            self.on_complete(self, result)
+        return result
+
+    def _fill(self) -> None:
+        while self.pending:
+            open_urls = self._open_urls(self.pending.top_lane() or "bulk")
+            if not open_urls:
+                return
+            job = self._next_job(open_urls)
+            try:
+                if join_inflight(job, self.flight, urls=self._follow_urls()):
+                    self.attach(job)
+                    leader = job["run_manifest"]["singleflight"]["leader_run_id"]
+                    print(
+                        f"attached page={job['page']} phase={job['phase']} "
+                        f"prompt_id={job['prompt_id']} leader={leader}"
+                    )
+                    continue
+                cached_manifest = try_cache_hit(
+                    job,
+                    self.cache,
+                    content_store=self.content_store,
+                    metrics=self.metrics,
+                    cull_distance=self.cull_distance,
+                    sheets=self.sheets,
+                )
+            except Exception as exc:  # pylint: disable=broad-except
+                release_inflight(job)
+                self._record(job, status="error", error=str(exc))
+                continue
+            if cached_manifest is not None:
+                self._record(
+                    job,
+                    status="cache_hit",
+                    manifest=str(cached_manifest),
+                    downloaded_files=len(job["run_manifest"]["downloaded_files"]),
+                )
+                print(f"cache hit page={job['page']} phase={job['phase']} manifest={cached_manifest}")
+                continue
+            try:
+                if self.scheduler is not None:
+                    prefer = functools.partial(self.affinity.prefers, job) if self.affinity is not None else None
+                    full = [url for url in self.scheduler.by_url if url not in open_urls]
+                    self.scheduler.dispatch(job, submit_page_job, prefer=prefer, exclude=full)
+                else:
+                    submit_page_job(self.client, job)
+            except Exception as exc:  # pylint: disable=broad-except
+                if self._wait_for_capacity(job, open_urls, exc):
+                    return
+                mark_job_failed(job, exc)
+                self._record(job, status="error", error=str(exc))
+                continue
+            job["submitted_monotonic"] = time.monotonic()
+            job["poll_tracker"] = self._tracker(job)
+            if self.affinity is not None:
+                self.affinity.record(self._client(job).base_url, job)
+            self.in_flight.append(job)
+            where = f" server={job['comfy_url']}" if self.scheduler is not None else ""
+            print(f"queued page={job['page']} phase={job['phase']} prompt_id={job['prompt_id']}{where}")
+
+    def _check_timeout(self, job: Dict[str, Any]) -> None:
+        if (time.monotonic() - job["submitted_monotonic"]) > self.timeout_seconds:
+            raise TimeoutError(f"timed out waiting for prompt {job['prompt_id']}")
+
+    def _check(self, job: Dict[str, Any]) -> bool:
+        prompt_id = job["prompt_id"]
+        tracker = job["poll_tracker"]
+        client = self._client(job)
+        poller = self._poller(job)
+        try:
+            try:
+                record = check_prompt(
+                    client,
+                    prompt_id,
+                    tracker,
+                    listener=self.listener,
+                    listening=self._listening(job),
+                    poller=poller,
+                    ws_fallback_seconds=self.ws_fallback_seconds,
+                )
+            except ComfyApiError as exc:
+                if self._requeue_elsewhere(job, exc):
+                    return True
+                raise
+            if record is None:
+                self._check_timeout(job)
+                return False
+            if self.listener is not None:
+                job["ws_timeline"] = self.listener.timeline(prompt_id)
+            manifest_path = finalize_page_job(
+                client,
+                job,
+                record,
+                download_workers=self.download_workers,
+                cache=self.cache,
+                raw_history=self.raw_history,
+                content_store=self.content_store,
+                metrics=self.metrics,
+                cull_distance=self.cull_distance,
+                sheets=self.sheets,
+            )
+            if poller is not None:
+                poller.observe(job["phase"], manifest_runtime(job["run_manifest"]))
+        except Exception as exc:  # pylint: disable=broad-except
+            mark_job_failed(job, exc)
+            self._release(job)
+            self._record(job, status="error", error=str(exc))
+            return True
+        self._release(job)
+        self._record(
+            job,
+            status="completed",
+            manifest=str(manifest_path),
+            downloaded_files=len(job["run_manifest"]["downloaded_files"]),
+        )
+        print(f"completed page={job['page']} phase={job['phase']} manifest={manifest_path}")
+        return True
+
+    def _listening(self, job: Dict[str, Any]) -> bool:
+        """True while the websocket to this job's server is up; otherwise the job is polled."""
+        return self.listener is not None and self.listener.connected_for(self._client(job).base_url)
+
+    def _idle(self) -> None:
+        listened = [job["prompt_id"] for job in self.in_flight if self._listening(job)]
+        polled = [job for job in self.in_flight if not self._listening(job)]
+        if not polled:
+            timeout = min(self.ws_fallback_seconds, self.poll_seconds * 10)
+        elif self.poller is None:
+            timeout = self.poll_seconds
+        else:
+            next_check = min(job["poll_tracker"].next_check for job in polled)
+            timeout = max(0.0, min(next_check - time.monotonic(), self.poller.max_seconds))
+        if not listened:
+            time.sleep(timeout)
+            return
+        if any(self.listener.status(pid) == "success" for pid in listened):
+            # Event seen but history not written yet.
+            time.sleep(min(self.poll_seconds, 0.2))
+            return
+        # Jobs on a server whose socket dropped are polled at their own cadence meanwhile.
+        self.listener.wait(listened, timeout=timeout)
+
+    def run(self) -> List[Dict[str, Any]]:
+        while self.pending or self.in_flight:
+            self._fill()
+            finished = [job for job in list(self.in_flight) if self._check(job)]
+            for job in finished:
+                self.in_flight.remove(job)
+            if not finished and self.in_flight:
+                self._idle()
+        return self.results
+
+
+def main() -> int:
+    args = parse_args()
+    books_dir, book_id = resolve_book(args)
+    workflow_dir = Path(args.workflow_dir)
+    comfy_input_dir = Path(args.comfy_input_dir) if args.comfy_input_dir else None
+    uploader = make_source_uploader(args, books_dir)
+
+    if args.resume and args.dry_run:
+        raise ValueError("--resume and --dry-run cannot be combined")
+
+    pages = discover_pages(books_dir, book_id, args.pages)
+    if not pages:
+        raise RuntimeError(f"no pages with renderspec.json found for book {book_id}")
+
+    batch_id = dt.datetime.now(dt.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    started_at = now_utc_iso()
+    # One client id for the whole batch so a single websocket sees every prompt.
+    client_id = str(uuid.uuid4())
+
+    jobs: List[Dict[str, Any]] = []
+    results: List[Dict[str, Any]] = []
+    affinity: Optional[ModelAffinity] = None
+    scheduler = make_scheduler(args)
+    client = scheduler.client_for(None)
+    for pid in pages:
+        page_dir = books_dir / book_id / "pages" / pid
+        if args.resume:
+            for journal_path in find_unfinished(page_dir, phase=args.phase):
+                try:
+                    # Re-attach on the server the prompt was queued on.
+                    journal_client = scheduler.client_for(read_journal(journal_path).get("comfy_url"))
+                    jobs.append(resume_page_job(journal_client, journal_path))
+                except Exception as exc:  # pylint: disable=broad-except
+                    results.append({"page": pid, "phase": args.phase, "status": "error", "error": str(exc)})
+            continue
+        try:
+            job = prepare_page_job(
+                book_id=book_id,
+                page=pid,
+                phase=args.phase,
+                renderspec_path=page_dir / "renderspec.json",
+                books_dir=books_dir,
+                workflow_dir=workflow_dir,
+                source_image=pick_source_image(page_dir, args.source_glob),
+                comfy_input_dir=comfy_input_dir,
+                dry_run=args.dry_run,
+                client_id=client_id,
+                uploader=uploader,
+                lane=args.lane,
+            )
+        except Exception as exc:  # pylint: disable=broad-except
+            results.append({"page": pid, "phase": args.phase, "status": "error", "error": str(exc)})
+            continue
+        jobs.append(job)
+    if args.resume:
+        attached = sum(1 for job in jobs if job.get("prompt_id"))
+        print(f"resuming {len(jobs)} unfinished jobs ({attached} re-attached) for phase={args.phase}")
+    else:
+        print(f"compiled {len(jobs)}/{len(pages)} page workflows for phase={args.phase}")
+
+    if args.dry_run:
+        # Report the order (and node reuse) a single server would see.
+        affinity = ModelAffinity(enabled=not args.no_model_affinity, load_seconds=args.model_load_seconds)
+        for job in affinity.plan(jobs, client.base_url):
+            dry_manifest = write_dry_run_manifest(job)
+            results.append(
+                {
+                    "page": job["page"],
+                    "phase": job["phase"],
+                    "run_id": job["run_id"],
+                    "status": "dry_run",
+                    "manifest": str(dry_manifest),
+                }
+            )
+    else:
+        if args.resume:
+            # Resumed prompts keep the client id they were queued with.
+            resumed_ids = {job["context"]["runtime"]["client_id"] for job in jobs}
+            client_id = resumed_ids.pop() if len(resumed_ids) == 1 else client_id
+        listener = open_listener(args, client_id)
+        affinity = ModelAffinity(enabled=not args.no_model_affinity, load_seconds=args.model_load_seconds)
+        for server in scheduler.servers:
+            affinity.seed_from_client(server.client)
+        runner = BatchRunner(
+            client=client,
+            max_in_flight=args.max_in_flight,
+            timeout_seconds=args.timeout_seconds,
+            poll_seconds=args.poll_seconds,
+            listener=listener,
+            ws_fallback_seconds=args.ws_fallback_seconds,
+            download_workers=args.download_workers,
+            cache=open_render_cache(args, books_dir),
+            poller=None if listener is not None else make_poller(args, client, books_dir),
+            scheduler=scheduler,
+            affinity=affinity,
+            raw_history=not args.no_raw_history,
+            content_store=not args.no_content_store,
+            metrics=open_metrics(args),
+            cull_distance=cull_distance(args),
+            sheets=make_contact_sheets(args),
+            flight=None if args.resume else open_singleflight(args, books_dir),
+        )
+        for job in jobs:
+            if job.get("prompt_id"):
+                runner.attach(job)
+            else:
+                runner.add(job)
+        try:
+            results.extend(runner.run())
+        finally:
+            if listener is not None:
+                listener.close()
+
+    failed = [r for r in results if r.get("status") == "error"]
+    summary_path = books_dir / book_id / "batches" / f"{batch_id}_{args.phase}.json"
+    write_json(
+        summary_path,
+        {
+            "batch_id": batch_id,
+            "book_id": book_id,
+            "phase": args.phase,
+            "pages": pages,
+            "max_in_flight": args.max_in_flight,
+            "servers": scheduler.report(),
+            "model_affinity": affinity.report() if affinity is not None else None,
+            "dry_run": bool(args.dry_run),
+            "started_at_utc": started_at,
+            "completed_at_utc": now_utc_iso(),
+            "results": sorted(results, key=lambda r: r["page"]),
+        },
+    )
+
+    for result in failed:
+        print(f"error: page={result['page']} {result['error']}", file=sys.stderr)
+    if affinity is not None:
+        print(f"node_reuse={format_node_reuse(affinity.report())}")
+    print(f"pages={len(pages)} failed={len(failed)}")
+    print(f"batch_summary={summary_path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    try:
+        raise SystemExit(main())
+    except Exception as exc:  # pylint: disable=broad-except
+        print(f"error: {exc}", file=sys.stderr)
+        raise SystemExit(1)
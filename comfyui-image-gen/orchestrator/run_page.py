@@ -4,20 +4,46 @@
 from __future__ import annotations
 
 import argparse
+import concurrent.futures
 import copy
 import datetime as dt
+import http.client
 import json
+import mimetypes
+import os
 import shutil
 import sys
 import time
-import urllib.error
 import urllib.parse
-import urllib.request
 import uuid
 from pathlib import Path
-from typing import Any, Dict, List, Optional
-
-
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from adaptive_poll import (
+    DEFAULT_MAX_POLL_SECONDS,
+    DEFAULT_MIN_POLL_SECONDS,
+    AdaptivePoller,
+    PollTracker,
+    parse_utc,
+)
+from comfy_http import ConnectionPool, HttpStatusError, MultipartFileBody, ResponseLostError, download_to_file
+from comfy_scheduler import DEFAULT_PROBE_SECONDS, ComfyScheduler, split_urls
+from comfy_upload import UPLOAD_INDEX_NAME, SourceUploader, UploadIndex
+from comfy_ws import ComfyEventListener
+from compact_manifests import attach_history, write_manifest
+from contact_sheet import DEFAULT_THUMB_SIZE, DEFAULT_THUMB_WORKERS, ContactSheets, label_for
+from contact_sheet import check_dependencies as check_contact_sheet_dependencies
+from content_store import ContentStore
+from job_journal import find_unfinished, journal_path_for, read_journal, update_journal
+from manifest_index import ManifestIndex, index_path_for, load_runtimes
+from near_duplicates import DEFAULT_MAX_DISTANCE, apply_cull, cull_phase_dir
+from near_duplicates import check_dependencies as check_cull_dependencies
+from render_cache import DEFAULT_CACHE_MAX_BYTES, RenderCache, sha256_file, workflow_hash
+from render_lanes import LANES, lane_for
+from singleflight import DEFAULT_WAIT_SECONDS, INFLIGHT_DIR, Singleflight
+from timing_spans import MetricsSink, SpanRecorder, add_execution_spans, spans_for
+
+DEFAULT_COMFY_URL = "http://127.0.0.1:8188"
 PHASE_CHOICES = ("draft", "refine", "inpaint", "upscale_print")
 PHASE_TO_DIR = {
     "draft": "draft",
@@ -28,7 +54,17 @@ PHASE_TO_DIR = {
 
 
 class ComfyApiError(RuntimeError):
-    """Raised when ComfyUI returns an API error."""
+    """Raised when ComfyUI returns an API error.
+
+    `status` is the HTTP status for error responses, None for transport failures.
+    `ambiguous` marks a POST that reached the server without an answer: it may
+    have been acted on, so it must not be sent again elsewhere.
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None, ambiguous: bool = False) -> None:
+        super().__init__(message)
+        self.status = status
+        self.ambiguous = ambiguous
 
 
 def parse_args() -> argparse.Namespace:
@@ -45,8 +81,8 @@ def parse_args() -> argparse.Namespace:
     )
     parser.add_argument(
         "--renderspec",
-        required=True,
-        help="Path to renderspec.json for this page",
+        default=None,
+        help="Path to renderspec.json for this page (required unless --resume)",
     )
     parser.add_argument(
         "--review",
@@ -70,10 +106,14 @@ def parse_args() -> argparse.Namespace:
         ),
     )
     parser.add_argument(
-        "--comfy-url",
-        default="http://127.0.0.1:8188",
-        help="ComfyUI base URL",
+        "--upload-source",
+        action="store_true",
+        help=(
+            "Upload --source-image through ComfyUI /upload/image under a content-hash name "
+            "(skipped when the server already holds it); alternative to --comfy-input-dir"
+        ),
     )
+    add_server_args(parser)
     parser.add_argument(
         "--workflow-dir",
         default="workflows",
@@ -94,14 +134,372 @@ def parse_args() -> argparse.Namespace:
         "--poll-seconds",
         type=float,
         default=2.0,
-        help="Polling interval while waiting for completion",
+        help=(
+            "Polling interval with --poll-mode fixed; with adaptive polling, the interval "
+            "used while the phase has no runtime history"
+        ),
+    )
+    add_poll_args(parser)
+    parser.add_argument(
+        "--download-workers",
+        type=int,
+        default=4,
+        help="Parallel output downloads (each streamed to disk)",
+    )
+    add_lane_args(parser)
+    add_cache_args(parser)
+    add_singleflight_args(parser)
+    add_output_args(parser)
+    add_cull_args(parser)
+    add_contact_sheet_args(parser)
+    add_metrics_args(parser)
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help=(
+            "Re-attach to unfinished jobs for this page/phase from jobs/*.journal.json "
+            "instead of compiling a new run"
+        ),
+    )
+    parser.add_argument(
+        "--websocket",
+        action="store_true",
+        help="Listen on ComfyUI /ws for completion events instead of polling /history",
+    )
+    parser.add_argument(
+        "--ws-fallback-seconds",
+        type=float,
+        default=30.0,
+        help="With --websocket, re-check /history at least this often in case an event is missed",
     )
     parser.add_argument(
         "--dry-run",
         action="store_true",
         help="Compile workflow and write artifacts without queueing ComfyUI job",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--variants",
+        type=int,
+        default=None,
+        help="Render N candidates in one burst (seeds render.seed, render.seed+1, ...; see --variant-mode)",
+    )
+    parser.add_argument(
+        "--seeds",
+        default=None,
+        help="Comma-separated seeds to render as one burst of candidates, instead of --variants",
+    )
+    parser.add_argument(
+        "--variant-mode",
+        choices=("seeds", "batch"),
+        default="seeds",
+        help=(
+            "seeds: one prompt per seed, all queued together; "
+            "batch: one prompt whose latent batch_size is --variants (needs the VRAM for the whole batch)"
+        ),
+    )
+    args = parser.parse_args()
+    if not args.resume and not args.renderspec:
+        parser.error("--renderspec is required unless --resume is set")
+    if args.upload_source and args.comfy_input_dir:
+        parser.error("--upload-source and --comfy-input-dir are mutually exclusive")
+    if args.variants is not None and args.variants < 1:
+        parser.error("--variants must be at least 1")
+    if args.seeds is not None:
+        if args.variants is not None:
+            parser.error("--seeds and --variants are mutually exclusive")
+        if args.variant_mode == "batch":
+            parser.error("--seeds needs --variant-mode seeds; a latent batch shares one seed")
+        try:
+            args.seeds = [int(seed) for seed in args.seeds.split(",") if seed.strip()]
+        except ValueError:
+            parser.error(f"--seeds must be comma-separated integers: {args.seeds!r}")
+        if not args.seeds or len(set(args.seeds)) != len(args.seeds):
+            parser.error("--seeds must list distinct seeds")
+    if args.resume and (args.variants is not None or args.seeds is not None):
+        parser.error("--resume re-attaches journaled variants one by one; drop --variants/--seeds")
+    check_cull_args(parser, args)
+    check_contact_sheet_args(parser, args)
+    resolve_server_args(args)
+    return args
+
+
+def add_server_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--comfy-url",
+        action="append",
+        default=None,
+        help=(
+            f"ComfyUI base URL (default {DEFAULT_COMFY_URL}); repeat or comma-separate to "
+            "dispatch each job to the least-loaded of several servers"
+        ),
+    )
+    parser.add_argument(
+        "--probe-seconds",
+        type=float,
+        default=DEFAULT_PROBE_SECONDS,
+        help="With several --comfy-url servers, re-probe /queue and /system_stats this often",
+    )
+
+
+def resolve_server_args(args: argparse.Namespace) -> None:
+    """Set `args.comfy_urls` (all servers) and `args.comfy_url` (the first)."""
+    args.comfy_urls = split_urls(args.comfy_url, DEFAULT_COMFY_URL)
+    args.comfy_url = args.comfy_urls[0]
+
+
+def make_scheduler(args: argparse.Namespace) -> ComfyScheduler:
+    pool_size = max(4, args.download_workers)
+    return ComfyScheduler(
+        args.comfy_urls,
+        lambda url: ComfyClient(base_url=url, pool_size=pool_size),
+        probe_seconds=args.probe_seconds,
+    )
+
+
+def add_poll_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--poll-mode",
+        choices=("adaptive", "fixed"),
+        default="adaptive",
+        help=(
+            "adaptive: read /queue and back off by queue position and the phase's past runtimes; "
+            "fixed: poll /history every --poll-seconds"
+        ),
+    )
+    parser.add_argument(
+        "--min-poll-seconds",
+        type=float,
+        default=DEFAULT_MIN_POLL_SECONDS,
+        help="Shortest adaptive poll interval (used as a prompt nears its expected finish)",
+    )
+    parser.add_argument(
+        "--max-poll-seconds",
+        type=float,
+        default=DEFAULT_MAX_POLL_SECONDS,
+        help="Longest adaptive poll interval (long queues and slow phases)",
+    )
+
+
+def make_poller(args: argparse.Namespace, client: "ComfyClient", books_dir: Path) -> Optional[AdaptivePoller]:
+    if args.poll_mode != "adaptive":
+        return None
+    return AdaptivePoller(
+        client.get_queue,
+        runtimes=load_runtimes(books_dir),
+        fallback_seconds=args.poll_seconds,
+        min_seconds=args.min_poll_seconds,
+        max_seconds=args.max_poll_seconds,
+    )
+
+
+def add_cache_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="Render cache directory (default: <books-dir>/.render_cache)",
+    )
+    parser.add_argument(
+        "--cache-max-bytes",
+        type=int,
+        default=DEFAULT_CACHE_MAX_BYTES,
+        help="Evict least-recently-used cache entries while files only the cache holds exceed this size",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always queue the workflow; don't read or write the render cache",
+    )
+
+
+def add_lane_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--lane",
+        choices=LANES,
+        default=None,
+        help=(
+            "Priority lane; interactive jobs go to the front of the ComfyUI queue "
+            "(default: interactive for refine/inpaint, bulk for draft/upscale_print)"
+        ),
+    )
+
+
+def add_singleflight_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--no-singleflight",
+        action="store_true",
+        help=(
+            "Always queue our own prompt, even when another run is already rendering the same "
+            "compiled workflow"
+        ),
+    )
+    parser.add_argument(
+        "--singleflight-wait",
+        type=float,
+        default=DEFAULT_WAIT_SECONDS,
+        help="How long to wait for another run's prompt id before queueing our own",
+    )
+
+
+def add_output_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--no-raw-history",
+        action="store_true",
+        help="Don't keep the raw /history record gzipped next to each run manifest",
+    )
+    parser.add_argument(
+        "--no-content-store",
+        action="store_true",
+        help="Write outputs as plain files instead of hardlinks into books/<book_id>/objects/",
+    )
+
+
+def add_cull_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--cull-near-duplicates",
+        action="store_true",
+        help=(
+            "After download, move outputs perceptually near-identical to another image in the phase "
+            "directory into <phase>/near_duplicates/ (needs numpy and Pillow)"
+        ),
+    )
+    parser.add_argument(
+        "--cull-distance",
+        type=int,
+        default=DEFAULT_MAX_DISTANCE,
+        help="Largest perceptual-hash Hamming distance (of 64 bits) that counts as a near-duplicate",
+    )
+
+
+def check_cull_args(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    """Fail at startup, not after the render, if culling can't run."""
+    if args.cull_distance < 0:
+        parser.error("--cull-distance must be >= 0")
+    if args.cull_near_duplicates:
+        try:
+            check_cull_dependencies()
+        except RuntimeError as exc:
+            parser.error(str(exc))
+
+
+def cull_distance(args: argparse.Namespace) -> Optional[int]:
+    """`--cull-distance` when `--cull-near-duplicates` is on, else None."""
+    return args.cull_distance if args.cull_near_duplicates else None
+
+
+def add_contact_sheet_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--contact-sheet",
+        action="store_true",
+        help=(
+            "After download, write thumbnails and one labelled contact sheet per run under "
+            "pages/<page>/thumbs/ (needs Pillow)"
+        ),
+    )
+    parser.add_argument(
+        "--thumb-size",
+        type=int,
+        default=DEFAULT_THUMB_SIZE,
+        help="Thumbnail long edge in pixels",
+    )
+    parser.add_argument(
+        "--sheet-columns",
+        type=int,
+        default=0,
+        help="Contact sheet columns (0 = roughly square)",
+    )
+    parser.add_argument(
+        "--thumb-workers",
+        type=int,
+        default=DEFAULT_THUMB_WORKERS,
+        help="Threads decoding and downscaling outputs for thumbnails",
+    )
+
+
+def check_contact_sheet_args(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    """Fail at startup, not after the render, if contact sheets can't be built."""
+    if args.thumb_size < 16:
+        parser.error("--thumb-size must be at least 16")
+    if args.sheet_columns < 0:
+        parser.error("--sheet-columns must be >= 0")
+    if args.thumb_workers < 1:
+        parser.error("--thumb-workers must be at least 1")
+    if args.contact_sheet:
+        try:
+            check_contact_sheet_dependencies()
+        except RuntimeError as exc:
+            parser.error(str(exc))
+
+
+def make_contact_sheets(args: argparse.Namespace) -> Optional[ContactSheets]:
+    if not args.contact_sheet or getattr(args, "dry_run", False):
+        return None
+    return ContactSheets(size=args.thumb_size, columns=args.sheet_columns, workers=args.thumb_workers)
+
+
+def add_metrics_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--metrics-jsonl",
+        default=None,
+        help="Append each finished run's stage timings to this JSONL file",
+    )
+    parser.add_argument(
+        "--metrics-prom",
+        default=None,
+        help="Keep cumulative stage timings in this Prometheus textfile (node_exporter textfile collector)",
+    )
+
+
+def open_metrics(args: argparse.Namespace) -> Optional[MetricsSink]:
+    if not args.metrics_jsonl and not args.metrics_prom:
+        return None
+    return MetricsSink(
+        jsonl_path=Path(args.metrics_jsonl) if args.metrics_jsonl else None,
+        prom_path=Path(args.metrics_prom) if args.metrics_prom else None,
+    )
+
+
+def make_source_uploader(args: argparse.Namespace, books_dir: Path) -> Optional[SourceUploader]:
+    if not args.upload_source:
+        return None
+    return SourceUploader(UploadIndex(books_dir / UPLOAD_INDEX_NAME))
+
+
+def open_singleflight(args: argparse.Namespace, books_dir: Path) -> Optional[Singleflight]:
+    if args.no_singleflight or getattr(args, "dry_run", False):
+        return None
+    return Singleflight(books_dir / INFLIGHT_DIR, wait_seconds=args.singleflight_wait)
+
+
+def open_render_cache(args: argparse.Namespace, books_dir: Path) -> Optional[RenderCache]:
+    if args.no_cache or getattr(args, "dry_run", False):
+        return None
+    root = Path(args.cache_dir) if args.cache_dir else books_dir / ".render_cache"
+    return RenderCache(root, max_bytes=args.cache_max_bytes)
+
+
+def new_run_id() -> str:
+    return dt.datetime.now(dt.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def reserve_run_id(jobs_dir: Path, phase: str, tag: str = "") -> str:
+    """A new run id whose compiled workflow name is still free in `jobs_dir`.
+
+    Runs of one page started in the same second (e.g. two agents that go on
+    to share a prompt) get `-2`, `-3`, ... instead of overwriting each
+    other's files. The compiled workflow file is created empty to hold the name.
+    """
+    jobs_dir.mkdir(parents=True, exist_ok=True)
+    base = new_run_id()
+    attempt = 1
+    while True:
+        run_id = base if attempt == 1 else f"{base}-{attempt}"
+        reserved = jobs_dir / f"{run_id}_{phase}{tag}_compiled_workflow.json"
+        try:
+            os.close(os.open(reserved, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+        except FileExistsError:
+            attempt += 1
+            continue
+        return run_id
 
 
 def now_utc_iso() -> str:
@@ -128,8 +526,12 @@ def write_json(path: Path, payload: Any) -> None:
 
 
 def resolve_dotted(data: Any, dotted: str) -> Any:
+    return resolve_parts(data, tuple(dotted.split(".")), dotted)
+
+
+def resolve_parts(data: Any, parts: Tuple[str, ...], dotted: str) -> Any:
     cur = data
-    for part in dotted.split("."):
+    for part in parts:
         if isinstance(cur, dict) and part in cur:
             cur = cur[part]
             continue
@@ -137,28 +539,43 @@ def resolve_dotted(data: Any, dotted: str) -> Any:
     return cur
 
 
-def interpolate_template(template: str, context: Dict[str, Any]) -> str:
-    output = []
-    i = 0
-    while i < len(template):
-        start = template.find("{", i)
-        if start < 0:
-            output.append(template[i:])
-            break
-        end = template.find("}", start + 1)
-        if end < 0:
-            output.append(template[i:])
-            break
-        output.append(template[i:start])
-        token = template[start + 1 : end].strip()
-        if token:
+class CompiledTemplate:
+    """A `{dotted.path}` template split once into literal and placeholder parts."""
+
+    def __init__(self, template: str) -> None:
+        self.parts: List[Tuple[str, Tuple[str, ...]]] = []
+        i = 0
+        while i < len(template):
+            start = template.find("{", i)
+            if start < 0:
+                self.parts.append((template[i:], ()))
+                break
+            end = template.find("}", start + 1)
+            if end < 0:
+                self.parts.append((template[i:], ()))
+                break
+            self.parts.append((template[i:start], ()))
+            token = template[start + 1 : end].strip()
+            if token:
+                self.parts.append((token, tuple(token.split("."))))
+            i = end + 1
+
+    def render(self, context: Dict[str, Any]) -> str:
+        output = []
+        for text, path in self.parts:
+            if not path:
+                output.append(text)
+                continue
             try:
-                value = resolve_dotted(context, token)
+                value = resolve_parts(context, path, text)
             except KeyError as exc:
-                raise KeyError(f"template placeholder not found: {token}") from exc
+                raise KeyError(f"template placeholder not found: {text}") from exc
             output.append(str(value))
-        i = end + 1
-    return "".join(output)
+        return "".join(output)
+
+
+def interpolate_template(template: str, context: Dict[str, Any]) -> str:
+    return CompiledTemplate(template).render(context)
 
 
 def set_node_input(workflow: Dict[str, Any], node_id: str, input_name: str, value: Any) -> None:
@@ -171,76 +588,164 @@ def set_node_input(workflow: Dict[str, Any], node_id: str, input_name: str, valu
     inputs[input_name] = value
 
 
+_MISSING = object()
+
+
+def set_latent_batch_size(workflow: Dict[str, Any], batch_size: int) -> List[str]:
+    """Set `batch_size` on every latent node that has one; returns their ids.
+
+    Nodes are replaced rather than edited in place, since a compiled workflow
+    shares the nodes no binding touched with the cached phase template.
+    """
+    node_ids = [
+        node_id
+        for node_id, node in workflow.items()
+        if isinstance(node, dict)
+        and "Latent" in str(node.get("class_type", ""))
+        and isinstance((node.get("inputs") or {}).get("batch_size"), int)
+    ]
+    if not node_ids:
+        raise ValueError("workflow has no latent node with an integer batch_size input")
+    for node_id in node_ids:
+        node = workflow[node_id]
+        workflow[node_id] = dict(node, inputs=dict(node["inputs"], batch_size=batch_size))
+    return node_ids
+
+
+class BindingStep:
+    """One pre-parsed bindings action; `resolve` yields the value to set."""
+
+    def __init__(self, idx: int, action: Dict[str, Any]) -> None:
+        self.op = action.get("op", "set")
+        self.node_id = str(action["node"])
+        self.input_name = str(action["input"])
+        self.optional = bool(action.get("optional", False))
+        self.value: Any = _MISSING
+        self.source: Optional[Tuple[str, Tuple[str, ...]]] = None
+        self.default: Any = action.get("default", _MISSING)
+        self.template: Optional[CompiledTemplate] = None
+        # Errors a bindings file would raise on every page are captured once
+        # and re-raised at apply time so `optional` still turns them into skips.
+        self.error: Optional[Exception] = None
+        if self.op == "set":
+            if "value" in action:
+                self.value = action["value"]
+            elif "from" in action:
+                dotted = str(action["from"])
+                self.source = (dotted, tuple(dotted.split(".")))
+            else:
+                self.error = ValueError(f"binding action #{idx}: set requires value or from")
+        elif self.op == "format":
+            if "template" in action:
+                self.template = CompiledTemplate(str(action["template"]))
+            else:
+                self.error = KeyError("template")
+        else:
+            self.error = ValueError(f"unsupported binding op: {self.op}")
+
+    def resolve(self, context: Dict[str, Any]) -> Any:
+        if self.error is not None:
+            raise copy.copy(self.error)
+        if self.template is not None:
+            return self.template.render(context)
+        if self.source is None:
+            return self.value
+        dotted, parts = self.source
+        try:
+            return resolve_parts(context, parts, dotted)
+        except KeyError:
+            if self.default is _MISSING:
+                raise
+            return self.default
+
+
+class BindingPlan:
+    """A bindings file compiled once and applied to many page contexts.
+
+    Holds pre-tokenized templates, pre-split dotted paths and the set of
+    workflow nodes the actions touch.
+    """
+
+    def __init__(self, bindings: Optional[Dict[str, Any]]) -> None:
+        self.steps: List[BindingStep] = []
+        self.touched_nodes: Tuple[str, ...] = ()
+        if not bindings:
+            return
+        actions = bindings.get("actions", [])
+        if not isinstance(actions, list):
+            raise TypeError("bindings.actions must be a list")
+        for idx, action in enumerate(actions):
+            if not isinstance(action, dict):
+                raise TypeError(f"binding action #{idx} is not an object")
+            self.steps.append(BindingStep(idx, action))
+        self.touched_nodes = tuple(dict.fromkeys(step.node_id for step in self.steps))
+
+    def apply_in_place(self, workflow: Dict[str, Any], context: Dict[str, Any]) -> List[Dict[str, Any]]:
+        applied = []
+        for step in self.steps:
+            try:
+                value = step.resolve(context)
+                set_node_input(workflow, node_id=step.node_id, input_name=step.input_name, value=value)
+                applied.append(
+                    {
+                        "op": step.op,
+                        "node": step.node_id,
+                        "input": step.input_name,
+                        "value_preview": (
+                            value if isinstance(value, (int, float, bool)) else str(value)[:200]
+                        ),
+                    }
+                )
+            except Exception as exc:
+                if not step.optional:
+                    raise
+                applied.append(
+                    {
+                        "op": step.op,
+                        "node": step.node_id,
+                        "input": step.input_name,
+                        "skipped_optional": True,
+                        "reason": str(exc),
+                    }
+                )
+        return applied
+
+    def apply(
+        self, workflow: Dict[str, Any], context: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """Return `(compiled_workflow, applied)` without mutating `workflow`.
+
+        Only touched nodes (and their `inputs` dicts) are copied; untouched
+        nodes are shared with `workflow`, so treat the result as read-only
+        or copy a node before changing it.
+        """
+        compiled = dict(workflow)
+        for node_id in self.touched_nodes:
+            node = compiled.get(node_id)
+            if isinstance(node, dict):
+                node = dict(node)
+                if isinstance(node.get("inputs"), dict):
+                    node["inputs"] = dict(node["inputs"])
+                compiled[node_id] = node
+        return compiled, self.apply_in_place(compiled, context)
+
+
+def compile_bindings(bindings: Optional[Dict[str, Any]]) -> BindingPlan:
+    return BindingPlan(bindings)
+
+
 def apply_bindings(
     workflow: Dict[str, Any],
     bindings: Optional[Dict[str, Any]],
     context: Dict[str, Any],
 ) -> List[Dict[str, Any]]:
-    applied = []
-    if not bindings:
-        return applied
-    actions = bindings.get("actions", [])
-    if not isinstance(actions, list):
-        raise TypeError("bindings.actions must be a list")
-
-    for idx, action in enumerate(actions):
-        if not isinstance(action, dict):
-            raise TypeError(f"binding action #{idx} is not an object")
-        op = action.get("op", "set")
-        node_id = str(action["node"])
-        input_name = str(action["input"])
-        optional = bool(action.get("optional", False))
-
-        try:
-            if op == "set":
-                if "value" in action:
-                    value = action["value"]
-                elif "from" in action:
-                    source = str(action["from"])
-                    try:
-                        value = resolve_dotted(context, source)
-                    except KeyError:
-                        if "default" in action:
-                            value = action["default"]
-                        else:
-                            raise
-                else:
-                    raise ValueError(f"binding action #{idx}: set requires value or from")
-            elif op == "format":
-                template = str(action["template"])
-                value = interpolate_template(template, context)
-            else:
-                raise ValueError(f"unsupported binding op: {op}")
-
-            set_node_input(workflow, node_id=node_id, input_name=input_name, value=value)
-            applied.append(
-                {
-                    "op": op,
-                    "node": node_id,
-                    "input": input_name,
-                    "value_preview": (
-                        value if isinstance(value, (int, float, bool)) else str(value)[:200]
-                    ),
-                }
-            )
-        except Exception as exc:
-            if not optional:
-                raise
-            applied.append(
-                {
-                    "op": op,
-                    "node": node_id,
-                    "input": input_name,
-                    "skipped_optional": True,
-                    "reason": str(exc),
-                }
-            )
-    return applied
+    return compile_bindings(bindings).apply_in_place(workflow, context)
 
 
 class ComfyClient:
-    def __init__(self, base_url: str) -> None:
+    def __init__(self, base_url: str, pool_size: int = 4, request_timeout: float = 60.0) -> None:
         self.base_url = base_url.rstrip("/")
+        self.pool = ConnectionPool(self.base_url, max_size=pool_size, timeout=request_timeout)
 
     def _request_json(
         self,
@@ -249,23 +754,23 @@ class ComfyClient:
         payload: Optional[Dict[str, Any]] = None,
         query: Optional[Dict[str, str]] = None,
     ) -> Dict[str, Any]:
-        url = self.base_url + path
+        target = path
         if query:
-            url += "?" + urllib.parse.urlencode(query)
+            target += "?" + urllib.parse.urlencode(query)
         data = None
         headers = {}
         if payload is not None:
             data = json.dumps(payload).encode("utf-8")
             headers["Content-Type"] = "application/json"
-        req = urllib.request.Request(url=url, method=method.upper(), data=data, headers=headers)
         try:
-            with urllib.request.urlopen(req) as resp:  # noqa: S310
-                body = resp.read().decode("utf-8")
-        except urllib.error.HTTPError as exc:
-            details = exc.read().decode("utf-8", errors="replace")
-            raise ComfyApiError(f"{method} {path} failed: HTTP {exc.code} {details}") from exc
-        except urllib.error.URLError as exc:
-            raise ComfyApiError(f"{method} {path} failed: {exc.reason}") from exc
+            _, raw = self.pool.request(method, target, body=data, headers=headers)
+        except HttpStatusError as exc:
+            details = exc.body.decode("utf-8", errors="replace")
+            raise ComfyApiError(f"{method} {path} failed: HTTP {exc.status} {details}", status=exc.status) from exc
+        except (OSError, http.client.HTTPException) as exc:
+            ambiguous = isinstance(exc, ResponseLostError)
+            raise ComfyApiError(f"{method} {path} failed: {exc}", ambiguous=ambiguous) from exc
+        body = raw.decode("utf-8")
         if not body:
             return {}
         try:
@@ -277,31 +782,100 @@ class ComfyClient:
         return parsed
 
     def _request_bytes(self, path: str, query: Dict[str, str]) -> bytes:
-        url = self.base_url + path + "?" + urllib.parse.urlencode(query)
-        req = urllib.request.Request(url=url, method="GET")
+        target = path + "?" + urllib.parse.urlencode(query)
         try:
-            with urllib.request.urlopen(req) as resp:  # noqa: S310
-                return resp.read()
-        except urllib.error.HTTPError as exc:
-            details = exc.read().decode("utf-8", errors="replace")
-            raise ComfyApiError(f"GET {path} failed: HTTP {exc.code} {details}") from exc
-        except urllib.error.URLError as exc:
-            raise ComfyApiError(f"GET {path} failed: {exc.reason}") from exc
-
-    def queue_prompt(self, prompt: Dict[str, Any], client_id: str) -> Dict[str, Any]:
-        payload = {"prompt": prompt, "client_id": client_id}
+            _, data = self.pool.request("GET", target)
+        except HttpStatusError as exc:
+            details = exc.body.decode("utf-8", errors="replace")
+            raise ComfyApiError(f"GET {path} failed: HTTP {exc.status} {details}", status=exc.status) from exc
+        except (OSError, http.client.HTTPException) as exc:
+            raise ComfyApiError(f"GET {path} failed: {exc}") from exc
+        return data
+
+    def queue_prompt(self, prompt: Dict[str, Any], client_id: str, front: bool = False) -> Dict[str, Any]:
+        """Queue `prompt`; `front=True` puts it ahead of everything pending on the server."""
+        payload: Dict[str, Any] = {"prompt": prompt, "client_id": client_id}
+        if front:
+            payload["front"] = True
         return self._request_json("POST", "/prompt", payload=payload)
 
     def get_prompt_history(self, prompt_id: str) -> Dict[str, Any]:
         return self._request_json("GET", f"/history/{prompt_id}")
 
-    def fetch_output(self, ref: Dict[str, Any]) -> bytes:
-        query = {
+    def get_history(self, max_items: int) -> Dict[str, Any]:
+        """The newest `max_items` history records, keyed by prompt id."""
+        return self._request_json("GET", "/history", query={"max_items": str(max_items)})
+
+    def get_queue(self) -> Dict[str, Any]:
+        return self._request_json("GET", "/queue")
+
+    def get_system_stats(self) -> Dict[str, Any]:
+        return self._request_json("GET", "/system_stats")
+
+    def get_object_info(self) -> Dict[str, Any]:
+        return self._request_json("GET", "/object_info")
+
+    def upload_image(
+        self,
+        path: Path,
+        name: str,
+        subfolder: str = "",
+        overwrite: bool = True,
+    ) -> Dict[str, Any]:
+        """Stream `path` to `/upload/image` as input `name`; returns `{name, subfolder, type}`."""
+        fields = {"type": "input", "subfolder": subfolder, "overwrite": "true" if overwrite else "false"}
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        with MultipartFileBody(fields, "image", path, name, content_type) as body:
+            try:
+                _, raw = self.pool.request("POST", "/upload/image", body=body, headers=body.headers())
+            except HttpStatusError as exc:
+                details = exc.body.decode("utf-8", errors="replace")
+                raise ComfyApiError(f"POST /upload/image failed: HTTP {exc.status} {details}", status=exc.status) from exc
+            except (OSError, http.client.HTTPException) as exc:
+                raise ComfyApiError(f"POST /upload/image failed: {exc}") from exc
+        try:
+            parsed = json.loads(raw.decode("utf-8"))
+        except json.JSONDecodeError as exc:
+            raise ComfyApiError("POST /upload/image returned non-JSON payload") from exc
+        if not isinstance(parsed, dict) or not parsed.get("name"):
+            raise ComfyApiError(f"POST /upload/image returned no name: {parsed}")
+        return parsed
+
+    def has_input(self, name: str, subfolder: str = "") -> bool:
+        """Check with `HEAD /view` whether the server's input dir holds `name`."""
+        query = {"filename": name, "subfolder": subfolder, "type": "input"}
+        try:
+            self.pool.request("HEAD", "/view?" + urllib.parse.urlencode(query))
+        except HttpStatusError as exc:
+            if exc.status == 404:
+                return False
+            # Servers that refuse HEAD can't be checked; trust the upload index.
+            return True
+        except (OSError, http.client.HTTPException) as exc:
+            raise ComfyApiError(f"HEAD /view failed: {exc}") from exc
+        return True
+
+    @staticmethod
+    def _view_query(ref: Dict[str, Any]) -> Dict[str, str]:
+        return {
             "filename": str(ref.get("filename", "")),
             "subfolder": str(ref.get("subfolder", "")),
             "type": str(ref.get("type", "output")),
         }
-        return self._request_bytes("/view", query=query)
+
+    def fetch_output(self, ref: Dict[str, Any]) -> bytes:
+        return self._request_bytes("/view", query=self._view_query(ref))
+
+    def download_output(self, ref: Dict[str, Any], target: Path) -> Dict[str, Any]:
+        """Stream one output straight to `target`; returns path, size and sha256."""
+        target_path = "/view?" + urllib.parse.urlencode(self._view_query(ref))
+        try:
+            return download_to_file(self.pool, target_path, target)
+        except HttpStatusError as exc:
+            details = exc.body.decode("utf-8", errors="replace")
+            raise ComfyApiError(f"GET /view failed: HTTP {exc.status} {details}", status=exc.status) from exc
+        except (OSError, http.client.HTTPException) as exc:
+            raise ComfyApiError(f"GET /view failed: {exc}") from exc
 
 
 def extract_history_record(history_payload: Dict[str, Any], prompt_id: str) -> Optional[Dict[str, Any]]:
@@ -343,30 +917,166 @@ def collect_output_refs(record: Dict[str, Any]) -> List[Dict[str, Any]]:
     return refs
 
 
+def record_is_complete(record: Dict[str, Any], prompt_id: str) -> bool:
+    """True once a history record has outputs or a completed status; raises if it failed."""
+    status = record.get("status", {})
+    refs = collect_output_refs(record)
+    if refs:
+        return True
+    if isinstance(status, dict):
+        status_str = str(status.get("status_str", "")).lower()
+        if status.get("completed") is True or status_str in {"success", "succeeded", "completed"}:
+            return True
+        if status_str in {"error", "failed"}:
+            raise RuntimeError(f"prompt {prompt_id} failed with status {status_str}")
+    return False
+
+
+def completed_record(client: ComfyClient, prompt_id: str) -> Optional[Dict[str, Any]]:
+    """Return the history record if the prompt has finished, otherwise None."""
+    history_payload = client.get_prompt_history(prompt_id)
+    record = extract_history_record(history_payload, prompt_id)
+    if record and record_is_complete(record, prompt_id):
+        return record
+    return None
+
+
+def check_prompt(
+    client: ComfyClient,
+    prompt_id: str,
+    tracker: PollTracker,
+    listener: Optional[Any] = None,
+    listening: bool = False,
+    poller: Optional[AdaptivePoller] = None,
+    ws_fallback_seconds: float = 30.0,
+) -> Optional[Dict[str, Any]]:
+    """One look at `prompt_id`: its history record once it has finished, else None.
+
+    While `listening` (the listener's socket to this prompt's server is up),
+    `/history` is only read after a success event for this prompt or once its
+    own `ws_fallback_seconds` recheck is due. Otherwise a `poller` reads
+    `/history` only after the prompt has left the shared `/queue` snapshot, and
+    without one every call reads it. Raises RuntimeError if the prompt failed.
+    """
+    if listener is not None:
+        event_status = listener.status(prompt_id)
+        if event_status in ("error", "interrupted"):
+            reason = listener.error_message(prompt_id)
+            raise RuntimeError(f"prompt {prompt_id} failed with status {event_status}: {reason}")
+    now = time.monotonic()
+    if listening:
+        if listener.status(prompt_id) != "success" and now - tracker.history_checked < ws_fallback_seconds:
+            return None
+    elif poller is not None:
+        if not tracker.due(now):
+            return None
+        state, ahead = poller.locate(prompt_id, tracker)
+        if state != "absent":
+            poller.schedule(tracker, state, ahead)
+            return None
+    tracker.history_checked = now
+    tracker.history_polls += 1
+    record = completed_record(client, prompt_id)
+    if record is None:
+        if poller is not None and not listening:
+            poller.schedule(tracker, "absent", 0)
+        return None
+    tracker.detected_at = time.time()
+    return record
+
+
+def wait_for_all(
+    client: ComfyClient,
+    prompt_ids: List[str],
+    timeout_seconds: int,
+    poll_seconds: float,
+    listener: Optional[ComfyEventListener] = None,
+    ws_fallback_seconds: float = 30.0,
+    poller: Optional[AdaptivePoller] = None,
+    trackers: Optional[Dict[str, PollTracker]] = None,
+) -> Iterator[Tuple[str, Optional[Dict[str, Any]], Optional[str]]]:
+    """Yield `(prompt_id, history_record, error)` as each of `prompt_ids` finishes.
+
+    One loop serves every prompt; each is looked at with `check_prompt`. With a
+    connected `listener`, a prompt's `/history` is only read once its completion
+    event arrives (or every `ws_fallback_seconds`). With a `poller`, one shared
+    `/queue` snapshot decides when each prompt is looked at again. Otherwise
+    `/history` is polled every `poll_seconds`. A failed prompt yields no record,
+    only its `error`. Poll counts accumulate on `trackers[prompt_id]`. Raises
+    TimeoutError if any prompt is still unfinished after `timeout_seconds`.
+    """
+    trackers = trackers if trackers is not None else {}
+    for prompt_id in prompt_ids:
+        trackers.setdefault(prompt_id, PollTracker("fixed"))
+    remaining = list(prompt_ids)
+    start = time.time()
+    while remaining:
+        listening = listener is not None and listener.connected
+        for prompt_id in list(remaining):
+            try:
+                record = check_prompt(
+                    client,
+                    prompt_id,
+                    trackers[prompt_id],
+                    listener=listener,
+                    listening=listening,
+                    poller=poller,
+                    ws_fallback_seconds=ws_fallback_seconds,
+                )
+            except ComfyApiError:
+                raise
+            except RuntimeError as exc:
+                remaining.remove(prompt_id)
+                yield prompt_id, None, str(exc)
+                continue
+            if record is not None:
+                remaining.remove(prompt_id)
+                yield prompt_id, record, None
+        if not remaining:
+            return
+        time_left = timeout_seconds - (time.time() - start)
+        if time_left < 0:
+            raise TimeoutError(f"timed out waiting for prompt {', '.join(remaining)}")
+        if listening and any(listener.status(pid) == "success" for pid in remaining):
+            # Completion event can land just before the history entry is written.
+            time.sleep(min(poll_seconds, 0.2))
+        elif listening:
+            listener.wait(remaining, timeout=min(ws_fallback_seconds, max(time_left, 0.0)))
+        elif poller is not None:
+            next_check = min(trackers[pid].next_check for pid in remaining)
+            time.sleep(min(max(0.0, next_check - time.monotonic()), max(time_left, 0.0) + 0.01))
+        else:
+            time.sleep(poll_seconds)
+
+
 def wait_for_completion(
     client: ComfyClient,
     prompt_id: str,
     timeout_seconds: int,
     poll_seconds: float,
+    listener: Optional[ComfyEventListener] = None,
+    ws_fallback_seconds: float = 30.0,
+    poller: Optional[AdaptivePoller] = None,
+    tracker: Optional[PollTracker] = None,
 ) -> Dict[str, Any]:
-    start = time.time()
-    while True:
-        history_payload = client.get_prompt_history(prompt_id)
-        record = extract_history_record(history_payload, prompt_id)
-        if record:
-            status = record.get("status", {})
-            refs = collect_output_refs(record)
-            if refs:
-                return record
-            if isinstance(status, dict):
-                status_str = str(status.get("status_str", "")).lower()
-                if status.get("completed") is True or status_str in {"success", "succeeded", "completed"}:
-                    return record
-                if status_str in {"error", "failed"}:
-                    raise RuntimeError(f"prompt {prompt_id} failed with status {status_str}")
-        if (time.time() - start) > timeout_seconds:
-            raise TimeoutError(f"timed out waiting for prompt {prompt_id}")
-        time.sleep(poll_seconds)
+    """Wait until `prompt_id` finishes and return its history record (see `wait_for_all`)."""
+    trackers = {prompt_id: tracker if tracker is not None else PollTracker("fixed")}
+    waiter = wait_for_all(
+        client,
+        [prompt_id],
+        timeout_seconds,
+        poll_seconds,
+        listener=listener,
+        ws_fallback_seconds=ws_fallback_seconds,
+        poller=poller,
+        trackers=trackers,
+    )
+    for _, record, error in waiter:
+        if error is not None:
+            raise RuntimeError(error)
+        assert record is not None
+        return record
+    raise TimeoutError(f"timed out waiting for prompt {prompt_id}")
 
 
 def find_workflow_file(workflow_dir: Path, phase: str) -> Path:
@@ -390,6 +1100,45 @@ def find_bindings_file(workflow_dir: Path, phase: str) -> Optional[Path]:
     return None
 
 
+_PHASE_ASSETS: Dict[Tuple[str, str], Tuple[Tuple[Any, ...], Any]] = {}
+
+
+def _file_stamp(path: Optional[Path]) -> Tuple[Any, ...]:
+    if path is None:
+        return ()
+    stat = path.stat()
+    return (str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+
+
+def load_phase_assets(
+    workflow_dir: Path, phase: str
+) -> Tuple[Path, Dict[str, Any], Optional[Path], BindingPlan]:
+    """Load a phase's workflow and compiled binding plan, memoized per file version.
+
+    The returned workflow is shared between callers and must not be mutated;
+    `BindingPlan.apply` copies only the nodes it changes.
+    """
+    workflow_file = find_workflow_file(workflow_dir=workflow_dir, phase=phase)
+    bindings_file = find_bindings_file(workflow_dir=workflow_dir, phase=phase)
+    key = (str(workflow_dir.resolve()), phase)
+    stamp = (_file_stamp(workflow_file), _file_stamp(bindings_file))
+    cached = _PHASE_ASSETS.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    workflow_payload = read_json(workflow_file)
+    if not isinstance(workflow_payload, dict):
+        raise TypeError(f"workflow must be a JSON object: {workflow_file}")
+    bindings_payload = None
+    if bindings_file:
+        bindings_payload = read_json(bindings_file)
+        if not isinstance(bindings_payload, dict):
+            raise TypeError(f"bindings must be a JSON object: {bindings_file}")
+    assets = (workflow_file, workflow_payload, bindings_file, compile_bindings(bindings_payload))
+    _PHASE_ASSETS[key] = (stamp, assets)
+    return assets
+
+
 def ensure_page_layout(books_dir: Path, book_id: str, page_name: str) -> Path:
     page_dir = books_dir / book_id / "pages" / page_name
     for rel in ("draft", "selected", "refine", "final", "jobs"):
@@ -402,6 +1151,7 @@ def maybe_copy_source_image(
     comfy_input_dir: Optional[Path],
     page_name: str,
     phase: str,
+    uploader: Optional[SourceUploader] = None,
 ) -> Dict[str, Any]:
     phase_inputs: Dict[str, Any] = {}
     if not source_image:
@@ -415,8 +1165,12 @@ def maybe_copy_source_image(
     phase_inputs["source_image_stem"] = source_abs.stem
     phase_inputs["source_image_suffix"] = source_abs.suffix
     phase_inputs["source_image_name"] = source_abs.name
+    phase_inputs["source_image_sha256"] = sha256_file(source_abs)
 
-    if comfy_input_dir:
+    if uploader is not None:
+        # The upload itself happens in submit_page_job, so cache hits and dry runs never send it.
+        phase_inputs["source_image_name"] = uploader.name_for(source_abs, phase_inputs["source_image_sha256"])
+    elif comfy_input_dir:
         comfy_input_dir.mkdir(parents=True, exist_ok=True)
         copied_name = f"{page_name}_{phase}_{source_abs.name}"
         copied_path = comfy_input_dir / copied_name
@@ -431,56 +1185,49 @@ def save_downloaded_files(
     client: ComfyClient,
     refs: List[Dict[str, Any]],
     output_dir: Path,
-) -> List[str]:
-    output_dir.mkdir(parents=True, exist_ok=True)
-    downloaded: List[str] = []
-    for idx, ref in enumerate(refs, start=1):
-        data = client.fetch_output(ref)
-        filename = Path(ref["filename"]).name
-        target = output_dir / f"{idx:03d}_{filename}"
-        target.write_bytes(data)
-        downloaded.append(str(target))
-    return downloaded
-
-
-def main() -> int:
-    args = parse_args()
-
-    books_dir = Path(args.books_dir)
-    workflow_dir = Path(args.workflow_dir)
-    renderspec_path = Path(args.renderspec)
-    review_path = Path(args.review) if args.review else None
-    source_image = Path(args.source_image) if args.source_image else None
-    comfy_input_dir = Path(args.comfy_input_dir) if args.comfy_input_dir else None
+    workers: int = 4,
+) -> List[Dict[str, Any]]:
+    """Download every output ref into `output_dir` on a bounded thread pool.
 
-    if not renderspec_path.exists():
-        raise FileNotFoundError(f"--renderspec not found: {renderspec_path}")
+    Files keep the `{idx:03d}_<filename>` naming; the returned records (in ref
+    order) carry `path`, `bytes` and `sha256`.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    targets = [
+        output_dir / f"{idx:03d}_{Path(ref['filename']).name}" for idx, ref in enumerate(refs, start=1)
+    ]
+    if len(refs) <= 1 or workers <= 1:
+        return [client.download_output(ref, target) for ref, target in zip(refs, targets)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(workers, len(refs))) as pool:
+        return list(pool.map(client.download_output, refs, targets))
 
-    pid = page_id(args.page)
-    page_dir = ensure_page_layout(books_dir=books_dir, book_id=args.book_id, page_name=pid)
-    local_renderspec_path = page_dir / "renderspec.json"
-    if local_renderspec_path.resolve() != renderspec_path.resolve():
-        shutil.copy2(renderspec_path, local_renderspec_path)
 
-    if review_path is None:
-        implied_review = page_dir / "review.json"
-        if implied_review.exists():
-            review_path = implied_review
+def store_outputs(job: Dict[str, Any], output_files: List[Dict[str, Any]]) -> None:
+    """Hardlink outputs into the book's content store; each record gets its `blob` path."""
+    book_dir = job["page_dir"].parent.parent
+    store = ContentStore.for_book(book_dir)
+    for item in output_files:
+        blob = store.ingest(Path(item["path"]), item["sha256"])
+        if blob is not None:
+            item["blob"] = str(blob.relative_to(book_dir))
 
-    render = read_json(local_renderspec_path)
-    review = read_json(review_path) if review_path and review_path.exists() else None
 
-    phase_inputs = maybe_copy_source_image(
-        source_image=source_image,
-        comfy_input_dir=comfy_input_dir,
-        page_name=pid,
-        phase=args.phase,
-    )
-
-    context: Dict[str, Any] = {
-        "book_id": args.book_id,
+def build_page_context(
+    book_id: str,
+    pid: str,
+    phase: str,
+    render: Dict[str, Any],
+    review: Optional[Dict[str, Any]],
+    phase_inputs: Dict[str, Any],
+    books_dir: Path,
+    page_dir: Path,
+    client_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """The context bindings resolve `from` paths and `{placeholders}` against."""
+    return {
+        "book_id": book_id,
         "page": pid,
-        "phase": args.phase,
+        "phase": phase,
         "render": render,
         "review": review,
         "phase_inputs": phase_inputs,
@@ -490,35 +1237,92 @@ def main() -> int:
         },
         "runtime": {
             "timestamp_utc": now_utc_iso(),
-            "client_id": str(uuid.uuid4()),
+            "client_id": client_id or str(uuid.uuid4()),
         },
     }
 
-    workflow_file = find_workflow_file(workflow_dir=workflow_dir, phase=args.phase)
-    bindings_file = find_bindings_file(workflow_dir=workflow_dir, phase=args.phase)
-    workflow_payload = read_json(workflow_file)
-    if not isinstance(workflow_payload, dict):
-        raise TypeError(f"workflow must be a JSON object: {workflow_file}")
 
-    compiled_workflow = copy.deepcopy(workflow_payload)
-    applied_bindings: List[Dict[str, Any]] = []
-    bindings_payload = None
-    if bindings_file:
-        bindings_payload = read_json(bindings_file)
-        if not isinstance(bindings_payload, dict):
-            raise TypeError(f"bindings must be a JSON object: {bindings_file}")
-        applied_bindings = apply_bindings(compiled_workflow, bindings_payload, context)
+def prepare_page_job(
+    book_id: str,
+    page: str,
+    phase: str,
+    renderspec_path: Path,
+    books_dir: Path,
+    workflow_dir: Path,
+    review_path: Optional[Path] = None,
+    source_image: Optional[Path] = None,
+    comfy_input_dir: Optional[Path] = None,
+    dry_run: bool = False,
+    client_id: Optional[str] = None,
+    uploader: Optional[SourceUploader] = None,
+    upstream: Optional[Dict[str, Any]] = None,
+    seed: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    variant: Optional[int] = None,
+    run_id: Optional[str] = None,
+    lane: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Compile one page/phase workflow and write its compiled artifact.
+
+    `upstream` (the run that produced `source_image`, from `run_pipeline.py`)
+    is exposed as `phase_inputs.upstream`. `seed` overrides `render.seed`,
+    `batch_size` sets the latent batch size, and `variant` numbers one of
+    several candidates sharing `run_id` (its files get a `_vNN` tag). Returns
+    a job dict consumed by `write_dry_run_manifest` and `finalize_page_job`.
+    """
+    if not renderspec_path.exists():
+        raise FileNotFoundError(f"--renderspec not found: {renderspec_path}")
 
-    jobs_dir = page_dir / "jobs"
-    run_id = dt.datetime.now(dt.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-    compiled_path = jobs_dir / f"{run_id}_{args.phase}_compiled_workflow.json"
-    write_json(compiled_path, compiled_workflow)
+    spans = SpanRecorder()
+    with spans.span("load"):
+        pid = page_id(page)
+        page_dir = ensure_page_layout(books_dir=books_dir, book_id=book_id, page_name=pid)
+        local_renderspec_path = page_dir / "renderspec.json"
+        if local_renderspec_path.resolve() != renderspec_path.resolve():
+            shutil.copy2(renderspec_path, local_renderspec_path)
+
+        if review_path is None:
+            implied_review = page_dir / "review.json"
+            if implied_review.exists():
+                review_path = implied_review
+
+        render = read_json(local_renderspec_path)
+        if seed is not None:
+            render = dict(render, seed=seed)
+        review = read_json(review_path) if review_path and review_path.exists() else None
+
+        phase_inputs = maybe_copy_source_image(
+            source_image=source_image,
+            comfy_input_dir=comfy_input_dir,
+            page_name=pid,
+            phase=phase,
+            uploader=uploader,
+        )
+        if upstream:
+            phase_inputs["upstream"] = upstream
+
+        workflow_file, workflow_payload, bindings_file, plan = load_phase_assets(workflow_dir, phase)
+
+    context = build_page_context(
+        book_id, pid, phase, render, review, phase_inputs, books_dir=books_dir, page_dir=page_dir, client_id=client_id
+    )
+
+    with spans.span("compile"):
+        compiled_workflow, applied_bindings = plan.apply(workflow_payload, context)
+        if batch_size is not None:
+            set_latent_batch_size(compiled_workflow, batch_size)
+        jobs_dir = page_dir / "jobs"
+        tag = f"_v{variant:02d}" if variant is not None else ""
+        run_id = run_id or reserve_run_id(jobs_dir, phase, tag)
+        compiled_path = jobs_dir / f"{run_id}_{phase}{tag}_compiled_workflow.json"
+        write_json(compiled_path, compiled_workflow)
+        compiled_hash = workflow_hash(compiled_workflow, context)
 
     run_manifest: Dict[str, Any] = {
         "run_id": run_id,
-        "book_id": args.book_id,
+        "book_id": book_id,
         "page": pid,
-        "phase": args.phase,
+        "phase": phase,
         "renderspec_path": str(local_renderspec_path),
         "review_path": str(review_path) if review_path else None,
         "workflow_file": str(workflow_file),
@@ -526,50 +1330,847 @@ def main() -> int:
         "compiled_workflow_path": str(compiled_path),
         "applied_bindings": applied_bindings,
         "phase_inputs": phase_inputs,
+        "workflow_hash": compiled_hash,
+        "lane": lane_for(phase, lane),
         "queued_at_utc": now_utc_iso(),
-        "dry_run": bool(args.dry_run),
+        "dry_run": bool(dry_run),
     }
+    if variant is not None or seed is not None or batch_size is not None:
+        run_manifest["variant"] = {
+            "index": variant or 0,
+            "seed": render.get("seed"),
+            "batch_size": batch_size or 1,
+        }
 
-    if args.dry_run:
-        dry_manifest = jobs_dir / f"{run_id}_{args.phase}_dry_run.json"
-        write_json(dry_manifest, run_manifest)
-        print(f"[dry-run] compiled workflow written to {compiled_path}")
-        print(f"[dry-run] manifest written to {dry_manifest}")
-        return 0
+    job: Dict[str, Any] = {
+        "book_id": book_id,
+        "page": pid,
+        "phase": phase,
+        "run_id": run_id,
+        "tag": tag,
+        "page_dir": page_dir,
+        "jobs_dir": jobs_dir,
+        "context": context,
+        "compiled_workflow": compiled_workflow,
+        "compiled_path": compiled_path,
+        "run_manifest": run_manifest,
+        "spans": spans,
+    }
+    if uploader is not None and "source_image_sha256" in phase_inputs:
+        job["source_upload"] = {
+            "uploader": uploader,
+            "path": Path(phase_inputs["source_image_path"]),
+            "sha256": phase_inputs["source_image_sha256"],
+        }
+    return job
+
+
+def write_dry_run_manifest(job: Dict[str, Any]) -> Path:
+    dry_manifest = job["jobs_dir"] / f"{job['run_id']}_{job['phase']}{job.get('tag', '')}_dry_run.json"
+    job["run_manifest"]["spans"] = spans_for(job).as_dict()
+    write_manifest(dry_manifest, job["run_manifest"])
+    return dry_manifest
+
+
+def candidate_records(job: Dict[str, Any], output_files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One record per output image of a variant run, with the seed that produced it.
+
+    Images of one latent batch share a seed; `batch_index` tells them apart.
+    """
+    variant = job["run_manifest"]["variant"]
+    return [
+        {
+            "variant": variant["index"],
+            "seed": variant["seed"],
+            "batch_index": idx if variant["batch_size"] > 1 else 0,
+            "prompt_id": job.get("prompt_id"),
+            "path": item["path"],
+            "sha256": item["sha256"],
+        }
+        for idx, item in enumerate(output_files)
+    ]
 
-    client = ComfyClient(base_url=args.comfy_url)
-    queue_response = client.queue_prompt(
-        prompt=compiled_workflow, client_id=context["runtime"]["client_id"]
+
+def cull_outputs(job: Dict[str, Any], output_files: List[Dict[str, Any]], max_distance: int) -> Dict[str, Any]:
+    """Cull near-duplicates among `output_files` (this run's outputs only) and update them to match."""
+    output_dir = job["page_dir"] / PHASE_TO_DIR.get(job["phase"], job["phase"])
+    only = [Path(item["path"]) for item in output_files]
+    summary = cull_phase_dir(output_dir, max_distance=max_distance, only=only)
+    apply_cull(output_files, job["page_dir"], summary)
+    return summary
+
+
+def sheet_outputs(
+    job: Dict[str, Any],
+    output_files: List[Dict[str, Any]],
+    sheets: ContactSheets,
+    labels: Optional[List[str]] = None,
+    tag: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Thumbnail the outputs still in place (not culled) and tile them into the run's contact sheet.
+
+    The sheet is `thumbs/<run_id>_<phase><tag>_contact.jpg`; `tag` defaults to the job's.
+    """
+    kept = [item for item in output_files if "near_duplicate_of" not in item]
+    if labels is not None:
+        labels = [label for item, label in zip(output_files, labels) if "near_duplicate_of" not in item]
+    tag = job.get("tag", "") if tag is None else tag
+    name = f"{job['run_id']}_{job['phase']}{tag}_contact.jpg"
+    return sheets.build(job["page_dir"], PHASE_TO_DIR.get(job["phase"], job["phase"]), kept, name, labels=labels)
+
+
+def index_run_manifest(job: Dict[str, Any], manifest_path: Path) -> None:
+    """Upsert a finished run into the books dir's manifest index; failures only warn."""
+    books_dir = job["page_dir"].parent.parent.parent
+    try:
+        with ManifestIndex(index_path_for(books_dir)) as index:
+            index.upsert(manifest_path)
+    except Exception as exc:  # pylint: disable=broad-except
+        print(f"warning: manifest index not updated for {manifest_path}: {exc}", file=sys.stderr)
+
+
+def try_cache_hit(
+    job: Dict[str, Any],
+    cache: Optional[RenderCache],
+    content_store: bool = True,
+    metrics: Optional[MetricsSink] = None,
+    cull_distance: Optional[int] = None,
+    sheets: Optional[ContactSheets] = None,
+) -> Optional[Path]:
+    """Materialize cached outputs for an unchanged workflow; returns the manifest path on a hit."""
+    if cache is None:
+        return None
+    key = job["run_manifest"]["workflow_hash"]
+    entry = cache.lookup(key)
+    if entry is None:
+        return None
+    phase = job["phase"]
+    output_dir = job["page_dir"] / PHASE_TO_DIR.get(phase, phase)
+    spans = spans_for(job)
+    with spans.span("download"):
+        output_files = cache.materialize(key, entry, output_dir)
+        if content_store:
+            store_outputs(job, output_files)
+    run_manifest = job["run_manifest"]
+    if cull_distance is not None:
+        with spans.span("cull"):
+            run_manifest["near_duplicates"] = cull_outputs(job, output_files, cull_distance)
+    if sheets is not None and output_files:
+        with spans.span("thumbnails"):
+            run_manifest["contact_sheet"] = sheet_outputs(job, output_files, sheets)
+
+    run_manifest["cache_hit"] = True
+    run_manifest["cached_from"] = {
+        k: entry.get(k) for k in ("book_id", "page", "phase", "run_id", "prompt_id", "stored_at_utc")
+    }
+    run_manifest["prompt_id"] = None
+    run_manifest["downloaded_files"] = [item["path"] for item in output_files]
+    run_manifest["output_files"] = output_files
+    run_manifest["completed_at_utc"] = now_utc_iso()
+    run_manifest["spans"] = spans.as_dict()
+
+    if "variant" in run_manifest:
+        run_manifest["candidates"] = candidate_records(job, output_files)
+
+    manifest_path = job["jobs_dir"] / f"{job['run_id']}_{phase}{job.get('tag', '')}_cache_hit.json"
+    write_manifest(manifest_path, run_manifest)
+    index_run_manifest(job, manifest_path)
+    if metrics is not None:
+        metrics.record(run_manifest)
+    if job.get("journal_path") is not None and job["journal_path"].exists():
+        update_journal(job["journal_path"], "completed", manifest_path=str(manifest_path))
+    release_inflight(job)
+    return manifest_path
+
+
+def ensure_source_uploaded(client: ComfyClient, job: Dict[str, Any]) -> None:
+    """Upload the job's source image to `client`'s server if it doesn't hold it yet."""
+    pending = job.get("source_upload")
+    if pending is None:
+        return
+    phase_inputs = job["run_manifest"]["phase_inputs"]
+    upload = pending["uploader"].ensure(client, pending["path"], pending["sha256"])
+    if upload["name"] != phase_inputs["source_image_name"]:
+        raise ComfyApiError(
+            f"ComfyUI stored the source image as {upload['name']!r}, "
+            f"but the workflow was compiled for {phase_inputs['source_image_name']!r}"
+        )
+    phase_inputs["source_image_uploaded_to"] = upload["server"]
+    phase_inputs["source_image_upload_transferred"] = upload["transferred"]
+
+
+def job_journal_path(job: Dict[str, Any]) -> Path:
+    return job.setdefault(
+        "journal_path", journal_path_for(job["jobs_dir"], job["run_id"], job["phase"], job.get("tag", ""))
     )
+
+
+def join_inflight(job: Dict[str, Any], flight: Optional[Singleflight], urls: Optional[List[str]] = None) -> bool:
+    """Lead this job's workflow hash, or attach to the prompt of the run already leading it.
+
+    Returns True when the job was attached to another run's prompt. A leader
+    keeps `job["inflight_lock"]` until it finalizes, fails or hits the cache.
+    With `urls`, a leader queued on some other server is not followed. A job
+    that already leads (requeued after its server failed) keeps its lock and
+    queues again.
+    """
+    if flight is None or job.get("inflight_lock") is not None:
+        return False
+    run_manifest = job["run_manifest"]
+    holder = {
+        "book_id": job["book_id"],
+        "page": job["page"],
+        "phase": job["phase"],
+        "run_id": job["run_id"],
+        "journal_path": str(job_journal_path(job)),
+    }
+    lock, leader = flight.join(run_manifest["workflow_hash"], holder)
+    if lock is not None:
+        job["inflight_lock"] = lock
+        return False
+    if leader is None:
+        print(
+            f"warning: another run holds workflow {run_manifest['workflow_hash'][:12]} but queued nothing "
+            f"within {flight.wait_seconds}s; queueing our own prompt",
+            file=sys.stderr,
+        )
+        return False
+    if urls is not None and leader.get("comfy_url") not in urls:
+        return False
+    job["prompt_id"] = leader["prompt_id"]
+    job["comfy_url"] = leader.get("comfy_url")
+    job["queue_response"] = leader.get("queue_response") or {"prompt_id": leader["prompt_id"]}
+    run_manifest["comfy_url"] = leader.get("comfy_url")
+    run_manifest["queued_at_utc"] = (leader.get("run_manifest") or {}).get("queued_at_utc") or now_utc_iso()
+    run_manifest["singleflight"] = {
+        "leader_run_id": leader.get("run_id"),
+        "leader_journal": leader["journal_path"],
+        "prompt_id": leader["prompt_id"],
+    }
+    update_journal(
+        job_journal_path(job),
+        "queued",
+        book_id=job["book_id"],
+        page=job["page"],
+        phase=job["phase"],
+        run_id=job["run_id"],
+        page_dir=str(job["page_dir"]),
+        client_id=job["context"]["runtime"]["client_id"],
+        comfy_url=job["comfy_url"],
+        compiled_workflow_path=str(job["compiled_path"]),
+        prompt_id=job["prompt_id"],
+        queue_response=job["queue_response"],
+        run_manifest=run_manifest,
+    )
+    return True
+
+
+def release_inflight(job: Dict[str, Any]) -> None:
+    lock = job.pop("inflight_lock", None)
+    if lock is not None:
+        lock.release()
+
+
+def submit_page_job(client: ComfyClient, job: Dict[str, Any]) -> str:
+    """Queue a prepared job and record the queue response on it.
+
+    A `compiled` journal entry is written before `/prompt` is called and
+    flipped to `queued` with the prompt id right after, so a killed run can
+    be resumed with `--resume`. Jobs in the `interactive` lane are queued
+    with `front`, ahead of everything pending on the server.
+    """
+    journal_path = job_journal_path(job)
+    client_id = job["context"]["runtime"]["client_id"]
+    job["run_manifest"]["comfy_url"] = client.base_url
+    update_journal(
+        journal_path,
+        "compiled",
+        book_id=job["book_id"],
+        page=job["page"],
+        phase=job["phase"],
+        run_id=job["run_id"],
+        page_dir=str(job["page_dir"]),
+        client_id=client_id,
+        comfy_url=client.base_url,
+        compiled_workflow_path=str(job["compiled_path"]),
+        run_manifest=job["run_manifest"],
+    )
+    spans = spans_for(job)
+    if job.get("source_upload") is not None:
+        with spans.span("upload"):
+            ensure_source_uploaded(client, job)
+    with spans.span("queue"):
+        queue_response = client.queue_prompt(
+            prompt=job["compiled_workflow"],
+            client_id=client_id,
+            front=job["run_manifest"].get("lane") == "interactive",
+        )
     prompt_id = queue_response.get("prompt_id")
     if not isinstance(prompt_id, str) or not prompt_id:
         raise RuntimeError(f"ComfyUI did not return prompt_id: {queue_response}")
-
-    history_record = wait_for_completion(
-        client=client,
+    job["prompt_id"] = prompt_id
+    job["queue_response"] = queue_response
+    job["run_manifest"]["queued_at_utc"] = now_utc_iso()
+    update_journal(
+        journal_path,
+        "queued",
         prompt_id=prompt_id,
-        timeout_seconds=args.timeout_seconds,
-        poll_seconds=args.poll_seconds,
+        queue_response=queue_response,
+        run_manifest=job["run_manifest"],
     )
+    return prompt_id
+
+
+def mark_job_failed(job: Dict[str, Any], exc: BaseException) -> None:
+    """Close the journal entry for a job ComfyUI reported as failed.
+
+    Timeouts and interrupts leave the entry open so `--resume` can re-attach.
+    Either way the job stops leading its workflow hash.
+    """
+    release_inflight(job)
+    journal_path = job.get("journal_path")
+    if journal_path is None or not journal_path.exists():
+        return
+    if isinstance(exc, (TimeoutError, KeyboardInterrupt)):
+        return
+    update_journal(journal_path, "failed", error=str(exc))
+
+
+def find_queued_prompt(queue_payload: Dict[str, Any], prompt_id: Optional[str], client_id: str) -> Optional[str]:
+    """Locate a prompt on `/queue` by id, or by client id when the id was never recorded."""
+    for bucket in ("queue_running", "queue_pending"):
+        for item in queue_payload.get(bucket) or []:
+            if not isinstance(item, list) or len(item) < 2:
+                continue
+            if prompt_id and item[1] == prompt_id:
+                return str(item[1])
+            extra = item[3] if len(item) > 3 and isinstance(item[3], dict) else {}
+            if not prompt_id and extra.get("client_id") == client_id:
+                return str(item[1])
+    return None
+
+
+def resume_page_job(client: ComfyClient, journal_path: Path) -> Dict[str, Any]:
+    """Rebuild a job from its journal and re-attach to its prompt if ComfyUI still knows it.
+
+    The returned job has `prompt_id` set when attached; otherwise the prompt
+    was lost (e.g. server restart) and the caller should `submit_page_job` it
+    again from the journaled compiled workflow.
+    """
+    entry = read_journal(journal_path)
+    compiled_path = Path(entry["compiled_workflow_path"])
+    page_dir = Path(entry["page_dir"])
+    run_manifest = dict(entry["run_manifest"])
+    run_manifest["resumed_from_journal"] = str(journal_path)
+    job: Dict[str, Any] = {
+        "book_id": entry["book_id"],
+        "page": entry["page"],
+        "phase": entry["phase"],
+        "run_id": entry["run_id"],
+        "page_dir": page_dir,
+        "jobs_dir": page_dir / "jobs",
+        "context": {"runtime": {"client_id": entry["client_id"]}},
+        "compiled_workflow": read_json(compiled_path),
+        "compiled_path": compiled_path,
+        "run_manifest": run_manifest,
+        "journal_path": journal_path,
+    }
+
+    prompt_id = entry.get("prompt_id") if entry.get("state") == "queued" else None
+    attached = None
+    if prompt_id and extract_history_record(client.get_prompt_history(prompt_id), prompt_id):
+        attached = prompt_id
+    else:
+        attached = find_queued_prompt(client.get_queue(), prompt_id, entry["client_id"])
+    if attached:
+        job["prompt_id"] = attached
+        job["comfy_url"] = client.base_url
+        job["queue_response"] = entry.get("queue_response") or {"prompt_id": attached}
+        if entry.get("state") != "queued":
+            update_journal(journal_path, "queued", prompt_id=attached, queue_response=job["queue_response"])
+    return job
+
+
+def finalize_page_job(
+    client: ComfyClient,
+    job: Dict[str, Any],
+    history_record: Dict[str, Any],
+    download_workers: int = 4,
+    cache: Optional[RenderCache] = None,
+    raw_history: bool = True,
+    content_store: bool = True,
+    metrics: Optional[MetricsSink] = None,
+    cull_distance: Optional[int] = None,
+    sheets: Optional[ContactSheets] = None,
+) -> Path:
+    """Download outputs for a finished job, write its run manifest and fill the cache.
+
+    The manifest keeps a summary of `history_record`; with `raw_history` the
+    full record is gzipped next to it. With `content_store`, identical
+    outputs share one blob under `books/<book_id>/objects/`. With
+    `cull_distance`, near-duplicates in the phase directory are moved aside
+    and the cluster map goes into the manifest as `near_duplicates`. With
+    `sheets`, the outputs get thumbnails and a contact sheet (`contact_sheet`).
+    Stage timings go into the manifest's `spans` and, with `metrics`, out to its sink.
+    """
+    phase = job["phase"]
+    prompt_id = job["prompt_id"]
     refs = collect_output_refs(history_record)
+    spans = spans_for(job)
+    tracker = job.get("poll_tracker")
+    add_execution_spans(
+        spans,
+        queued_at=spans.end_of("queue") or parse_utc(job["run_manifest"].get("queued_at_utc")),
+        history_record=history_record,
+        ws_timeline=job.get("ws_timeline"),
+        running_seen_at=tracker.running_seen_at if tracker is not None else None,
+        detected_at=tracker.detected_at if tracker is not None else None,
+    )
 
-    phase_dir_name = PHASE_TO_DIR.get(args.phase, args.phase)
-    output_dir = page_dir / phase_dir_name
-    downloaded_files = save_downloaded_files(client=client, refs=refs, output_dir=output_dir)
+    phase_dir_name = PHASE_TO_DIR.get(phase, phase)
+    output_dir = job["page_dir"] / phase_dir_name
+    with spans.span("download"):
+        output_files = save_downloaded_files(
+            client=client, refs=refs, output_dir=output_dir, workers=download_workers
+        )
+        if content_store:
+            store_outputs(job, output_files)
+    run_manifest = job["run_manifest"]
+    if cull_distance is not None:
+        with spans.span("cull"):
+            run_manifest["near_duplicates"] = cull_outputs(job, output_files, cull_distance)
+    if sheets is not None and output_files:
+        with spans.span("thumbnails"):
+            run_manifest["contact_sheet"] = sheet_outputs(job, output_files, sheets)
 
     run_manifest["prompt_id"] = prompt_id
-    run_manifest["queue_response"] = queue_response
-    run_manifest["history_record"] = history_record
+    run_manifest["queue_response"] = job["queue_response"]
     run_manifest["output_refs"] = refs
-    run_manifest["downloaded_files"] = downloaded_files
+    run_manifest["downloaded_files"] = [item["path"] for item in output_files]
+    run_manifest["output_files"] = output_files
+    run_manifest["cache_hit"] = False
+    if "variant" in run_manifest:
+        run_manifest["candidates"] = candidate_records(job, output_files)
+    if job.get("poll_tracker") is not None:
+        run_manifest["poll_stats"] = job["poll_tracker"].summary(history_record)
     run_manifest["completed_at_utc"] = now_utc_iso()
 
-    manifest_path = jobs_dir / f"{run_id}_{args.phase}_{prompt_id}.json"
-    write_json(manifest_path, run_manifest)
+    manifest_path = job["jobs_dir"] / f"{job['run_id']}_{phase}_{prompt_id}.json"
+    with spans.span("write"):
+        if cache is not None and output_files:
+            cache.store(
+                run_manifest["workflow_hash"],
+                output_files,
+                {
+                    "book_id": job["book_id"],
+                    "page": job["page"],
+                    "phase": phase,
+                    "run_id": job["run_id"],
+                    "prompt_id": prompt_id,
+                    "stored_at_utc": run_manifest["completed_at_utc"],
+                },
+            )
+        attach_history(run_manifest, manifest_path, history_record, raw_history=raw_history)
+    run_manifest["spans"] = spans.as_dict()
+    write_manifest(manifest_path, run_manifest)
+    index_run_manifest(job, manifest_path)
+    if job.get("journal_path") is not None:
+        update_journal(job["journal_path"], "completed", manifest_path=str(manifest_path))
+    if metrics is not None:
+        metrics.record(run_manifest)
+    release_inflight(job)
+    return manifest_path
+
+
+def open_page_listener(args: argparse.Namespace, client: ComfyClient, client_id: str) -> Optional[ComfyEventListener]:
+    """The `/ws` listener for `--websocket`, or None (with a warning) when it can't connect."""
+    if not args.websocket:
+        return None
+    listener = ComfyEventListener(client.base_url, client_id)
+    if not listener.start():
+        print(
+            f"warning: websocket unavailable ({listener.last_error}); polling /history",
+            file=sys.stderr,
+        )
+        return None
+    return listener
+
+
+def new_poll_tracker(
+    listener: Optional[ComfyEventListener], poller: Optional[AdaptivePoller], phase: str
+) -> PollTracker:
+    if listener is not None:
+        return PollTracker("websocket")
+    if poller is not None:
+        return poller.tracker(phase)
+    return PollTracker("fixed")
+
+
+def run_to_completion(
+    args: argparse.Namespace,
+    client: ComfyClient,
+    job: Dict[str, Any],
+    cache: Optional[RenderCache],
+    poller: Optional[AdaptivePoller] = None,
+    metrics: Optional[MetricsSink] = None,
+) -> Path:
+    """Queue `job` (unless already attached), wait for it and finalize it.
+
+    A job following another run's prompt polls: ComfyUI only sends `/ws`
+    events to the client that queued the prompt.
+    """
+    following = "singleflight" in job["run_manifest"]
+    listener = None if following else open_page_listener(args, client, job["context"]["runtime"]["client_id"])
+    job["poll_tracker"] = new_poll_tracker(listener, poller, job["phase"])
+    try:
+        prompt_id = job.get("prompt_id") or submit_page_job(client, job)
+        history_record = wait_for_completion(
+            client=client,
+            prompt_id=prompt_id,
+            timeout_seconds=args.timeout_seconds,
+            poll_seconds=args.poll_seconds,
+            listener=listener,
+            ws_fallback_seconds=args.ws_fallback_seconds,
+            poller=poller,
+            tracker=job["poll_tracker"],
+        )
+        if listener is not None:
+            job["ws_timeline"] = listener.timeline(prompt_id)
+    except BaseException as exc:
+        mark_job_failed(job, exc)
+        raise
+    finally:
+        if listener is not None:
+            listener.close()
+    return finalize_page_job(
+        client,
+        job,
+        history_record,
+        download_workers=args.download_workers,
+        cache=cache,
+        raw_history=not args.no_raw_history,
+        content_store=not args.no_content_store,
+        metrics=metrics,
+        cull_distance=cull_distance(args),
+        sheets=make_contact_sheets(args),
+    )
+
 
-    print(f"phase={args.phase} prompt_id={prompt_id}")
-    print(f"downloaded_files={len(downloaded_files)}")
+def run_variant_burst(
+    args: argparse.Namespace,
+    jobs: List[Dict[str, Any]],
+    cache: Optional[RenderCache],
+    metrics: Optional[MetricsSink] = None,
+) -> Tuple[Dict[int, Path], Dict[int, str]]:
+    """Queue every variant back to back on one server and collect them in one wait loop.
+
+    With several servers the first variant is dispatched and the rest follow
+    it, so one listener and one `/queue` poller cover the whole burst. When
+    some variants follow another run's prompt (singleflight), the burst goes
+    to their server instead.
+    Returns run manifests and errors keyed by variant index; variants still
+    running at the timeout keep their journal open for `--resume`.
+    """
+    manifests: Dict[int, Path] = {}
+    errors: Dict[int, str] = {}
+    scheduler = make_scheduler(args)
+    anchor = next((job for job in jobs if job.get("prompt_id")), jobs[0])
+    if len(scheduler.servers) > 1 and not anchor.get("prompt_id"):
+        try:
+            scheduler.dispatch(anchor, submit_page_job)
+        except BaseException as exc:
+            mark_job_failed(anchor, exc)
+            raise
+        print(f"dispatched to {anchor['comfy_url']}")
+    client = scheduler.client_for(anchor.get("comfy_url"))
+    poller = make_poller(args, client, Path(args.books_dir))
+    listener = open_page_listener(args, client, jobs[0]["context"]["runtime"]["client_id"])
+    by_prompt: Dict[str, Dict[str, Any]] = {}
+    try:
+        for job in jobs:
+            job["poll_tracker"] = new_poll_tracker(listener, poller, job["phase"])
+            prompt_id = job.get("prompt_id") or submit_page_job(client, job)
+            by_prompt[prompt_id] = job
+        waiter = wait_for_all(
+            client,
+            list(by_prompt),
+            timeout_seconds=args.timeout_seconds,
+            poll_seconds=args.poll_seconds,
+            listener=listener,
+            ws_fallback_seconds=args.ws_fallback_seconds,
+            poller=poller,
+            trackers={prompt_id: job["poll_tracker"] for prompt_id, job in by_prompt.items()},
+        )
+        for prompt_id, history_record, error in waiter:
+            job = by_prompt.pop(prompt_id)
+            index = job["run_manifest"]["variant"]["index"]
+            if error is not None:
+                mark_job_failed(job, RuntimeError(error))
+                errors[index] = error
+                continue
+            assert history_record is not None
+            if listener is not None:
+                job["ws_timeline"] = listener.timeline(prompt_id)
+            manifests[index] = finalize_page_job(
+                client,
+                job,
+                history_record,
+                download_workers=args.download_workers,
+                cache=cache,
+                raw_history=not args.no_raw_history,
+                content_store=not args.no_content_store,
+                metrics=metrics,
+            )
+    except TimeoutError:
+        for job in by_prompt.values():
+            errors[job["run_manifest"]["variant"]["index"]] = (
+                f"timed out after {args.timeout_seconds}s; finish it with --resume"
+            )
+    except BaseException as exc:
+        for job in jobs:
+            if job["run_manifest"]["variant"]["index"] not in manifests:
+                mark_job_failed(job, exc)
+        raise
+    finally:
+        if listener is not None:
+            listener.close()
+    return manifests, errors
+
+
+def write_variants_manifest(
+    jobs: List[Dict[str, Any]],
+    manifests: Dict[int, Path],
+    errors: Dict[int, str],
+    max_distance: Optional[int] = None,
+    sheets: Optional[ContactSheets] = None,
+) -> Tuple[Path, Dict[str, Any]]:
+    """Write `<run_id>_<phase>_variants.json` listing every variant and all their candidates.
+
+    With `max_distance`, the phase directory is culled once for the whole
+    burst; the cluster map is recorded here and culled candidates carry
+    `near_duplicate_of` (the per-variant manifests keep the download paths).
+    With `sheets`, the kept candidates share one contact sheet, each tile
+    labelled `vNN/<idx>`.
+    """
+    first = jobs[0]
+    variants = []
+    candidates: List[Dict[str, Any]] = []
+    for job in jobs:
+        run_manifest = job["run_manifest"]
+        index = run_manifest["variant"]["index"]
+        variants.append(
+            {
+                "index": index,
+                "seed": run_manifest["variant"]["seed"],
+                "workflow_hash": run_manifest["workflow_hash"],
+                "prompt_id": run_manifest.get("prompt_id"),
+                "cache_hit": bool(run_manifest.get("cache_hit")),
+                "manifest_path": str(manifests[index]) if index in manifests else None,
+                "error": errors.get(index),
+            }
+        )
+        if index in manifests:
+            candidates.extend(dict(item) for item in run_manifest.get("candidates") or [])
+    summary: Dict[str, Any] = {
+        "run_id": first["run_id"],
+        "book_id": first["book_id"],
+        "page": first["page"],
+        "phase": first["phase"],
+        "completed_at_utc": now_utc_iso(),
+        "variants": variants,
+        "candidates": candidates,
+    }
+    if max_distance is not None:
+        summary["near_duplicates"] = cull_outputs(first, candidates, max_distance)
+    if sheets is not None and candidates:
+        labels = [f"v{item['variant']:02d}/{label_for(Path(item['path']))}" for item in candidates]
+        summary["contact_sheet"] = sheet_outputs(first, candidates, sheets, labels=labels, tag="_variants")
+    summary_path = first["jobs_dir"] / f"{first['run_id']}_{first['phase']}_variants.json"
+    write_json(summary_path, summary)
+    return summary_path, summary
+
+
+def variants_main(args: argparse.Namespace) -> int:
+    """Compile one workflow per seed, run the uncached ones as one burst and summarize them."""
+    books_dir = Path(args.books_dir)
+    seeds = args.seeds
+    if seeds is None:
+        base_seed = read_json(Path(args.renderspec)).get("seed")
+        if not isinstance(base_seed, int):
+            raise ValueError(f"{args.renderspec} has no integer seed to vary; pass --seeds")
+        seeds = [base_seed + offset for offset in range(args.variants)]
+
+    jobs_dir = books_dir / args.book_id / "pages" / page_id(args.page) / "jobs"
+    run_id = reserve_run_id(jobs_dir, args.phase, "_v00")
+    client_id = str(uuid.uuid4())
+    uploader = make_source_uploader(args, books_dir)
+    jobs = [
+        prepare_page_job(
+            book_id=args.book_id,
+            page=args.page,
+            phase=args.phase,
+            renderspec_path=Path(args.renderspec),
+            books_dir=books_dir,
+            workflow_dir=Path(args.workflow_dir),
+            review_path=Path(args.review) if args.review else None,
+            source_image=Path(args.source_image) if args.source_image else None,
+            comfy_input_dir=Path(args.comfy_input_dir) if args.comfy_input_dir else None,
+            dry_run=args.dry_run,
+            client_id=client_id,
+            uploader=uploader,
+            seed=seed,
+            variant=index,
+            run_id=run_id,
+            lane=args.lane,
+        )
+        for index, seed in enumerate(seeds)
+    ]
+    if len({job["run_manifest"]["workflow_hash"] for job in jobs}) < len(jobs):
+        raise ValueError(
+            f"{args.phase} bindings don't use render.seed, so every variant compiles to the same workflow"
+        )
+
+    if args.dry_run:
+        for job in jobs:
+            dry_manifest = write_dry_run_manifest(job)
+            print(f"[dry-run] variant {job['run_manifest']['variant']['index']} manifest written to {dry_manifest}")
+        return 0
+
+    cache = open_render_cache(args, books_dir)
+    metrics = open_metrics(args)
+    flight = open_singleflight(args, books_dir)
+    follow_urls = args.comfy_urls
+    manifests: Dict[int, Path] = {}
+    pending = []
+    for job in jobs:
+        if join_inflight(job, flight, urls=follow_urls):
+            # The burst waits on one server, so every followed prompt must be on it.
+            follow_urls = [job["comfy_url"]]
+            pending.append(job)
+            continue
+        cached_manifest = try_cache_hit(job, cache, content_store=not args.no_content_store, metrics=metrics)
+        if cached_manifest is not None:
+            manifests[job["run_manifest"]["variant"]["index"]] = cached_manifest
+        else:
+            pending.append(job)
+    errors: Dict[int, str] = {}
+    if pending:
+        burst_manifests, errors = run_variant_burst(args, pending, cache, metrics=metrics)
+        manifests.update(burst_manifests)
+
+    summary_path, summary = write_variants_manifest(
+        jobs, manifests, errors, max_distance=cull_distance(args), sheets=make_contact_sheets(args)
+    )
+    for job in jobs:
+        variant = job["run_manifest"]["variant"]
+        if variant["index"] in errors:
+            result = f"error={errors[variant['index']]}"
+        else:
+            result = f"manifest={manifests[variant['index']]}"
+        print(f"variant={variant['index']} seed={variant['seed']} {result}")
+    print(f"phase={args.phase} variants={len(jobs)} completed={len(manifests)}")
+    if "near_duplicates" in summary:
+        culled = summary["near_duplicates"]
+        print(f"near_duplicates_kept={culled['kept']} moved={len(culled['moved'])}")
+    if "contact_sheet" in summary:
+        print(f"contact_sheet={summary['contact_sheet']['path']}")
+    print(f"variants_manifest={summary_path}")
+    return 1 if errors else 0
+
+
+def resume_main(args: argparse.Namespace) -> int:
+    books_dir = Path(args.books_dir)
+    page_dir = books_dir / args.book_id / "pages" / page_id(args.page)
+    journals = find_unfinished(page_dir, phase=args.phase)
+    if not journals:
+        print(f"no unfinished {args.phase} jobs to resume in {page_dir / 'jobs'}")
+        return 0
+
+    scheduler = make_scheduler(args)
+    cache = open_render_cache(args, books_dir)
+    metrics = open_metrics(args)
+    for journal_path in journals:
+        # Re-attach on the server the prompt was queued on.
+        client = scheduler.client_for(read_journal(journal_path).get("comfy_url"))
+        job = resume_page_job(client, journal_path)
+        action = "re-attached" if job.get("prompt_id") else "requeueing lost prompt"
+        print(f"resume {journal_path.name}: {action} on {client.base_url}")
+        poller = make_poller(args, client, books_dir)
+        manifest_path = run_to_completion(args, client, job, cache, poller=poller, metrics=metrics)
+        print(f"phase={args.phase} prompt_id={job['prompt_id']}")
+        print(f"downloaded_files={len(job['run_manifest']['downloaded_files'])}")
+        print(f"manifest={manifest_path}")
+    return 0
+
+
+def main() -> int:
+    args = parse_args()
+    if args.resume:
+        return resume_main(args)
+    if args.seeds is not None or (args.variants is not None and args.variant_mode == "seeds"):
+        return variants_main(args)
+
+    job = prepare_page_job(
+        book_id=args.book_id,
+        page=args.page,
+        phase=args.phase,
+        renderspec_path=Path(args.renderspec),
+        books_dir=Path(args.books_dir),
+        workflow_dir=Path(args.workflow_dir),
+        review_path=Path(args.review) if args.review else None,
+        source_image=Path(args.source_image) if args.source_image else None,
+        comfy_input_dir=Path(args.comfy_input_dir) if args.comfy_input_dir else None,
+        dry_run=args.dry_run,
+        uploader=make_source_uploader(args, Path(args.books_dir)),
+        batch_size=args.variants if args.variant_mode == "batch" else None,
+        lane=args.lane,
+    )
+
+    if args.dry_run:
+        dry_manifest = write_dry_run_manifest(job)
+        print(f"[dry-run] compiled workflow written to {job['compiled_path']}")
+        print(f"[dry-run] manifest written to {dry_manifest}")
+        return 0
+
+    scheduler = make_scheduler(args)
+    cache = open_render_cache(args, Path(args.books_dir))
+    metrics = open_metrics(args)
+    following = join_inflight(job, open_singleflight(args, Path(args.books_dir)), urls=args.comfy_urls)
+    if following:
+        print(f"attached to prompt_id={job['prompt_id']} of run {job['run_manifest']['singleflight']['leader_run_id']}")
+    else:
+        cached_manifest = try_cache_hit(
+            job,
+            cache,
+            content_store=not args.no_content_store,
+            metrics=metrics,
+            cull_distance=cull_distance(args),
+            sheets=make_contact_sheets(args),
+        )
+        if cached_manifest is not None:
+            print(f"phase={args.phase} cache_hit={job['run_manifest']['workflow_hash']}")
+            print(f"downloaded_files={len(job['run_manifest']['downloaded_files'])}")
+            print(f"manifest={cached_manifest}")
+            if "contact_sheet" in job["run_manifest"]:
+                print(f"contact_sheet={job['run_manifest']['contact_sheet']['path']}")
+            return 0
+
+    if len(scheduler.servers) > 1 and not following:
+        try:
+            scheduler.dispatch(job, submit_page_job)
+        except BaseException as exc:
+            mark_job_failed(job, exc)
+            raise
+        print(f"dispatched to {job['comfy_url']}")
+    client = scheduler.client_for(job.get("comfy_url"))
+    poller = make_poller(args, client, Path(args.books_dir))
+    manifest_path = run_to_completion(args, client, job, cache, poller=poller, metrics=metrics)
+
+    print(f"phase={args.phase} prompt_id={job['prompt_id']}")
+    print(f"downloaded_files={len(job['run_manifest']['downloaded_files'])}")
     print(f"manifest={manifest_path}")
+    if "contact_sheet" in job["run_manifest"]:
+        print(f"contact_sheet={job['run_manifest']['contact_sheet']['path']}")
     return 0
 
 
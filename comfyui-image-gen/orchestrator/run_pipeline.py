@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""Run a per-page phase DAG (draft -> refine -> upscale_print by default) for a book.
+
+Every page's root phase is queued up front. When a page finishes a phase,
+the output picked for each outgoing edge becomes the `--source-image` of
+that page's next phase, which is queued ahead of the remaining roots, so
+ComfyUI never runs dry: page 2 drafts while page 1 refines.
+
+Edge selection (`select`):
+
+- `review`: `review.json` for the upstream phase (`final_pick`, else the
+  first `selected_candidates` entry)
+- `selected`: the first file in `selected/` with the same content as one of
+  the upstream run's outputs
+- `first`: the upstream run's first output
+- `auto` (default): `review`, then `selected`, then `first`
+
+Review and `selected/` picks only count when they are one of the outputs
+the upstream run just produced (or re-materialized from the render cache).
+Stale picks from older runs fall through to `first`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import sys
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from model_affinity import DEFAULT_MODEL_LOAD_SECONDS, ModelAffinity, format_node_reuse
+from render_cache import sha256_file
+from run_book import BatchRunner, discover_pages, open_listener, pick_source_image, resolve_book
+from run_page import (
+    PHASE_CHOICES,
+    add_cache_args,
+    add_contact_sheet_args,
+    add_cull_args,
+    add_lane_args,
+    add_metrics_args,
+    add_output_args,
+    add_poll_args,
+    add_server_args,
+    add_singleflight_args,
+    check_contact_sheet_args,
+    check_cull_args,
+    cull_distance,
+    make_contact_sheets,
+    make_poller,
+    make_scheduler,
+    make_source_uploader,
+    now_utc_iso,
+    open_metrics,
+    open_render_cache,
+    open_singleflight,
+    prepare_page_job,
+    read_json,
+    resolve_server_args,
+    write_json,
+)
+
+
+DEFAULT_PHASES = ("draft", "refine", "upscale_print")
+SELECT_CHOICES = ("auto", "review", "selected", "first")
+DONE_STATUSES = ("completed", "cache_hit")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Run a phase DAG for every page of a book, feeding each phase's pick into the next."
+    )
+    parser.add_argument(
+        "--book-dir",
+        default=None,
+        help="Book directory (books/<book_id>); alternative to --books-dir + --book-id",
+    )
+    parser.add_argument("--book-id", default=None, help="Book identifier")
+    parser.add_argument(
+        "--books-dir",
+        default="books",
+        help="Root books directory (ignored when --book-dir is set)",
+    )
+    parser.add_argument(
+        "--pages",
+        nargs="*",
+        default=None,
+        help="Page numbers/ids to run; default is every page with a renderspec.json",
+    )
+    parser.add_argument(
+        "--phases",
+        nargs="+",
+        choices=PHASE_CHOICES,
+        default=list(DEFAULT_PHASES),
+        help="Linear phase chain to run (ignored when --pipeline is set)",
+    )
+    parser.add_argument(
+        "--pipeline",
+        default=None,
+        help="Pipeline JSON declaring the phase DAG (see templates/pipeline.example.json)",
+    )
+    parser.add_argument(
+        "--select",
+        choices=SELECT_CHOICES,
+        default="auto",
+        help="Default output selection for each edge: review.json, selected/, first output, or auto",
+    )
+    parser.add_argument(
+        "--source-glob",
+        default=None,
+        help="Optional glob relative to each page dir supplying the source image of root phases",
+    )
+    parser.add_argument(
+        "--comfy-input-dir",
+        default=None,
+        help="ComfyUI input directory to copy each phase's source image into",
+    )
+    parser.add_argument(
+        "--upload-source",
+        action="store_true",
+        help="Upload each phase's source image through ComfyUI /upload/image instead of copying it",
+    )
+    add_server_args(parser)
+    parser.add_argument(
+        "--workflow-dir",
+        default="workflows",
+        help="Directory containing <phase>.api.json and optional <phase>.bindings.json",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=2,
+        help="Max prompts kept queued/running at once on each ComfyUI server",
+    )
+    parser.add_argument(
+        "--timeout-seconds",
+        type=int,
+        default=1800,
+        help="Max wait time per prompt, measured from when it was queued",
+    )
+    parser.add_argument(
+        "--poll-seconds",
+        type=float,
+        default=2.0,
+        help=(
+            "Polling interval with --poll-mode fixed; with adaptive polling, the interval "
+            "used while the phase has no runtime history"
+        ),
+    )
+    add_poll_args(parser)
+    parser.add_argument(
+        "--download-workers",
+        type=int,
+        default=4,
+        help="Parallel output downloads per finished prompt",
+    )
+    parser.add_argument(
+        "--model-affinity",
+        action="store_true",
+        help="Group jobs by loaded model and cached nodes instead of advancing each page through its phases first",
+    )
+    parser.add_argument(
+        "--model-load-seconds",
+        type=float,
+        default=DEFAULT_MODEL_LOAD_SECONDS,
+        help="Estimated cost of one model switch, for the summary's time-saved figure",
+    )
+    add_lane_args(parser)
+    add_cache_args(parser)
+    add_singleflight_args(parser)
+    add_output_args(parser)
+    add_cull_args(parser)
+    add_contact_sheet_args(parser)
+    add_metrics_args(parser)
+    parser.add_argument(
+        "--websocket",
+        action="store_true",
+        help="Listen on ComfyUI /ws for completion events instead of polling /history",
+    )
+    parser.add_argument(
+        "--ws-fallback-seconds",
+        type=float,
+        default=30.0,
+        help="With --websocket, re-check /history at least this often in case an event is missed",
+    )
+    args = parser.parse_args()
+    if args.upload_source and args.comfy_input_dir:
+        parser.error("--upload-source and --comfy-input-dir are mutually exclusive")
+    if not args.upload_source and not args.comfy_input_dir:
+        parser.error("downstream phases need --upload-source or --comfy-input-dir to reach ComfyUI")
+    check_cull_args(parser, args)
+    check_contact_sheet_args(parser, args)
+    resolve_server_args(args)
+    return args
+
+
+def load_pipeline(path: Optional[Path], phases: List[str], select: str) -> Dict[str, Dict[str, Any]]:
+    """`{phase: {"after": upstream phase or None, "select": mode}}` in run order.
+
+    Without `path`, `phases` is a linear chain. A pipeline file lists
+    `{"phase", "after", "select"}` entries; each phase runs at most once per
+    page and has at most one upstream, since it takes one source image.
+    """
+    if path is None:
+        entries = [
+            {"phase": phase, "after": phases[idx - 1] if idx else None} for idx, phase in enumerate(phases)
+        ]
+    else:
+        entries = read_json(path).get("phases")
+        if not isinstance(entries, list) or not entries:
+            raise ValueError(f"{path}: 'phases' must be a non-empty list")
+
+    pipeline: Dict[str, Dict[str, Any]] = {}
+    for idx, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise ValueError(f"pipeline entry {idx} must be an object")
+        phase = entry.get("phase")
+        after = entry.get("after")
+        mode = entry.get("select", select)
+        if phase not in PHASE_CHOICES:
+            raise ValueError(f"pipeline entry {idx}: unknown phase {phase!r}")
+        if phase in pipeline:
+            raise ValueError(f"pipeline entry {idx}: phase {phase!r} listed twice")
+        if after is not None and after not in pipeline:
+            # Requiring upstream phases to be listed first also rules out cycles.
+            raise ValueError(f"pipeline entry {idx}: 'after' must name an earlier phase, got {after!r}")
+        if mode not in SELECT_CHOICES:
+            raise ValueError(f"pipeline entry {idx}: select must be one of {', '.join(SELECT_CHOICES)}")
+        pipeline[phase] = {"after": after, "select": mode}
+    return pipeline
+
+
+def downstream_of(pipeline: Dict[str, Dict[str, Any]], phase: str) -> List[str]:
+    return [child for child, spec in pipeline.items() if spec["after"] == phase]
+
+
+def review_pick(page_dir: Path, phase: str) -> Optional[Path]:
+    """The image `review.json` picked for `phase`, if the review covers that phase."""
+    review_path = page_dir / "review.json"
+    if not review_path.is_file():
+        return None
+    review = read_json(review_path)
+    if review.get("phase") != phase:
+        return None
+    pick = review.get("final_pick")
+    if isinstance(pick, dict):
+        pick = pick.get("path")
+    if not pick:
+        candidates = review.get("selected_candidates") or []
+        pick = candidates[0].get("path") if candidates and isinstance(candidates[0], dict) else None
+    return page_dir / str(pick) if pick else None
+
+
+def select_source(
+    page_dir: Path, phase: str, output_files: List[Dict[str, Any]], mode: str
+) -> Tuple[Path, str]:
+    """`(image, how)` to feed downstream of `phase`, chosen from its run's `output_files`."""
+    if not output_files:
+        raise RuntimeError(f"{phase} produced no outputs to select from")
+    produced = {item.get("sha256") for item in output_files if item.get("sha256")}
+
+    if mode in ("auto", "review"):
+        pick = review_pick(page_dir, phase)
+        if pick is not None and pick.is_file() and sha256_file(pick) in produced:
+            return pick, "review"
+        if mode == "review":
+            raise RuntimeError(f"review.json has no pick among this {phase} run's outputs")
+
+    if mode in ("auto", "selected"):
+        selected_dir = page_dir / "selected"
+        candidates = sorted(p for p in selected_dir.iterdir() if p.is_file()) if selected_dir.is_dir() else []
+        for path in candidates:
+            if sha256_file(path) in produced:
+                return path, "selected"
+        if mode == "selected":
+            raise RuntimeError(f"selected/ holds none of this {phase} run's outputs")
+
+    return Path(output_files[0]["path"]), "first"
+
+
+class PagePipeline:
+    """`BatchRunner.on_complete` hook that queues each page's downstream phases.
+
+    `prepare(page, phase, source_image, upstream)` compiles a job (see
+    `prepare_page_job`). Downstream jobs go to the front of the pending
+    queue so pages finish in order while later pages keep the GPU busy.
+    With `front=False` they queue behind the rest, so model affinity can
+    group them.
+    """
+
+    def __init__(
+        self, pipeline: Dict[str, Dict[str, Any]], page_dir_for: Any, prepare: Any, front: bool = True
+    ) -> None:
+        self.pipeline = pipeline
+        self.page_dir_for = page_dir_for
+        self.prepare = prepare
+        self.front = front
+        self.upstreams: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.results: List[Dict[str, Any]] = []
+
+    def skip(self, page: str, phase: str, reason: str) -> None:
+        for child in downstream_of(self.pipeline, phase):
+            self.results.append({"page": page, "phase": child, "status": "skipped", "error": reason})
+            self.skip(page, child, reason)
+
+    def on_complete(self, runner: BatchRunner, result: Dict[str, Any]) -> None:
+        page, phase = result["page"], result["phase"]
+        if result.get("status") not in DONE_STATUSES:
+            self.skip(page, phase, f"upstream {phase} did not complete")
+            return
+        manifest = read_json(Path(result["manifest"]))
+        for child in downstream_of(self.pipeline, phase):
+            try:
+                source, how = select_source(
+                    self.page_dir_for(page), phase, manifest.get("output_files") or [], self.pipeline[child]["select"]
+                )
+                upstream = {"phase": phase, "run_id": manifest.get("run_id"), "selected_by": how, "path": str(source)}
+                job = self.prepare(page, child, source, upstream)
+            except Exception as exc:  # pylint: disable=broad-except
+                self.results.append({"page": page, "phase": child, "status": "error", "error": str(exc)})
+                self.skip(page, child, f"upstream {child} could not be queued")
+                continue
+            self.upstreams[(page, child)] = upstream
+            print(f"next page={page} phase={child} source={source.name} ({how})")
+            runner.add(job, front=self.front)
+
+
+def main() -> int:
+    args = parse_args()
+    books_dir, book_id = resolve_book(args)
+    workflow_dir = Path(args.workflow_dir)
+    comfy_input_dir = Path(args.comfy_input_dir) if args.comfy_input_dir else None
+    uploader = make_source_uploader(args, books_dir)
+    pipeline = load_pipeline(Path(args.pipeline) if args.pipeline else None, args.phases, args.select)
+
+    pages = discover_pages(books_dir, book_id, args.pages)
+    if not pages:
+        raise RuntimeError(f"no pages with renderspec.json found for book {book_id}")
+
+    batch_id = dt.datetime.now(dt.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    started_at = now_utc_iso()
+    client_id = str(uuid.uuid4())
+
+    def page_dir_for(page: str) -> Path:
+        return books_dir / book_id / "pages" / page
+
+    def prepare(page: str, phase: str, source: Optional[Path], upstream: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        return prepare_page_job(
+            book_id=book_id,
+            page=page,
+            phase=phase,
+            renderspec_path=page_dir_for(page) / "renderspec.json",
+            books_dir=books_dir,
+            workflow_dir=workflow_dir,
+            source_image=source,
+            comfy_input_dir=comfy_input_dir,
+            client_id=client_id,
+            uploader=uploader,
+            upstream=upstream,
+            lane=args.lane,
+        )
+
+    scheduler = make_scheduler(args)
+    client = scheduler.client_for(None)
+    driver = PagePipeline(pipeline, page_dir_for, prepare, front=not args.model_affinity)
+    affinity = ModelAffinity(enabled=args.model_affinity, load_seconds=args.model_load_seconds)
+    for server in scheduler.servers:
+        affinity.seed_from_client(server.client)
+    listener = open_listener(args, client_id)
+    runner = BatchRunner(
+        client=client,
+        max_in_flight=args.max_in_flight,
+        timeout_seconds=args.timeout_seconds,
+        poll_seconds=args.poll_seconds,
+        on_complete=driver.on_complete,
+        listener=listener,
+        ws_fallback_seconds=args.ws_fallback_seconds,
+        download_workers=args.download_workers,
+        cache=open_render_cache(args, books_dir),
+        poller=None if listener is not None else make_poller(args, client, books_dir),
+        scheduler=scheduler,
+        affinity=affinity,
+        raw_history=not args.no_raw_history,
+        content_store=not args.no_content_store,
+        metrics=open_metrics(args),
+        cull_distance=cull_distance(args),
+        sheets=make_contact_sheets(args),
+        flight=open_singleflight(args, books_dir),
+    )
+
+    results: List[Dict[str, Any]] = []
+    roots = [phase for phase, spec in pipeline.items() if spec["after"] is None]
+    for pid in pages:
+        for phase in roots:
+            try:
+                runner.add(prepare(pid, phase, pick_source_image(page_dir_for(pid), args.source_glob), None))
+            except Exception as exc:  # pylint: disable=broad-except
+                results.append({"page": pid, "phase": phase, "status": "error", "error": str(exc)})
+                driver.skip(pid, phase, f"upstream {phase} could not be queued")
+    print(f"pipeline {' -> '.join(pipeline)} for {len(pages)} pages ({len(runner.pending)} root jobs)")
+
+    try:
+        results.extend(runner.run())
+    finally:
+        if listener is not None:
+            listener.close()
+    results.extend(driver.results)
+    for result in results:
+        upstream = driver.upstreams.get((result["page"], result["phase"]))
+        if upstream is not None:
+            result["upstream"] = upstream
+
+    order = {phase: idx for idx, phase in enumerate(pipeline)}
+    failed = [r for r in results if r.get("status") in ("error", "skipped")]
+    summary_path = books_dir / book_id / "batches" / f"{batch_id}_pipeline.json"
+    write_json(
+        summary_path,
+        {
+            "batch_id": batch_id,
+            "book_id": book_id,
+            "pipeline": pipeline,
+            "pages": pages,
+            "max_in_flight": args.max_in_flight,
+            "servers": scheduler.report(),
+            "model_affinity": affinity.report(),
+            "started_at_utc": started_at,
+            "completed_at_utc": now_utc_iso(),
+            "results": sorted(results, key=lambda r: (r["page"], order.get(r["phase"], 0))),
+        },
+    )
+
+    for result in failed:
+        print(f"{result['status']}: page={result['page']} phase={result['phase']} {result['error']}", file=sys.stderr)
+    print(f"node_reuse={format_node_reuse(affinity.report())}")
+    print(f"pages={len(pages)} jobs={len(results)} failed={len(failed)}")
+    print(f"pipeline_summary={summary_path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    try:
+        raise SystemExit(main())
+    except Exception as exc:  # pylint: disable=broad-except
+        print(f"error: {exc}", file=sys.stderr)
+        raise SystemExit(1)
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""Validate JSON documents against the skill's schemas without third-party packages.
+
+`compile_schema` turns a schema into a tree of small checker functions once;
+calling the result on a document only walks that tree, so one compiled
+validator can check every renderspec of a book cheaply. Only the JSON Schema
+keywords the files in `schemas/` use (plus their obvious siblings) are
+supported; anything else raises `SchemaError` at compile time instead of
+being silently ignored.
+
+    python orchestrator/schema_validator.py schemas/renderspec.v0.json books/*/pages/*/renderspec.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+Checker = Callable[[Any, str], List[str]]
+
+# Keywords that only describe the schema; they never fail a document.
+ANNOTATIONS = ("$schema", "$id", "$comment", "title", "description", "default", "examples", "format")
+TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, list),
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+    "null": lambda value: value is None,
+}
+
+
+class SchemaError(ValueError):
+    """The schema itself uses something this validator can't check."""
+
+
+def _child(path: str, key: Any) -> str:
+    return f"{path}[{key}]" if isinstance(key, int) else f"{path}.{key}"
+
+
+def _compile(schema: Any, where: str) -> Checker:
+    if schema is True or schema == {}:
+        return lambda value, path: []
+    if schema is False:
+        return lambda value, path: [f"{path}: not allowed"]
+    if not isinstance(schema, dict):
+        raise SchemaError(f"{where}: schema must be an object or boolean")
+
+    type_check = _type(schema["type"], schema, f"{where}.type") if "type" in schema else None
+    checks: List[Checker] = []
+    for keyword, arg in schema.items():
+        if keyword in ANNOTATIONS or keyword == "type":
+            continue
+        factory = _KEYWORDS.get(keyword)
+        if factory is None:
+            raise SchemaError(f"{where}: unsupported keyword {keyword!r}")
+        checks.append(factory(arg, schema, f"{where}.{keyword}"))
+
+    def check(value: Any, path: str) -> List[str]:
+        if type_check is not None:
+            # A wrong type makes every other keyword's message noise.
+            errors = type_check(value, path)
+            if errors:
+                return errors
+        errors = []
+        for keyword_check in checks:
+            errors.extend(keyword_check(value, path))
+        return errors
+
+    return check
+
+
+def _type(arg: Any, schema: Dict[str, Any], where: str) -> Checker:
+    names = [arg] if isinstance(arg, str) else list(arg)
+    unknown = [name for name in names if name not in TYPE_CHECKS]
+    if unknown:
+        raise SchemaError(f"{where}: unknown type {unknown[0]!r}")
+    tests = [TYPE_CHECKS[name] for name in names]
+    expected = " or ".join(names)
+    return lambda value, path: [] if any(test(value) for test in tests) else [f"{path}: expected {expected}"]
+
+
+def _enum(arg: Any, schema: Dict[str, Any], where: str) -> Checker:
+    allowed = list(arg)
+    return lambda value, path: [] if value in allowed else [f"{path}: {value!r} is not one of {allowed}"]
+
+
+def _const(arg: Any, schema: Dict[str, Any], where: str) -> Checker:
+    return lambda value, path: [] if value == arg else [f"{path}: must be {arg!r}"]
+
+
+def _required(arg: Any, schema: Dict[str, Any], where: str) -> Checker:
+    names = list(arg)
+
+    def check(value: Any, path: str) -> List[str]:
+        if not isinstance(value, dict):
+            return []
+        return [f"{_child(path, name)}: required" for name in names if name not in value]
+
+    return check
+
+
+def _properties(arg: Any, schema: Dict[str, Any], where: str) -> Checker:
+    checkers = {name: _compile(sub, f"{where}.{name}") for name, sub in arg.items()}
+
+    def check(value: Any, path: str) -> List[str]:
+        if not isinstance(value, dict):
+            return []
+        errors: List[str] = []
+        for name, checker in checkers.items():
+            if name in value:
+                errors.extend(checker(value[name], _child(path, name)))
+        return errors
+
+    return check
+
+
+def _additional_properties(arg: Any, schema: Dict[str, Any], where: str) -> Checker:
+    known = set(schema.get("properties") or {})
+    checker = _compile(arg, where)
+
+    def check(value: Any, path: str) -> List[str]:
+        if not isinstance(value, dict):
+            return []
+        errors: List[str] = []
+        for name, item in value.items():
+            if name not in known:
+                errors.extend(checker(item, _child(path, name)))
+        return errors
+
+    return check
+
+
+def _items(arg: Any, schema: Dict[str, Any], where: str) -> Checker:
+    checker = _compile(arg, where)
+
+    def check(value: Any, path: str) -> List[str]:
+        if not isinstance(value, list):
+            return []
+        errors: List[str] = []
+        for idx, item in enumerate(value):
+            errors.extend(checker(item, _child(path, idx)))
+        return errors
+
+    return check
+
+
+def _bound(
+    kind: Any, measure: Callable[[Any], Any], ok: Callable[[Any, Any], bool], text: str
+) -> Callable[..., Checker]:
+    def factory(arg: Any, schema: Dict[str, Any], where: str) -> Checker:
+        if not isinstance(arg, (int, float)) or isinstance(arg, bool):
+            raise SchemaError(f"{where}: must be a number")
+
+        def check(value: Any, path: str) -> List[str]:
+            if not isinstance(value, kind) or isinstance(value, bool):
+                return []
+            return [] if ok(measure(value), arg) else [f"{path}: " + text.format(arg)]
+
+        return check
+
+    return factory
+
+
+def _pattern(arg: Any, schema: Dict[str, Any], where: str) -> Checker:
+    regex = re.compile(arg)
+    return lambda value, path: (
+        [] if not isinstance(value, str) or regex.search(value) else [f"{path}: does not match {arg!r}"]
+    )
+
+
+def _combinator(kind: str) -> Callable[..., Checker]:
+    def factory(arg: Any, schema: Dict[str, Any], where: str) -> Checker:
+        branches = [_compile(sub, f"{where}[{idx}]") for idx, sub in enumerate(arg)]
+
+        def check(value: Any, path: str) -> List[str]:
+            if kind == "allOf":
+                return [error for branch in branches for error in branch(value, path)]
+            passed = sum(1 for branch in branches if not branch(value, path))
+            if kind == "anyOf" and passed:
+                return []
+            if kind == "oneOf" and passed == 1:
+                return []
+            detail = "matches none" if not passed else f"matches {passed}"
+            return [f"{path}: {detail} of the {kind} alternatives"]
+
+        return check
+
+    return factory
+
+
+_KEYWORDS: Dict[str, Callable[[Any, Dict[str, Any], str], Checker]] = {
+    "enum": _enum,
+    "const": _const,
+    "required": _required,
+    "properties": _properties,
+    "additionalProperties": _additional_properties,
+    "items": _items,
+    "minItems": _bound(list, len, lambda got, arg: got >= arg, "needs at least {} items"),
+    "maxItems": _bound(list, len, lambda got, arg: got <= arg, "allows at most {} items"),
+    "minLength": _bound(str, len, lambda got, arg: got >= arg, "must be at least {} characters"),
+    "maxLength": _bound(str, len, lambda got, arg: got <= arg, "must be at most {} characters"),
+    "minimum": _bound((int, float), lambda v: v, lambda got, arg: got >= arg, "must be >= {}"),
+    "maximum": _bound((int, float), lambda v: v, lambda got, arg: got <= arg, "must be <= {}"),
+    "pattern": _pattern,
+    "oneOf": _combinator("oneOf"),
+    "anyOf": _combinator("anyOf"),
+    "allOf": _combinator("allOf"),
+}
+
+
+def compile_schema(schema: Any) -> Callable[[Any], List[str]]:
+    """Compile `schema` once; the result returns a list of error strings (empty when valid)."""
+    checker = _compile(schema, "#")
+    return lambda document: checker(document, "$")
+
+
+def load_validator(schema_path: Path) -> Callable[[Any], List[str]]:
+    with schema_path.open("r", encoding="utf-8") as handle:
+        return compile_schema(json.load(handle))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Validate JSON files against one of the skill's schemas.")
+    parser.add_argument("schema", help="Schema file (e.g. schemas/renderspec.v0.json)")
+    parser.add_argument("files", nargs="+", help="JSON documents to validate")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    validate = load_validator(Path(args.schema))
+    failed = 0
+    for name in args.files:
+        with open(name, "r", encoding="utf-8") as handle:
+            errors = validate(json.load(handle))
+        failed += bool(errors)
+        for error in errors:
+            print(f"{name}: {error}")
+    print(f"checked={len(args.files)} invalid={failed}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    try:
+        raise SystemExit(main())
+    except Exception as exc:  # pylint: disable=broad-except
+        print(f"error: {exc}", file=sys.stderr)
+        raise SystemExit(1)
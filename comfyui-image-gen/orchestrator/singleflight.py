@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Share one ComfyUI prompt between concurrent runs of the same compiled workflow.
+
+Two runs of one page and phase that compile to the same workflow hash (two
+agents, or a retry loop) should cost one render. The first run becomes the
+leader: it holds an exclusive `flock` on
+`<books_dir>/.inflight/<hash[:2]>/<hash>.lock` from before the render cache
+check until its run manifest is written or it fails. The lock file's
+content names the leader's job journal.
+
+Any other run that finds the lock held becomes a follower. It reads the
+leader's journal until the `/prompt` response is there, then attaches to
+that `prompt_id` instead of queueing its own. Both runs download the same
+outputs to the same paths, and each writes its own run manifest.
+
+The kernel drops the lock when its holder exits. A crashed leader
+therefore never blocks anyone: the next run just takes over. A leader that
+stays silent for `wait_seconds` without queueing is given up on, and the
+follower queues its own prompt.
+
+To see who holds what:
+
+    python orchestrator/singleflight.py --books-dir books
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import fcntl
+import json
+import os
+import socket
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from job_journal import read_journal
+
+INFLIGHT_DIR = ".inflight"
+DEFAULT_WAIT_SECONDS = 60.0
+CHECK_SECONDS = 0.2
+
+
+def _read_record(handle: Any) -> Dict[str, Any]:
+    """A held lock file's leader record; empty while the leader is still writing it."""
+    handle.seek(0)
+    text = handle.read()
+    try:
+        record = json.loads(text) if text.strip() else {}
+    except json.JSONDecodeError:
+        record = {}
+    return record if isinstance(record, dict) else {}
+
+
+class InflightLock:
+    """The leader's hold on one workflow hash; released explicitly or when the process exits."""
+
+    def __init__(self, path: Path, handle: Any) -> None:
+        self.path = path
+        self._handle = handle
+
+    @property
+    def held(self) -> bool:
+        return self._handle is not None
+
+    def release(self) -> None:
+        if self._handle is None:
+            return
+        handle, self._handle = self._handle, None
+        try:
+            # Emptied first so a reader never mistakes a finished leader for a live one.
+            handle.truncate(0)
+        finally:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            handle.close()
+
+
+class Singleflight:
+    def __init__(self, root: Path, wait_seconds: float = DEFAULT_WAIT_SECONDS) -> None:
+        self.root = root
+        self.wait_seconds = wait_seconds
+
+    def lock_path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.lock"
+
+    def try_lead(self, key: str, holder: Dict[str, Any]) -> Tuple[Optional[InflightLock], Optional[Dict[str, Any]]]:
+        """Take the lock for `key` without blocking.
+
+        Returns `(lock, None)` when this run leads. Otherwise it returns
+        `(None, record)` with the current leader's record, which is empty
+        while that leader is still writing it.
+        """
+        path = self.lock_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        handle = open(path, "a+", encoding="utf-8")
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            record = _read_record(handle)
+            handle.close()
+            return None, record
+        except BaseException:
+            handle.close()
+            raise
+        record = dict(holder)
+        record.update(
+            {
+                "key": key,
+                "pid": os.getpid(),
+                "host": socket.gethostname(),
+                "locked_at_utc": dt.datetime.now(dt.timezone.utc).isoformat(),
+            }
+        )
+        handle.seek(0)
+        handle.truncate(0)
+        handle.write(json.dumps(record, indent=2, ensure_ascii=True) + "\n")
+        handle.flush()
+        return InflightLock(path, handle), None
+
+    def join(self, key: str, holder: Dict[str, Any]) -> Tuple[Optional[InflightLock], Optional[Dict[str, Any]]]:
+        """Lead `key`, or wait for its leader's prompt.
+
+        Returns `(lock, None)` when this run leads. Returns `(None, journal)`
+        with the leader's journal entry once it holds a `prompt_id`. Returns
+        `(None, None)` when the leader queued nothing within `wait_seconds`.
+        If the leader finishes or dies while we wait, this run takes over.
+        """
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            lock, record = self.try_lead(key, holder)
+            if lock is not None:
+                return lock, None
+            entry = leader_journal(record or {})
+            if entry is not None:
+                return None, entry
+            if time.monotonic() >= deadline:
+                return None, None
+            time.sleep(CHECK_SECONDS)
+
+    def holders(self) -> List[Dict[str, Any]]:
+        """Leader records of every lock currently held."""
+        found = []
+        for path in sorted(self.root.glob("*/*.lock")):
+            held, record = self.probe(path)
+            if held and record is not None:
+                found.append(record)
+        return found
+
+    @staticmethod
+    def probe(path: Path) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """`(held, record)` for one lock file, without keeping the lock if it's free."""
+        with open(path, "a+", encoding="utf-8") as handle:
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True, _read_record(handle)
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+        return False, None
+
+
+def leader_journal(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The leader's journal entry once its prompt is queued, else None."""
+    journal_path = record.get("journal_path")
+    if not journal_path:
+        return None
+    try:
+        entry = read_journal(Path(journal_path))
+    except (OSError, json.JSONDecodeError):
+        return None
+    if entry.get("state") not in ("queued", "completed") or not entry.get("prompt_id"):
+        return None
+    entry["journal_path"] = journal_path
+    return entry
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="List runs currently leading an in-flight workflow.")
+    parser.add_argument("--books-dir", default="books", help="Root books directory")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    flight = Singleflight(Path(args.books_dir) / INFLIGHT_DIR)
+    holders = flight.holders()
+    for record in holders:
+        print(
+            f"{record.get('key', '?')[:12]} page={record.get('page')} phase={record.get('phase')} "
+            f"run_id={record.get('run_id')} pid={record.get('pid')} host={record.get('host')}"
+        )
+    print(f"in_flight={len(holders)}")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        raise SystemExit(main())
+    except Exception as exc:  # pylint: disable=broad-except
+        print(f"error: {exc}", file=sys.stderr)
+        raise SystemExit(1)
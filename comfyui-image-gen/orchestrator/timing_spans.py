@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""Per-stage timing spans for page runs, with JSONL and Prometheus textfile export.
+
+A run's wall time is split into spans, recorded in the run manifest under
+`spans` as `{name: {start, seconds, source}}` (`start` in epoch seconds):
+
+- `load`: renderspec/review, source image hash, workflow and bindings files
+- `compile`: applying bindings, hashing and writing the compiled workflow
+- `upload`: `/upload/image` (or the `HEAD /view` that finds it already there)
+- `queue`: the `POST /prompt` call
+- `queue_wait`: queued until ComfyUI started executing the prompt
+- `execute`: ComfyUI executing the prompt
+- `download`: fetching outputs from `/view` and linking them into the content store
+- `cull`: perceptual-hash culling of near-duplicate outputs (`--cull-near-duplicates`)
+- `thumbnails`: review thumbnails and the run's contact sheet (`--contact-sheet`)
+- `write`: render cache entry and raw history archive, up to the manifest itself
+
+`queue_wait` and `execute` come from websocket events when a listener saw
+them, otherwise from the execution timestamps in the `/history` record
+(ComfyUI's clock, so waits are clamped at zero), otherwise from when `/queue`
+first showed the prompt running. Their `source` says which.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import fcntl
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from adaptive_poll import execution_window, parse_utc
+
+
+SPAN_NAMES = ("load", "compile", "upload", "queue", "queue_wait", "execute", "download", "cull", "thumbnails", "write")
+PROM_PREFIX = "comfy_page"
+PROM_LINE_RE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})? (\S+)$")
+PROM_HELP = {
+    f"{PROM_PREFIX}_runs_total": ("counter", "Finished page runs by phase and result"),
+    f"{PROM_PREFIX}_stage_seconds": ("summary", "Seconds spent per run stage"),
+    f"{PROM_PREFIX}_last_stage_seconds": ("gauge", "Stage seconds of the latest run per phase"),
+    f"{PROM_PREFIX}_last_run_timestamp_seconds": ("gauge", "Completion time of the latest run per phase"),
+}
+
+
+class SpanRecorder:
+    """Collects spans for one job; a span recorded twice (a retried upload) accumulates."""
+
+    def __init__(self) -> None:
+        self.spans: Dict[str, Dict[str, Any]] = {}
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.time())
+
+    def add(self, name: str, start: Optional[float], end: Optional[float], source: str = "local") -> None:
+        if start is None or end is None:
+            return
+        seconds = max(0.0, end - start)
+        entry = self.spans.get(name)
+        if entry is None:
+            self.spans[name] = {"start": start, "end": start + seconds, "seconds": seconds, "source": source}
+            return
+        entry["start"] = min(entry["start"], start)
+        entry["end"] = max(entry["end"], start + seconds)
+        entry["seconds"] += seconds
+
+    def end_of(self, name: str) -> Optional[float]:
+        entry = self.spans.get(name)
+        return entry["end"] if entry else None
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        ordered = [name for name in SPAN_NAMES if name in self.spans]
+        ordered += sorted(name for name in self.spans if name not in SPAN_NAMES)
+        return {
+            name: {
+                "start": round(self.spans[name]["start"], 3),
+                "seconds": round(self.spans[name]["seconds"], 4),
+                "source": self.spans[name]["source"],
+            }
+            for name in ordered
+        }
+
+
+def spans_for(job: Dict[str, Any]) -> SpanRecorder:
+    """The job's recorder, created on first use (resumed jobs start without one)."""
+    recorder = job.get("spans")
+    if recorder is None:
+        recorder = job["spans"] = SpanRecorder()
+    return recorder
+
+
+def add_execution_spans(
+    recorder: SpanRecorder,
+    queued_at: Optional[float],
+    history_record: Optional[Dict[str, Any]],
+    ws_timeline: Optional[Dict[str, Any]] = None,
+    running_seen_at: Optional[float] = None,
+    detected_at: Optional[float] = None,
+) -> None:
+    """Add `queue_wait` and `execute` from the best data available (see module docstring)."""
+    ws_timeline = ws_timeline or {}
+    started, finished = ws_timeline.get("started_at"), ws_timeline.get("finished_at")
+    source = "websocket"
+    if started is None or finished is None:
+        started, finished = execution_window(history_record)
+        source = "history"
+        if started is not None and finished is not None and queued_at is not None:
+            # Server clock: keep the durations, but never start before the prompt was queued.
+            execute = max(0.0, finished - started)
+            started = max(queued_at, started)
+            finished = started + execute
+    if started is None or finished is None:
+        started, finished, source = running_seen_at, detected_at, "queue"
+    if started is None:
+        return
+    recorder.add("queue_wait", queued_at, started, source=source)
+    recorder.add("execute", started, finished, source=source)
+
+
+def metrics_record(manifest: Dict[str, Any]) -> Dict[str, Any]:
+    """One flat metrics line for a finished run manifest."""
+    spans = manifest.get("spans") or {}
+    seconds = {name: span.get("seconds") for name, span in spans.items()}
+    return {
+        "book_id": manifest.get("book_id"),
+        "page": manifest.get("page"),
+        "phase": manifest.get("phase"),
+        "run_id": manifest.get("run_id"),
+        "prompt_id": manifest.get("prompt_id"),
+        "comfy_url": manifest.get("comfy_url"),
+        "result": "cache_hit" if manifest.get("cache_hit") else "completed",
+        "completed_at_utc": manifest.get("completed_at_utc"),
+        "total_seconds": round(sum(value for value in seconds.values() if value is not None), 4),
+        "spans": seconds,
+    }
+
+
+def _prom_labels(**labels: str) -> str:
+    escaped = (
+        key + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"' for key, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def read_prom_samples(path: Path) -> Dict[Tuple[str, str], float]:
+    samples: Dict[Tuple[str, str], float] = {}
+    if not path.exists():
+        return samples
+    for line in path.read_text(encoding="utf-8").splitlines():
+        match = PROM_LINE_RE.match(line)
+        if match and match.group(1).startswith(PROM_PREFIX):
+            try:
+                samples[(match.group(1), match.group(2) or "")] = float(match.group(3))
+            except ValueError:
+                continue
+    return samples
+
+
+def format_prom(samples: Dict[Tuple[str, str], float]) -> str:
+    lines: List[str] = []
+    for metric, (kind, text) in PROM_HELP.items():
+        lines.append(f"# HELP {metric} {text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for (name, labels), value in sorted(samples.items()):
+            if name == metric or (kind == "summary" and name in (f"{metric}_sum", f"{metric}_count")):
+                text_value = str(int(value)) if float(value).is_integer() else f"{value:.6f}"
+                lines.append(f"{name}{labels} {text_value}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsSink:
+    """Appends each finished run to a JSONL file and/or folds it into a Prometheus textfile.
+
+    The textfile (for node_exporter's textfile collector) keeps cumulative
+    counters across processes: it's read, updated and atomically replaced
+    under an flock on `<path>.lock`.
+    """
+
+    def __init__(self, jsonl_path: Optional[Path] = None, prom_path: Optional[Path] = None) -> None:
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+
+    def record(self, manifest: Dict[str, Any]) -> None:
+        """Export one run; failures only warn so metrics never fail a render."""
+        record = metrics_record(manifest)
+        try:
+            if self.jsonl_path is not None:
+                self.jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+                with self.jsonl_path.open("a", encoding="utf-8") as handle:
+                    handle.write(json.dumps(record, separators=(",", ":"), ensure_ascii=True) + "\n")
+            if self.prom_path is not None:
+                self._update_prom(record)
+        except OSError as exc:
+            print(f"warning: metrics not exported for run {record['run_id']}: {exc}", file=sys.stderr)
+
+    def _update_prom(self, record: Dict[str, Any]) -> None:
+        path = self.prom_path
+        assert path is not None
+        path.parent.mkdir(parents=True, exist_ok=True)
+        phase = str(record["phase"])
+        with open(f"{path}.lock", "a", encoding="utf-8") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            samples = read_prom_samples(path)
+            runs = (f"{PROM_PREFIX}_runs_total", _prom_labels(phase=phase, result=record["result"]))
+            samples[runs] = samples.get(runs, 0.0) + 1
+            for stage, seconds in record["spans"].items():
+                if seconds is None:
+                    continue
+                labels = _prom_labels(phase=phase, stage=stage)
+                for suffix, value in (("_sum", seconds), ("_count", 1.0)):
+                    key = (f"{PROM_PREFIX}_stage_seconds{suffix}", labels)
+                    samples[key] = samples.get(key, 0.0) + value
+            stale = [key for key in samples if key[0] == f"{PROM_PREFIX}_last_stage_seconds" and f'phase="{phase}"' in key[1]]
+            for key in stale:
+                del samples[key]
+            for stage, seconds in record["spans"].items():
+                if seconds is not None:
+                    samples[(f"{PROM_PREFIX}_last_stage_seconds", _prom_labels(phase=phase, stage=stage))] = seconds
+            completed = parse_utc(record["completed_at_utc"]) or time.time()
+            samples[(f"{PROM_PREFIX}_last_run_timestamp_seconds", _prom_labels(phase=phase))] = round(completed, 3)
+            fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                    handle.write(format_prom(samples))
+                os.chmod(tmp_name, 0o644)
+                os.replace(tmp_name, path)
+            except BaseException:
+                if os.path.exists(tmp_name):
+                    os.unlink(tmp_name)
+                raise
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""Measure orchestrator overhead against in-process fake ComfyUI servers.
+
+Each mode renders the same synthetic book (`--pages` copies of the example
+renderspec with distinct seeds) through the real command-line entry points:
+
+- `single`: one `orchestrator/run_page.py` process per page, run back to back
+- `batch`: one `orchestrator/run_book.py` process for every page
+- `workflow`: one `scripts/run_workflow.py` process per page
+
+Prompts take `--job-seconds` on the fake server (see `fake_comfy_server.py`).
+Whatever wall time goes beyond the time a server was executing counts as
+orchestration overhead. Reported per mode:
+
+- jobs/sec
+- overhead per job
+- pickup latency: from a prompt finishing to its last output being downloaded
+- HTTP requests per job
+- bytes downloaded, apparent size of everything under the book (hardlinks counted per name) and bytes actually on disk
+- peak RSS of the runner processes
+
+    python scripts/bench_orchestrator.py --pages 16 --job-seconds 0.5 --output-bytes 8000000 --json bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from fake_comfy_server import FakeComfy, FakeComfyServer, object_info_for
+
+SKILL_DIR = Path(__file__).resolve().parent.parent
+MODE_CHOICES = ("single", "batch", "workflow")
+BOOK_ID = "bench"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark run_page/run_book/run_workflow against fake ComfyUI servers.")
+    parser.add_argument("--modes", nargs="+", choices=MODE_CHOICES, default=["single", "batch"], help="Modes to run, in order")
+    parser.add_argument("--pages", type=int, default=8, help="Pages (one prompt each) per mode")
+    parser.add_argument("--phase", default="draft", help="Workflow phase every page runs")
+    parser.add_argument("--workflow-dir", default=str(SKILL_DIR / "workflows"), help="Workflow directory")
+    parser.add_argument("--servers", type=int, default=1, help="Fake ComfyUI servers (run_page/run_book dispatch across them)")
+    parser.add_argument("--job-seconds", type=float, default=0.2, help="Fake execution time per prompt")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fake delay added to every HTTP response")
+    parser.add_argument("--outputs", type=int, default=1, help="Images per prompt")
+    parser.add_argument("--output-bytes", type=int, default=4 << 20, help="Bytes per image")
+    parser.add_argument("--max-in-flight", type=int, default=2, help="run_book.py --max-in-flight")
+    parser.add_argument("--poll-seconds", type=float, default=0.5, help="Runner poll interval (initial interval when adaptive)")
+    parser.add_argument("--websocket", action="store_true", help="Pass --websocket to the runners")
+    parser.add_argument(
+        "--runner-arg",
+        action="append",
+        default=[],
+        help="Extra argument for run_page.py/run_book.py (repeatable, e.g. --runner-arg=--no-content-store)",
+    )
+    parser.add_argument("--json", default=None, help="Also write the results to this JSON file")
+    parser.add_argument("--keep-dir", default=None, help="Work here and keep the books afterwards instead of a temp dir")
+    args = parser.parse_args()
+    if args.pages < 1 or args.servers < 1:
+        parser.error("--pages and --servers must be at least 1")
+    return args
+
+
+def build_book(books_dir: Path, pages: int) -> None:
+    template = json.loads((SKILL_DIR / "templates" / "renderspec.example.json").read_text(encoding="utf-8"))
+    for page in range(1, pages + 1):
+        spec = dict(template, book_id=BOOK_ID, page=page, seed=1000 + page)
+        page_dir = books_dir / BOOK_ID / "pages" / f"{page:04d}"
+        page_dir.mkdir(parents=True, exist_ok=True)
+        (page_dir / "renderspec.json").write_text(json.dumps(spec, indent=2) + "\n", encoding="utf-8")
+
+
+def run_child(cmd: List[str]) -> Tuple[int, int]:
+    """Run `cmd`; returns its exit code and peak RSS in KiB (from wait4, so per process)."""
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, cwd=str(SKILL_DIR))
+    stderr = proc.stderr.read() if proc.stderr else b""
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        sys.stderr.write(stderr.decode("utf-8", errors="replace"))
+    return proc.returncode, usage.ru_maxrss
+
+
+def runner_commands(mode: str, args: argparse.Namespace, urls: List[str], books_dir: Path) -> List[List[str]]:
+    common = [
+        "--workflow-dir",
+        args.workflow_dir,
+        "--poll-seconds",
+        str(args.poll_seconds),
+        "--no-cache",
+        "--timeout-seconds",
+        "600",
+    ]
+    for url in urls:
+        common += ["--comfy-url", url]
+    if args.websocket:
+        common.append("--websocket")
+    common += args.runner_arg
+    pages = range(1, args.pages + 1)
+    if mode == "batch":
+        script = str(SKILL_DIR / "orchestrator" / "run_book.py")
+        batch = ["--books-dir", str(books_dir), "--book-id", BOOK_ID, "--phase", args.phase]
+        return [[sys.executable, script, *batch, "--max-in-flight", str(args.max_in_flight), *common]]
+    if mode == "single":
+        script = str(SKILL_DIR / "orchestrator" / "run_page.py")
+        return [
+            [
+                sys.executable,
+                script,
+                *("--books-dir", str(books_dir), "--book-id", BOOK_ID, "--page", str(page), "--phase", args.phase),
+                *("--renderspec", str(books_dir / BOOK_ID / "pages" / f"{page:04d}" / "renderspec.json")),
+                *common,
+            ]
+            for page in pages
+        ]
+    script = str(SKILL_DIR / "scripts" / "run_workflow.py")
+    workflow = str(Path(args.workflow_dir) / f"{args.phase}.api.json")
+    commands = []
+    for page in pages:
+        # run_workflow.py talks to one server; spread pages round-robin.
+        cmd = [sys.executable, script, "--workflow", workflow, "--comfy-url", urls[(page - 1) % len(urls)]]
+        cmd += ["--set", f"31.inputs.seed={1000 + page}", "--out-dir", str(books_dir / "workflow" / f"{page:04d}")]
+        cmd += ["--poll-interval-sec", str(args.poll_seconds)]
+        if args.websocket:
+            cmd.append("--websocket")
+        commands.append(cmd)
+    return commands
+
+
+def busy_seconds(intervals: List[Tuple[float, float]]) -> float:
+    """Length of the union of execution intervals: time at least one server was rendering."""
+    total = 0.0
+    end = None
+    for start, finish in sorted(intervals):
+        if end is None or start > end:
+            total += finish - start
+            end = finish
+        elif finish > end:
+            total += finish - end
+            end = finish
+    return total
+
+
+def disk_usage(root: Path) -> Tuple[int, int]:
+    """(apparent bytes of all files, bytes in distinct inodes) under `root`."""
+    apparent = 0
+    inodes: Dict[Tuple[int, int], int] = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            stat = os.lstat(os.path.join(dirpath, name))
+            apparent += stat.st_size
+            inodes[(stat.st_dev, stat.st_ino)] = stat.st_size
+    return apparent, sum(inodes.values())
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def bench_mode(mode: str, args: argparse.Namespace, work_dir: Path) -> Dict[str, Any]:
+    books_dir = work_dir / mode / "books"
+    build_book(books_dir, args.pages)
+    object_info = object_info_for(Path(args.workflow_dir))
+    servers = [
+        FakeComfyServer(
+            ("127.0.0.1", 0),
+            FakeComfy(
+                job_seconds=args.job_seconds,
+                outputs=args.outputs,
+                output_bytes=args.output_bytes,
+                latency=args.latency_ms / 1000.0,
+                object_info=object_info,
+            ),
+        ).start()
+        for _ in range(args.servers)
+    ]
+    try:
+        commands = runner_commands(mode, args, [server.url for server in servers], books_dir)
+        failures = 0
+        peak_rss = 0
+        started = time.perf_counter()
+        for cmd in commands:
+            code, rss = run_child(cmd)
+            failures += code != 0
+            peak_rss = max(peak_rss, rss)
+        wall = time.perf_counter() - started
+        stats = [server.state.stats() for server in servers]
+    finally:
+        for server in servers:
+            server.stop()
+
+    timings = [timing for stat in stats for timing in stat["timings"].values()]
+    intervals = [(t["started"], t["finished"]) for t in timings if "finished" in t]
+    pickups = [(t["last_fetch"] - t["finished"]) * 1000.0 for t in timings if "last_fetch" in t]
+    jobs = len(intervals)
+    busy = busy_seconds(intervals)
+    requests = sum(count for stat in stats for count in stat["requests"].values())
+    apparent, on_disk = disk_usage(books_dir)
+    return {
+        "mode": mode,
+        "jobs": jobs,
+        "failures": failures,
+        "processes": len(commands),
+        "wall_seconds": round(wall, 3),
+        "busy_seconds": round(busy, 3),
+        "jobs_per_sec": round(jobs / wall, 3) if wall > 0 else None,
+        "overhead_ms_per_job": round((wall - busy) * 1000.0 / jobs, 1) if jobs else None,
+        "pickup_ms_p50": round(statistics.median(pickups), 1) if pickups else None,
+        "pickup_ms_p95": round(percentile(pickups, 95), 1) if pickups else None,
+        "requests_per_job": round(requests / jobs, 1) if jobs else None,
+        "requests": {key: sum(stat["requests"].get(key, 0) for stat in stats) for key in sorted({k for stat in stats for k in stat["requests"]})},
+        "bytes_downloaded": sum(stat["bytes_served"] for stat in stats),
+        "bytes_uploaded": sum(stat["bytes_uploaded"] for stat in stats),
+        "bytes_apparent": apparent,
+        "bytes_on_disk": on_disk,
+        # ru_maxrss is KiB on Linux.
+        "peak_rss_mib": round(peak_rss / 1024.0, 1),
+    }
+
+
+def format_table(results: List[Dict[str, Any]]) -> str:
+    columns = [
+        ("mode", "mode"),
+        ("jobs", "jobs"),
+        ("jobs_per_sec", "jobs/s"),
+        ("overhead_ms_per_job", "overhead ms/job"),
+        ("pickup_ms_p50", "pickup p50 ms"),
+        ("pickup_ms_p95", "pickup p95 ms"),
+        ("requests_per_job", "req/job"),
+        ("bytes_downloaded", "downloaded"),
+        ("bytes_apparent", "apparent"),
+        ("bytes_on_disk", "on disk"),
+        ("peak_rss_mib", "peak RSS MiB"),
+    ]
+    rows = [[label for _, label in columns]]
+    rows += [["-" if result[key] is None else str(result[key]) for key, _ in columns] for result in results]
+    widths = [max(len(row[idx]) for row in rows) for idx in range(len(columns))]
+    return "\n".join("  ".join(cell.rjust(width) for cell, width in zip(row, widths)) for row in rows)
+
+
+def main() -> int:
+    args = parse_args()
+    work_dir = Path(args.keep_dir) if args.keep_dir else Path(tempfile.mkdtemp(prefix="comfy-bench-"))
+    work_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        results = [bench_mode(mode, args, work_dir) for mode in args.modes]
+    finally:
+        if not args.keep_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    print(format_table(results))
+    if args.json:
+        config = {key: value for key, value in vars(args).items() if key not in ("json", "keep_dir")}
+        Path(args.json).write_text(json.dumps({"config": config, "results": results}, indent=2) + "\n", encoding="utf-8")
+    return 1 if any(result["failures"] for result in results) else 0
+
+
+if __name__ == "__main__":
+    try:
+        raise SystemExit(main())
+    except Exception as exc:  # pylint: disable=broad-except
+        print(f"error: {exc}", file=sys.stderr)
+        raise SystemExit(1)
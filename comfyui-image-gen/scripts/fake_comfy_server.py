@@ -0,0 +1,558 @@
+#!/usr/bin/env python3
+"""Stand-in ComfyUI server for exercising the orchestrator without a GPU.
+
+Implements the endpoints the runners use: `POST /prompt`, `GET /history`
+(`?max_items=N`) and `/history/{prompt_id}`, `GET`/`HEAD /view`, `GET /queue`,
+`POST /upload/image`, `GET /ws` (execution events), `/system_stats` and
+`/object_info`. Prompts run one at a time (or `--workers` at once), each taking
+`--job-seconds`; every response is delayed by `--latency-ms`. A prompt queued
+with `"front": true` jumps the pending queue, as in ComfyUI.
+
+Each prompt produces `--outputs` PNG images of `--output-bytes` bytes. Their
+content depends only on the prompt graph, so an identical rerun returns
+identical files. `GET /fake/stats` reports request counts, bytes moved and
+per-prompt timings.
+
+A prompt containing a `FakeError` node fails: it sends `execution_error` and
+its history entry has `status_str: "error"`. In-process users (tests) can
+also turn off `execution_success` events (`legacy_events`, as ComfyUI
+before mid-2024), cut every websocket with `drop_sockets()` and make the next
+requests to an endpoint fail with `fail_next("GET /history/{id}", 500)`.
+
+    python scripts/fake_comfy_server.py --port 8188 --job-seconds 2 --output-bytes 4000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import email.parser
+import hashlib
+import json
+import socket
+import struct
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+IMAGE_SIDE = 64
+VIEW_CHUNK = 1 << 20
+ERROR_CLASS = "FakeError"
+
+
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def fake_png(seed: str, size: int) -> bytes:
+    """A small valid RGB PNG whose pattern derives from `seed`, padded to `size` bytes.
+
+    The padding is a private ancillary chunk, which decoders skip.
+    """
+    digest = hashlib.sha256(seed.encode("utf-8")).digest()
+    rows = []
+    for y in range(IMAGE_SIDE):
+        row = bytearray(b"\x00")
+        for x in range(IMAGE_SIDE):
+            row += bytes(((digest[0] + x * digest[1]) & 0xFF, (digest[2] + y * digest[3]) & 0xFF, (digest[4] + (x ^ y) * digest[5]) & 0xFF))
+        rows.append(bytes(row))
+    header = struct.pack(">IIBBBBB", IMAGE_SIDE, IMAGE_SIDE, 8, 2, 0, 0, 0)
+    body = PNG_SIGNATURE + png_chunk(b"IHDR", header) + png_chunk(b"IDAT", zlib.compress(b"".join(rows)))
+    end = png_chunk(b"IEND", b"")
+    padding = size - len(body) - len(end) - 12
+    if padding >= 0:
+        body += png_chunk(b"fkPd", b"\x00" * padding)
+    return body + end
+
+
+def graph_sha256(graph: Any) -> str:
+    return hashlib.sha256(json.dumps(graph, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def object_info_for(workflow_dir: Optional[Path]) -> Dict[str, Any]:
+    """Minimal `/object_info`: every node class named in `workflow_dir/*.api.json`, with free-form inputs."""
+    classes = {"LoadImage": {"input": {"required": {"image": [[], {"image_upload": True}]}}}}
+    if workflow_dir is not None and workflow_dir.is_dir():
+        for path in sorted(workflow_dir.glob("*.api.json")):
+            try:
+                workflow = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError):
+                continue
+            for node in workflow.values():
+                if isinstance(node, dict) and node.get("class_type"):
+                    classes.setdefault(node["class_type"], {"input": {"required": {}}})
+    return classes
+
+
+class FakeComfy:
+    """Queue, history and counters shared by the request handlers and worker threads."""
+
+    def __init__(
+        self,
+        job_seconds: float = 1.0,
+        outputs: int = 1,
+        output_bytes: int = 1 << 20,
+        latency: float = 0.0,
+        workers: int = 1,
+        vram_free: int = 24 << 30,
+        object_info: Optional[Dict[str, Any]] = None,
+        legacy_events: bool = False,
+    ) -> None:
+        self.job_seconds = job_seconds
+        self.outputs = outputs
+        self.output_bytes = output_bytes
+        self.latency = latency
+        self.workers = max(1, workers)
+        self.vram_free = vram_free
+        self.object_info = object_info if object_info is not None else object_info_for(None)
+        self.legacy_events = legacy_events
+        self.cond = threading.Condition()
+        self.pending: List[List[Any]] = []
+        self.running: List[List[Any]] = []
+        self.history: Dict[str, Dict[str, Any]] = {}
+        # filename -> (prompt id, graph sha256, output index) for `/view`.
+        self.output_names: Dict[str, Tuple[str, str, int]] = {}
+        self.inputs: Dict[Tuple[str, str], bytes] = {}
+        self.timings: Dict[str, Dict[str, float]] = {}
+        self.requests: Dict[str, int] = {}
+        # "METHOD endpoint" -> [HTTP status, requests left to fail]
+        self.failures: Dict[str, List[int]] = {}
+        self.bytes_served = 0
+        self.bytes_uploaded = 0
+        self.number = 0
+        self.sockets: Dict[str, Any] = {}
+        self.socket_locks: Dict[str, threading.Lock] = {}
+        self._stopped = False
+
+    def start_workers(self) -> None:
+        for idx in range(self.workers):
+            threading.Thread(target=self._worker, name=f"fake-comfy-{idx}", daemon=True).start()
+
+    def stop(self) -> None:
+        with self.cond:
+            self._stopped = True
+            self.cond.notify_all()
+
+    def count(self, endpoint: str) -> None:
+        with self.cond:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def fail_next(self, endpoint: str, status: int = 500, times: int = 1) -> None:
+        """Answer the next `times` requests to `endpoint` ("GET /queue") with HTTP `status`."""
+        with self.cond:
+            self.failures[endpoint] = [status, times]
+
+    def take_failure(self, endpoint: str) -> Optional[int]:
+        with self.cond:
+            failure = self.failures.get(endpoint)
+            if not failure or failure[1] <= 0:
+                return None
+            failure[1] -= 1
+            return failure[0]
+
+    def queue_prompt(self, prompt: Dict[str, Any], client_id: Optional[str], front: bool = False) -> Dict[str, Any]:
+        prompt_id = str(uuid.uuid4())
+        with self.cond:
+            self.number += 1
+            # Like ComfyUI: `front` negates the number and the queue runs lowest number first.
+            number = -self.number if front else self.number
+            item = [number, prompt_id, prompt, {"client_id": client_id}, []]
+            self.pending.append(item)
+            self.pending.sort(key=lambda queued: queued[0])
+            self.timings[prompt_id] = {"queued": time.time()}
+            self.cond.notify()
+            return {"prompt_id": prompt_id, "number": number, "node_errors": {}}
+
+    def queue_state(self) -> Dict[str, Any]:
+        with self.cond:
+            return {"queue_running": list(self.running), "queue_pending": list(self.pending)}
+
+    def history_items(self, max_items: Optional[int] = None) -> Dict[str, Any]:
+        with self.cond:
+            items = list(self.history.items())
+        return dict(items[-max_items:] if max_items else items)
+
+    def output_body(self, filename: str) -> Optional[bytes]:
+        with self.cond:
+            key = self.output_names.get(filename)
+        if key is None:
+            return None
+        return fake_png(f"{key[1]}:{key[2]}", self.output_bytes)
+
+    def mark_fetched(self, filename: str, size: int) -> None:
+        with self.cond:
+            self.bytes_served += size
+            key = self.output_names.get(filename)
+            if key is not None:
+                self.timings[key[0]]["last_fetch"] = time.time()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.cond:
+            return {
+                "requests": dict(self.requests),
+                "bytes_served": self.bytes_served,
+                "bytes_uploaded": self.bytes_uploaded,
+                "prompts": len(self.timings),
+                "timings": {pid: dict(timing) for pid, timing in self.timings.items()},
+            }
+
+    def send_event(self, client_id: Optional[str], event_type: str, data: Dict[str, Any]) -> None:
+        sock = self.sockets.get(client_id or "")
+        if sock is None:
+            return
+        payload = json.dumps({"type": event_type, "data": data}).encode("utf-8")
+        if len(payload) < 126:
+            header = bytes([0x81, len(payload)])
+        elif len(payload) < 1 << 16:
+            header = bytes([0x81, 126]) + struct.pack(">H", len(payload))
+        else:
+            header = bytes([0x81, 127]) + struct.pack(">Q", len(payload))
+        try:
+            with self.socket_locks[client_id]:
+                sock.sendall(header + payload)
+        except (OSError, KeyError):
+            self.sockets.pop(client_id, None)
+
+    def drop_sockets(self) -> None:
+        """Cut every websocket, as a restarting server or flaky proxy would."""
+        with self.cond:
+            sockets, self.sockets = list(self.sockets.values()), {}
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _fail(self, item: List[Any], node_id: str, started: float) -> None:
+        _, prompt_id, graph, extra, _ = item
+        message = str((graph[node_id].get("inputs") or {}).get("message") or "fake failure")
+        finished = time.time()
+        error = {
+            "prompt_id": prompt_id,
+            "node_id": node_id,
+            "node_type": ERROR_CLASS,
+            "exception_type": "RuntimeError",
+            "exception_message": message,
+            "timestamp": int(finished * 1000),
+        }
+        record = {
+            "prompt": item,
+            "outputs": {},
+            "status": {
+                "status_str": "error",
+                "completed": False,
+                "messages": [
+                    ["execution_start", {"prompt_id": prompt_id, "timestamp": int(started * 1000)}],
+                    ["execution_error", error],
+                ],
+            },
+        }
+        with self.cond:
+            self.running.remove(item)
+            self.history[prompt_id] = record
+            self.timings[prompt_id]["finished"] = finished
+        self.send_event(extra.get("client_id"), "execution_error", error)
+        # ComfyUI ends every prompt, failed or not, with `executing` for node None.
+        self.send_event(extra.get("client_id"), "executing", {"node": None, "prompt_id": prompt_id})
+
+    def _worker(self) -> None:
+        while True:
+            with self.cond:
+                while not self.pending and not self._stopped:
+                    self.cond.wait()
+                if self._stopped:
+                    return
+                item = self.pending.pop(0)
+                self.running.append(item)
+            _, prompt_id, graph, extra, _ = item
+            client_id = extra.get("client_id")
+            started = time.time()
+            with self.cond:
+                self.timings[prompt_id]["started"] = started
+            self.send_event(client_id, "execution_start", {"prompt_id": prompt_id, "timestamp": int(started * 1000)})
+            for node_id in graph:
+                self.send_event(client_id, "executing", {"node": node_id, "prompt_id": prompt_id})
+            time.sleep(self.job_seconds)
+            failing = next((nid for nid, node in graph.items() if node.get("class_type") == ERROR_CLASS), None)
+            if failing is not None:
+                self._fail(item, failing, started)
+                continue
+            finished = time.time()
+            sha = graph_sha256(graph)
+            images = []
+            for idx in range(self.outputs):
+                name = f"fake_{prompt_id[:8]}_{idx:05d}_.png"
+                images.append({"filename": name, "subfolder": "", "type": "output"})
+            save_node = next((nid for nid, node in graph.items() if "Save" in str(node.get("class_type", ""))), "9")
+            record = {
+                "prompt": item,
+                "outputs": {save_node: {"images": images}},
+                "status": {
+                    "status_str": "success",
+                    "completed": True,
+                    "messages": [
+                        ["execution_start", {"prompt_id": prompt_id, "timestamp": int(started * 1000)}],
+                        ["execution_success", {"prompt_id": prompt_id, "timestamp": int(finished * 1000)}],
+                    ],
+                },
+            }
+            with self.cond:
+                self.running.remove(item)
+                for idx, image in enumerate(images):
+                    self.output_names[image["filename"]] = (prompt_id, sha, idx)
+                self.history[prompt_id] = record
+                self.timings[prompt_id]["finished"] = finished
+            self.send_event(client_id, "executed", {"node": save_node, "prompt_id": prompt_id, "output": {"images": images}})
+            if not self.legacy_events:
+                self.send_event(client_id, "execution_success", {"prompt_id": prompt_id, "timestamp": int(finished * 1000)})
+            self.send_event(client_id, "executing", {"node": None, "prompt_id": prompt_id})
+
+
+class FakeComfyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; Nagle would hold the body for the client's delayed ACK.
+    disable_nagle_algorithm = True
+    server: "FakeComfyServer"
+    injected_status: Optional[int] = None
+
+    def log_message(self, format: str, *args: Any) -> None:  # pylint: disable=redefined-builtin
+        pass
+
+    @property
+    def state(self) -> FakeComfy:
+        return self.server.state
+
+    def _route(self) -> Tuple[str, Dict[str, List[str]]]:
+        parsed = urllib.parse.urlparse(self.path)
+        endpoint = "/history/{id}" if parsed.path.startswith("/history/") else parsed.path
+        self.state.count(f"{self.command} {endpoint}")
+        self.injected_status = self.state.take_failure(f"{self.command} {endpoint}")
+        if self.state.latency > 0:
+            time.sleep(self.state.latency)
+        return parsed.path, urllib.parse.parse_qs(parsed.query)
+
+    def _fail_injected(self) -> bool:
+        """Send the error `fail_next` asked for, if any; True when the request is answered."""
+        if self.injected_status is None:
+            return False
+        self._send_json({"error": {"type": "fake_failure", "message": "injected"}}, self.injected_status)
+        return True
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_json(self, payload: Any, status: int = 200) -> None:
+        self._send(status, json.dumps(payload).encode("utf-8"))
+
+    def _view(self, query: Dict[str, List[str]]) -> None:
+        filename = query.get("filename", [""])[0]
+        kind = query.get("type", ["output"])[0]
+        if kind == "input":
+            body = self.state.inputs.get((query.get("subfolder", [""])[0], filename))
+        else:
+            body = self.state.output_body(filename)
+        if body is None:
+            self._send(404, b"Not Found", "text/plain")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+        for offset in range(0, len(body), VIEW_CHUNK):
+            self.wfile.write(body[offset : offset + VIEW_CHUNK])
+        if kind != "input":
+            self.state.mark_fetched(filename, len(body))
+
+    def _websocket(self, query: Dict[str, List[str]]) -> None:
+        client_id = query.get("clientId", [uuid.uuid4().hex])[0]
+        key = self.headers.get("Sec-WebSocket-Key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode("ascii")).digest()).decode("ascii")
+        self.send_response(101)
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.wfile.flush()
+        self.state.socket_locks.setdefault(client_id, threading.Lock())
+        self.state.sockets[client_id] = self.connection
+        self.state.send_event(client_id, "status", {"status": {"exec_info": {"queue_remaining": 0}}, "sid": client_id})
+        try:
+            # Client frames (pings, close) are only read to notice the disconnect.
+            while self.connection.recv(4096):
+                pass
+        except OSError:
+            pass
+        if self.state.sockets.get(client_id) is self.connection:
+            self.state.sockets.pop(client_id, None)
+        self.close_connection = True
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        path, query = self._route()
+        if self._fail_injected():
+            return
+        if path == "/ws":
+            self._websocket(query)
+        elif path == "/prompt":
+            self._send_json({"exec_info": {"queue_remaining": len(self.state.pending) + len(self.state.running)}})
+        elif path == "/history":
+            max_items = query.get("max_items", [""])[0]
+            self._send_json(self.state.history_items(int(max_items) if max_items.isdigit() else None))
+        elif path.startswith("/history/"):
+            prompt_id = path[len("/history/") :]
+            record = self.state.history_items().get(prompt_id)
+            self._send_json({prompt_id: record} if record else {})
+        elif path == "/view":
+            self._view(query)
+        elif path == "/queue":
+            self._send_json(self.state.queue_state())
+        elif path == "/system_stats":
+            self._send_json(
+                {
+                    "system": {"os": "fake", "comfyui_version": "fake"},
+                    "devices": [{"name": "fake", "type": "cuda", "vram_total": self.state.vram_free, "vram_free": self.state.vram_free}],
+                }
+            )
+        elif path == "/object_info":
+            self._send_json(self.state.object_info)
+        elif path == "/fake/stats":
+            self._send_json(self.state.stats())
+        else:
+            self._send(404, b"Not Found", "text/plain")
+
+    def do_HEAD(self) -> None:  # pylint: disable=invalid-name
+        path, query = self._route()
+        if self._fail_injected():
+            return
+        if path == "/view":
+            self._view(query)
+        else:
+            self._send(404, b"", "text/plain")
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        path, _ = self._route()
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self._fail_injected():
+            return
+        if path == "/prompt":
+            try:
+                payload = json.loads(raw or b"{}")
+            except json.JSONDecodeError:
+                self._send_json({"error": {"type": "invalid_json", "message": "Invalid JSON"}, "node_errors": {}}, 400)
+                return
+            prompt = payload.get("prompt") if isinstance(payload, dict) else None
+            if not isinstance(prompt, dict) or not prompt:
+                self._send_json({"error": {"type": "no_prompt", "message": "No prompt provided"}, "node_errors": {}}, 400)
+                return
+            front = bool(payload.get("front"))
+            self._send_json(self.state.queue_prompt(prompt, payload.get("client_id"), front=front))
+        elif path == "/upload/image":
+            self._upload(raw)
+        elif path == "/interrupt":
+            self._send(200, b"")
+        else:
+            self._send(404, b"Not Found", "text/plain")
+
+    def _upload(self, raw: bytes) -> None:
+        head = f"Content-Type: {self.headers.get('Content-Type', '')}\r\n\r\n".encode("latin-1")
+        message = email.parser.BytesParser().parsebytes(head + raw)
+        fields: Dict[str, Any] = {}
+        filename = None
+        for part in message.get_payload() if message.is_multipart() else []:
+            name = part.get_param("name", header="content-disposition")
+            fields[name] = part.get_payload(decode=True)
+            if name == "image":
+                filename = part.get_filename()
+        if not filename or fields.get("image") is None:
+            self._send(400, b"Bad Request", "text/plain")
+            return
+        subfolder = (fields.get("subfolder") or b"").decode("utf-8")
+        with self.state.cond:
+            self.state.inputs[(subfolder, filename)] = fields["image"]
+            self.state.bytes_uploaded += len(fields["image"])
+        self._send_json({"name": filename, "subfolder": subfolder, "type": "input"})
+
+
+class FakeComfyServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], state: FakeComfy) -> None:
+        super().__init__(address, FakeComfyHandler)
+        self.state = state
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeComfyServer":
+        """Serve on a background thread (for in-process use, e.g. benchmarks)."""
+        self.state.start_workers()
+        threading.Thread(target=self.serve_forever, name="fake-comfy-http", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.state.stop()
+        self.shutdown()
+        self.server_close()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run a stand-in ComfyUI server that returns generated PNGs.")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address")
+    parser.add_argument("--port", type=int, default=8188, help="Bind port (0 picks a free one)")
+    parser.add_argument("--job-seconds", type=float, default=1.0, help="Execution time of every prompt")
+    parser.add_argument("--workers", type=int, default=1, help="Prompts executed at once (ComfyUI runs one)")
+    parser.add_argument("--outputs", type=int, default=1, help="Images produced per prompt")
+    parser.add_argument("--output-bytes", type=int, default=1 << 20, help="Size of each output image")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to every HTTP response")
+    parser.add_argument(
+        "--workflow-dir",
+        default=None,
+        help="Advertise the node classes used by <dir>/*.api.json in /object_info (for multi-server dispatch)",
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    state = FakeComfy(
+        job_seconds=args.job_seconds,
+        outputs=args.outputs,
+        output_bytes=args.output_bytes,
+        latency=args.latency_ms / 1000.0,
+        workers=args.workers,
+        object_info=object_info_for(Path(args.workflow_dir) if args.workflow_dir else None),
+    )
+    server = FakeComfyServer((args.host, args.port), state)
+    state.start_workers()
+    print(f"fake ComfyUI listening on {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        raise SystemExit(main())
+    except Exception as exc:  # pylint: disable=broad-except
+        print(f"error: {exc}", file=sys.stderr)
+        raise SystemExit(1)
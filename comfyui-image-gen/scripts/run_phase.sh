@@ -14,6 +14,7 @@ RENDERSPEC=""
 REVIEW=""
 SOURCE_IMAGE=""
 COMFY_INPUT_DIR=""
+UPLOAD_SOURCE=0
 BOOKS_DIR="${BOOKS_DIR:-}"
 DRY_RUN=0
 
@@ -31,9 +32,10 @@ Optional:
   --review PATH
   --source-image PATH
   --comfy-input-dir PATH     (optional: copy source image for Comfy LoadImage)
+  --upload-source            (optional: upload source image via /upload/image instead)
   --books-dir PATH           (default: BOOKS_DIR env or ./books)
   --repo PATH                (default: pipeline auto-detect from cwd)
-  --comfy-url URL            (default: COMFY_URL env or http://127.0.0.1:8188)
+  --comfy-url URL            (default: COMFY_URL env or http://127.0.0.1:8188; comma-separate for several servers)
   --dry-run
 USAGE
 }
@@ -63,6 +65,7 @@ while [[ $# -gt 0 ]]; do
     --review) REVIEW="$2"; shift 2 ;;
     --source-image) SOURCE_IMAGE="$2"; shift 2 ;;
     --comfy-input-dir) COMFY_INPUT_DIR="$2"; shift 2 ;;
+    --upload-source) UPLOAD_SOURCE=1; shift ;;
     --books-dir) BOOKS_DIR="$2"; shift 2 ;;
     --repo) PIPELINE_REPO="$2"; shift 2 ;;
     --comfy-url) COMFY_URL="$2"; shift 2 ;;
@@ -112,6 +115,9 @@ fi
 if [ -n "$COMFY_INPUT_DIR" ]; then
   cmd+=(--comfy-input-dir "$COMFY_INPUT_DIR")
 fi
+if [ "$UPLOAD_SOURCE" -eq 1 ]; then
+  cmd+=(--upload-source)
+fi
 if [ "$DRY_RUN" -eq 1 ]; then
   cmd+=(--dry-run)
 fi
@@ -2,15 +2,20 @@
 from __future__ import annotations
 
 import argparse
+import concurrent.futures
 import json
 import os
 from pathlib import Path
 import sys
 import time
 import urllib.parse
-import urllib.request
 import uuid
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "orchestrator"))
+from adaptive_poll import AdaptivePoller, PollTracker  # noqa: E402
+from comfy_http import download_to_file, pool_for_url  # noqa: E402
+from comfy_ws import ComfyEventListener  # noqa: E402
+
 
 def die(msg: str, code: int = 1) -> None:
     print(f"[ERROR] {msg}", file=sys.stderr)
@@ -22,18 +27,12 @@ def http_json(method: str, url: str, payload: dict | None = None, timeout: float
     headers = {"Content-Type": "application/json"}
     if payload is not None:
         data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(url=url, data=data, method=method, headers=headers)
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        raw = resp.read().decode("utf-8")
+    pool, path = pool_for_url(url, timeout=timeout)
+    _, body = pool.request(method, path, body=data, headers=headers, timeout=timeout)
+    raw = body.decode("utf-8")
     return json.loads(raw) if raw else {}
 
 
-def http_bytes(url: str, timeout: float = 30.0) -> bytes:
-    req = urllib.request.Request(url=url, method="GET")
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        return resp.read()
-
-
 def parse_value(raw: str):
     low = raw.lower()
     if low in {"true", "false", "null"}:
@@ -105,7 +104,18 @@ def main() -> None:
     ap.add_argument("--out-dir", help="Directory to download output images")
     ap.add_argument("--timeout-sec", type=float, default=600.0)
     ap.add_argument("--poll-interval-sec", type=float, default=1.0)
+    ap.add_argument(
+        "--poll-mode",
+        choices=("adaptive", "fixed"),
+        default="adaptive",
+        help="adaptive: check /queue and only read /history once the prompt left it; fixed: poll /history",
+    )
+    ap.add_argument("--expected-runtime-sec", type=float, help="Typical run time; lets adaptive polling back off while executing")
+    ap.add_argument("--max-poll-interval-sec", type=float, default=30.0)
     ap.add_argument("--request-timeout-sec", type=float, default=30.0)
+    ap.add_argument("--websocket", action="store_true", help="Wait on /ws completion events; /history polling stays as fallback")
+    ap.add_argument("--ws-fallback-sec", type=float, default=30.0)
+    ap.add_argument("--download-workers", type=int, default=4)
     ap.add_argument("--save-final-workflow", help="Optional path to save post-binding workflow JSON")
     ap.add_argument("--dry-run", action="store_true")
     args = ap.parse_args()
@@ -144,6 +154,13 @@ def main() -> None:
         )
         return
 
+    listener = None
+    if args.websocket:
+        listener = ComfyEventListener(args.comfy_url, args.client_id, connect_timeout=args.request_timeout_sec)
+        if not listener.start():
+            print(f"[WARN] websocket unavailable ({listener.last_error}); polling /history", file=sys.stderr)
+            listener = None
+
     queue_url = f"{args.comfy_url.rstrip('/')}/prompt"
     try:
         queued = http_json("POST", queue_url, payload=payload, timeout=args.request_timeout_sec)
@@ -155,11 +172,31 @@ def main() -> None:
         die(f"Queue response missing prompt_id: {queued}")
     prompt_id = str(prompt_id)
 
+    poller = None
+    if args.poll_mode == "adaptive" and listener is None:
+        queue_state_url = f"{args.comfy_url.rstrip('/')}/queue"
+        poller = AdaptivePoller(
+            lambda: http_json("GET", queue_state_url, timeout=args.request_timeout_sec),
+            runtimes={"workflow": [args.expected_runtime_sec]} if args.expected_runtime_sec else None,
+            fallback_seconds=args.poll_interval_sec,
+            min_seconds=min(0.25, args.poll_interval_sec),
+            max_seconds=args.max_poll_interval_sec,
+        )
+    tracker = poller.tracker("workflow") if poller else PollTracker("websocket" if listener else "fixed")
+
     start = time.time()
     history_entry = None
     status = "unknown"
 
     while time.time() - start <= args.timeout_sec:
+        state, ahead = "absent", 0
+        if poller is not None:
+            state, ahead = poller.locate(prompt_id, tracker)
+            if state != "absent":
+                status = state
+                time.sleep(poller.schedule(tracker, state, ahead))
+                continue
+        tracker.history_polls += 1
         hist_url = f"{args.comfy_url.rstrip('/')}/history/{urllib.parse.quote(prompt_id)}"
         try:
             hist = http_json("GET", hist_url, timeout=args.request_timeout_sec)
@@ -183,29 +220,49 @@ def main() -> None:
                 history_entry = entry
                 break
 
-        time.sleep(args.poll_interval_sec)
+        event_status = listener.status(prompt_id) if listener else None
+        if event_status in {"error", "interrupted"}:
+            die(f"Run failed with status={event_status}: {listener.error_message(prompt_id)}")
+        if event_status == "success":
+            time.sleep(min(args.poll_interval_sec, 0.2))
+        elif listener is not None and listener.connected:
+            listener.wait([prompt_id], timeout=min(args.ws_fallback_sec, max(0.0, args.timeout_sec - (time.time() - start))))
+        elif poller is not None:
+            time.sleep(poller.schedule(tracker, "absent", 0))
+        else:
+            time.sleep(args.poll_interval_sec)
+
+    if listener is not None:
+        listener.close()
 
     if history_entry is None:
         die(f"Timed out waiting for prompt_id={prompt_id} (last_status={status})")
+    tracker.detected_at = time.time()
+    poll_stats = tracker.summary(history_entry)
 
     images = gather_images(history_entry)
     downloads = []
+    hashes: dict = {}
 
     if args.out_dir and images:
         out_dir = Path(args.out_dir)
         out_dir.mkdir(parents=True, exist_ok=True)
-        for item in images:
+
+        def fetch(item: dict) -> dict:
             params = {
                 "filename": item["filename"],
                 "subfolder": item["subfolder"],
                 "type": item["type"],
             }
             view_url = f"{args.comfy_url.rstrip('/')}/view?{urllib.parse.urlencode(params)}"
-            data = http_bytes(view_url, timeout=args.request_timeout_sec)
+            pool, path = pool_for_url(view_url, max_size=max(4, args.download_workers), timeout=args.request_timeout_sec)
             safe_name = f"{prompt_id}_{item['node_id']}_{item['index']}_{os.path.basename(item['filename'])}"
-            path = out_dir / safe_name
-            path.write_bytes(data)
-            downloads.append(str(path))
+            return download_to_file(pool, path, out_dir / safe_name, timeout=args.request_timeout_sec)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, args.download_workers)) as pool:
+            results = list(pool.map(fetch, images))
+        downloads = [r["path"] for r in results]
+        hashes = {r["path"]: r["sha256"] for r in results}
 
     print(
         json.dumps(
@@ -216,6 +273,8 @@ def main() -> None:
                 "image_count": len(images),
                 "images": images,
                 "downloads": downloads,
+                "sha256": hashes,
+                "poll_stats": poll_stats,
             },
             ensure_ascii=True,
         )
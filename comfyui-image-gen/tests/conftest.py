@@ -0,0 +1,77 @@
+"""Shared fixtures: an in-process fake ComfyUI server (`scripts/fake_comfy_server.py`)."""
+
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import pytest
+
+SKILL_DIR = Path(__file__).resolve().parent.parent
+# The orchestrator modules import their siblings by plain name, as when run as scripts.
+for subdir in ("orchestrator", "scripts"):
+    if str(SKILL_DIR / subdir) not in sys.path:
+        sys.path.insert(0, str(SKILL_DIR / subdir))
+
+from fake_comfy_server import ERROR_CLASS, FakeComfy, FakeComfyServer, object_info_for  # noqa: E402
+
+WORKFLOW_DIR = SKILL_DIR / "workflows"
+BOOK_ID = "testbook"
+
+
+def save_graph(tag: str = "test") -> Dict[str, Any]:
+    """Smallest graph the fake server renders: one SaveImage node."""
+    return {"9": {"class_type": "SaveImage", "inputs": {"filename_prefix": tag}}}
+
+
+def failing_graph(message: str = "boom") -> Dict[str, Any]:
+    graph = save_graph("fails")
+    graph["5"] = {"class_type": ERROR_CLASS, "inputs": {"message": message}}
+    return graph
+
+
+def make_book(books_dir: Path, pages: int = 3, same_as: Optional[Dict[int, int]] = None) -> Path:
+    """Pages `0001..` from the example renderspec, each with its own seed (or page `same_as[n]`'s spec)."""
+    template = json.loads((SKILL_DIR / "templates" / "renderspec.example.json").read_text(encoding="utf-8"))
+    for number in range(1, pages + 1):
+        source = (same_as or {}).get(number, number)
+        spec = dict(template, book_id=BOOK_ID, page=source, seed=1000 + source)
+        page_dir = books_dir / BOOK_ID / "pages" / f"{number:04d}"
+        page_dir.mkdir(parents=True, exist_ok=True)
+        (page_dir / "renderspec.json").write_text(json.dumps(spec, indent=2), encoding="utf-8")
+    return books_dir
+
+
+def run_book(books_dir: Path, servers: List[FakeComfyServer], *extra: str) -> int:
+    """`run_book.py` in-process for `BOOK_ID`'s draft phase against `servers`."""
+    import run_book as module  # pylint: disable=import-outside-toplevel
+
+    argv = ["run_book.py", "--books-dir", str(books_dir), "--book-id", BOOK_ID, "--phase", "draft"]
+    argv += ["--workflow-dir", str(WORKFLOW_DIR), "--poll-seconds", "0.05", "--timeout-seconds", "60"]
+    for server in servers:
+        argv += ["--comfy-url", server.url]
+    saved, sys.argv = sys.argv, argv + list(extra)
+    try:
+        return module.main()
+    finally:
+        sys.argv = saved
+
+
+@pytest.fixture
+def fake_comfy() -> Iterator[Callable[..., FakeComfyServer]]:
+    """Factory: `fake_comfy(**FakeComfy kwargs)` starts a server on a free port; all are stopped afterwards."""
+    servers: List[FakeComfyServer] = []
+
+    def start(**kwargs: Any) -> FakeComfyServer:
+        kwargs.setdefault("job_seconds", 0.05)
+        kwargs.setdefault("output_bytes", 4096)
+        kwargs.setdefault("object_info", object_info_for(WORKFLOW_DIR))
+        server = FakeComfyServer(("127.0.0.1", 0), FakeComfy(**kwargs)).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
@@ -0,0 +1,137 @@
+"""`AsyncComfyClient` against the in-process fake ComfyUI server."""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import stat
+import uuid
+from pathlib import Path
+
+import pytest
+
+from comfy_async import AsyncComfyClient
+from comfy_scheduler import is_server_error
+from conftest import failing_graph, save_graph
+from run_page import ComfyApiError, collect_output_refs
+
+
+def test_queue_and_wait_returns_history_record(fake_comfy):
+    server = fake_comfy()
+
+    async def scenario():
+        async with AsyncComfyClient(server.url) as client:
+            response = await client.queue_prompt(save_graph(), client_id="c1")
+            record = await client.wait(response["prompt_id"], timeout_seconds=10, poll_seconds=0.02)
+            queue = await client.get_queue()
+            return response, record, queue
+
+    response, record, queue = asyncio.run(scenario())
+    assert isinstance(response["prompt_id"], str) and response["number"] == 1
+    assert record["status"]["status_str"] == "success"
+    assert [ref["filename"] for ref in collect_output_refs(record)] == [f"fake_{response['prompt_id'][:8]}_00000_.png"]
+    assert queue == {"queue_running": [], "queue_pending": []}
+
+
+def test_front_prompt_is_queued_ahead(fake_comfy):
+    server = fake_comfy(job_seconds=0.3)
+
+    async def scenario():
+        async with AsyncComfyClient(server.url) as client:
+            await client.queue_prompt(save_graph("running"), client_id="c1")
+            await asyncio.sleep(0.1)
+            back = await client.queue_prompt(save_graph("back"), client_id="c1")
+            front = await client.queue_prompt(save_graph("front"), client_id="c1", front=True)
+            queue = await client.get_queue()
+            return back, front, queue
+
+    back, front, queue = asyncio.run(scenario())
+    assert [item[1] for item in queue["queue_pending"]] == [front["prompt_id"], back["prompt_id"]]
+
+
+def test_run_prompt_fan_out_under_bounds(fake_comfy):
+    server = fake_comfy(job_seconds=0.02, workers=4)
+
+    async def scenario():
+        async with AsyncComfyClient(server.url, max_connections=2, max_outstanding=4) as client:
+            return await asyncio.gather(
+                *(client.run_prompt(save_graph(f"p{idx}"), client_id="c1", poll_seconds=0.02) for idx in range(12))
+            )
+
+    results = asyncio.run(scenario())
+    assert len({prompt_id for prompt_id, _ in results}) == 12
+    assert all(record["status"]["status_str"] == "success" for _, record in results)
+    assert server.state.stats()["requests"]["POST /prompt"] == 12
+
+
+def test_download_output_streams_to_disk(fake_comfy, tmp_path: Path):
+    server = fake_comfy(output_bytes=300_000)
+
+    async def scenario():
+        async with AsyncComfyClient(server.url) as client:
+            _, record = await client.run_prompt(save_graph(), client_id="c1", poll_seconds=0.02)
+            ref = collect_output_refs(record)[0]
+            body = await client.fetch_output(ref)
+            info = await client.download_output(ref, tmp_path / "out" / "001.png")
+            return body, info
+
+    body, info = asyncio.run(scenario())
+    target = tmp_path / "out" / "001.png"
+    assert info == {"path": str(target), "bytes": 300_000, "sha256": hashlib.sha256(body).hexdigest()}
+    assert target.read_bytes() == body
+    assert stat.S_IMODE(target.stat().st_mode) == 0o644
+    assert list(target.parent.iterdir()) == [target]
+
+
+def test_http_400_is_a_workflow_error_not_a_server_failure(fake_comfy):
+    server = fake_comfy()
+
+    async def scenario():
+        async with AsyncComfyClient(server.url) as client:
+            await client.queue_prompt({}, client_id="c1")
+
+    with pytest.raises(ComfyApiError) as excinfo:
+        asyncio.run(scenario())
+    assert excinfo.value.status == 400
+    assert "no_prompt" in str(excinfo.value)
+    assert not is_server_error(excinfo.value)
+
+
+def test_missing_output_is_http_404(fake_comfy, tmp_path: Path):
+    server = fake_comfy()
+    ref = {"filename": "missing.png", "subfolder": "", "type": "output"}
+
+    async def scenario():
+        async with AsyncComfyClient(server.url) as client:
+            await client.download_output(ref, tmp_path / "missing.png")
+
+    with pytest.raises(ComfyApiError) as excinfo:
+        asyncio.run(scenario())
+    assert excinfo.value.status == 404
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_failed_prompt_raises_from_wait(fake_comfy):
+    server = fake_comfy()
+
+    async def scenario():
+        async with AsyncComfyClient(server.url) as client:
+            await client.run_prompt(failing_graph(), client_id="c1", poll_seconds=0.02)
+
+    with pytest.raises(RuntimeError, match="failed with status error"):
+        asyncio.run(scenario())
+
+
+def test_unreachable_server_is_a_server_failure(fake_comfy):
+    server = fake_comfy()
+    url = server.url
+    server.stop()
+
+    async def scenario():
+        async with AsyncComfyClient(url, request_timeout=2) as client:
+            await client.get_prompt_history(str(uuid.uuid4()))
+
+    with pytest.raises(ComfyApiError) as excinfo:
+        asyncio.run(scenario())
+    assert excinfo.value.status is None
+    assert is_server_error(excinfo.value)
@@ -0,0 +1,96 @@
+"""`ConnectionPool` retry rules: a request that reached the server is only resent if it is idempotent."""
+
+from __future__ import annotations
+
+import asyncio
+import http.server
+import threading
+from typing import Dict, Iterator
+
+import pytest
+
+from comfy_async import AsyncComfyClient
+from comfy_http import ConnectionPool, ResponseLostError, pool_for_url
+from run_page import ComfyApiError, ComfyClient
+
+
+class DroppingHandler(http.server.BaseHTTPRequestHandler):
+    """Answers most paths; reads `/drop` and `/prompt` requests and closes the socket once without replying."""
+
+    protocol_version = "HTTP/1.1"
+    counts: Dict[str, int] = {}
+
+    def log_message(self, format: str, *args: object) -> None:  # pylint: disable=redefined-builtin
+        pass
+
+    def _handle(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        key = f"{self.command} {self.path}"
+        self.counts[key] = self.counts.get(key, 0) + 1
+        if self.path in ("/drop", "/prompt") and self.counts[key] == 1:
+            self.close_connection = True
+            return
+        body = b"{}"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+@pytest.fixture
+def dropping_server() -> Iterator[str]:
+    DroppingHandler.counts = {}
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), DroppingHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_post_is_not_resent_after_reaching_server(dropping_server):
+    pool = ConnectionPool(dropping_server, max_size=1, timeout=5)
+    pool.request("GET", "/ok")
+    with pytest.raises(ResponseLostError):
+        pool.request("POST", "/drop", body=b"{}", headers={"Content-Type": "application/json"})
+    assert DroppingHandler.counts["POST /drop"] == 1
+
+
+def test_client_marks_lost_prompt_response_ambiguous(dropping_server):
+    client = ComfyClient(dropping_server, pool_size=1, request_timeout=5)
+    client.get_queue()
+    with pytest.raises(ComfyApiError) as excinfo:
+        client.queue_prompt({}, "c1")
+    assert excinfo.value.ambiguous and excinfo.value.status is None
+
+
+def test_get_is_retried_on_reused_socket(dropping_server):
+    pool = ConnectionPool(dropping_server, max_size=1, timeout=5)
+    pool.request("GET", "/ok")
+    status, _ = pool.request("GET", "/drop")
+    assert status == 200
+    assert DroppingHandler.counts["GET /drop"] == 2
+
+
+def test_async_post_is_not_resent_after_reaching_server(dropping_server):
+    async def scenario() -> None:
+        async with AsyncComfyClient(dropping_server, max_connections=1, request_timeout=5) as client:
+            await client.get_queue()
+            await client.queue_prompt({}, "c1")
+
+    with pytest.raises(ComfyApiError):
+        asyncio.run(scenario())
+    assert DroppingHandler.counts["POST /prompt"] == 1
+
+
+def test_pool_for_url_grows_existing_pool(dropping_server):
+    pool, _ = pool_for_url(f"{dropping_server}/prompt", timeout=5)
+    assert pool.max_size == 4
+    same, path = pool_for_url(f"{dropping_server}/view?filename=x.png", max_size=9, timeout=5)
+    assert same is pool and pool.max_size == 9
+    assert path == "/view?filename=x.png"
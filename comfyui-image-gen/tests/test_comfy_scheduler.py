@@ -0,0 +1,89 @@
+"""Which `dispatch` failures drain a server and move on, and which fail the job where it is."""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List
+
+import pytest
+
+from comfy_scheduler import ComfyScheduler
+from conftest import BOOK_ID, make_book, run_book
+from run_page import ComfyApiError
+
+
+class StubClient:
+    """Healthy, idle server; `submit` decides what dispatching to it does."""
+
+    def __init__(self, url: str) -> None:
+        self.base_url = url
+
+    def get_queue(self) -> Dict[str, Any]:
+        return {"queue_running": [], "queue_pending": []}
+
+    def get_system_stats(self) -> Dict[str, Any]:
+        return {"devices": []}
+
+    def get_object_info(self) -> Dict[str, Any]:
+        return {"SaveImage": {"input": {"required": {}}}}
+
+
+def dispatch_with(error: BaseException):
+    scheduler = ComfyScheduler(["http://a", "http://b"], StubClient)
+    tried: List[str] = []
+
+    def submit(client: StubClient, job: Dict[str, Any]) -> str:
+        tried.append(client.base_url)
+        if client.base_url == "http://a":
+            raise error
+        return "prompt-b"
+
+    job = {"compiled_workflow": {"9": {"class_type": "SaveImage", "inputs": {}}}}
+    return scheduler, tried, lambda: scheduler.dispatch(job, submit)
+
+
+def test_server_error_drains_and_moves_on():
+    scheduler, tried, dispatch = dispatch_with(ComfyApiError("POST /prompt failed: HTTP 502", status=502))
+    assert dispatch() == "prompt-b"
+    assert tried == ["http://a", "http://b"]
+    assert not scheduler.by_url["http://a"].healthy
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        OSError("No space left on device"),
+        ComfyApiError("POST /prompt failed: HTTP 400 invalid prompt", status=400),
+        KeyError("compiled_workflow"),
+    ],
+)
+def test_local_and_workflow_errors_fail_without_draining(error):
+    scheduler, tried, dispatch = dispatch_with(error)
+    with pytest.raises(type(error)):
+        dispatch()
+    assert tried == ["http://a"]
+    assert scheduler.healthy_count() == 2
+
+
+def test_lost_response_is_not_sent_twice():
+    scheduler, tried, dispatch = dispatch_with(ComfyApiError("POST /prompt failed: timed out", ambiguous=True))
+    with pytest.raises(ComfyApiError):
+        dispatch()
+    assert tried == ["http://a"]
+    assert not scheduler.by_url["http://a"].healthy
+
+
+def test_batch_requeues_after_5xx(fake_comfy, tmp_path):
+    # The first server (most free VRAM) takes the job, then fails every /history read.
+    failing = fake_comfy(job_seconds=0.2)
+    healthy = fake_comfy(job_seconds=0.2, vram_free=1 << 30)
+    failing.state.fail_next("GET /history/{id}", 500, times=100)
+    books = make_book(tmp_path / "books", pages=1)
+    assert run_book(books, [failing, healthy], "--no-cache", "--no-model-affinity") == 0
+
+    assert failing.state.stats()["requests"].get("POST /prompt") == 1
+    assert healthy.state.stats()["requests"].get("POST /prompt") == 1
+    (journal,) = (books / BOOK_ID / "pages" / "0001" / "jobs").glob("*.journal.json")
+    entry = json.loads(journal.read_text(encoding="utf-8"))
+    assert entry["state"] == "completed"
+    assert entry["comfy_url"] == healthy.url
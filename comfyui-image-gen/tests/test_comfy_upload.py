@@ -0,0 +1,36 @@
+"""`UploadIndex` merges entries written by concurrent processes."""
+
+from __future__ import annotations
+
+import multiprocessing
+from pathlib import Path
+
+from comfy_upload import UploadIndex
+
+
+def _put_many(path: str, server: str, count: int) -> None:
+    index = UploadIndex(Path(path))
+    for n in range(count):
+        index.put(server, f"{n:064x}", {"name": f"src_{n}.png"})
+
+
+def test_concurrent_processes_merge(tmp_path: Path) -> None:
+    path = tmp_path / ".comfy_uploads.json"
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=_put_many, args=(str(path), f"http://s{w}", 40)) for w in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+        assert worker.exitcode == 0
+
+    index = UploadIndex(path)
+    for w in range(4):
+        assert all(index.get(f"http://s{w}", f"{n:064x}") for n in range(40))
+
+
+def test_forget_removes_entry(tmp_path: Path) -> None:
+    index = UploadIndex(tmp_path / ".comfy_uploads.json")
+    index.put("http://s", "ab", {"name": "src_ab.png"})
+    index.forget("http://s", "ab")
+    assert index.get("http://s", "ab") is None
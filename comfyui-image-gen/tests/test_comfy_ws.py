@@ -0,0 +1,135 @@
+"""Websocket completion (`ComfyEventListener`) against the in-process fake ComfyUI server."""
+
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+
+import pytest
+
+from comfy_ws import ComfyEventListener, ListenerGroup
+from conftest import failing_graph, make_book, run_book, save_graph
+from run_page import ComfyClient, wait_for_all, wait_for_completion
+
+
+def listen(url: str) -> ComfyEventListener:
+    listener = ComfyEventListener(url, str(uuid.uuid4()), connect_timeout=5)
+    assert listener.start(), listener.last_error
+    return listener
+
+
+def test_executing_null_node_marks_success(fake_comfy):
+    # Without `execution_success` (older ComfyUI), `executing` with node None is the only completion signal.
+    server = fake_comfy(legacy_events=True)
+    client = ComfyClient(server.url)
+    with listen(server.url) as listener:
+        prompt_id = client.queue_prompt(save_graph(), listener.client_id)["prompt_id"]
+        assert listener.wait([prompt_id], timeout=10)
+        timeline = listener.timeline(prompt_id)
+        record = wait_for_completion(
+            client, prompt_id, timeout_seconds=10, poll_seconds=0.05, listener=listener, ws_fallback_seconds=30
+        )
+    assert listener.status(prompt_id) == "success"
+    assert timeline["executed_nodes"] == 1
+    assert timeline["finished_at"] >= timeline["started_at"]
+    assert record["status"]["status_str"] == "success"
+
+
+def test_execution_error_fails_the_wait(fake_comfy):
+    server = fake_comfy()
+    client = ComfyClient(server.url)
+    with listen(server.url) as listener:
+        prompt_id = client.queue_prompt(failing_graph("out of memory"), listener.client_id)["prompt_id"]
+        assert listener.wait([prompt_id], timeout=10)
+        # The trailing `executing` (node None) must not turn the failure into a success.
+        time.sleep(0.1)
+        assert listener.status(prompt_id) == "error"
+        assert listener.error_message(prompt_id) == "out of memory"
+        with pytest.raises(RuntimeError, match="failed with status error: out of memory"):
+            wait_for_completion(client, prompt_id, timeout_seconds=10, poll_seconds=0.05, listener=listener)
+
+
+def test_burst_reads_history_per_completion(fake_comfy):
+    # Each completion event should cost that prompt's own /history read, not one for every prompt still waiting.
+    server = fake_comfy(job_seconds=0.05)
+    client = ComfyClient(server.url)
+    with listen(server.url) as listener:
+        prompt_ids = [client.queue_prompt(save_graph(f"v{n}"), listener.client_id)["prompt_id"] for n in range(12)]
+        done = list(wait_for_all(client, prompt_ids, timeout_seconds=30, poll_seconds=0.05, listener=listener))
+    assert sorted(pid for pid, record, error in done if record and not error) == sorted(prompt_ids)
+    history_reads = server.state.stats()["requests"].get("GET /history/{id}", 0)
+    # One initial check each (catches prompts finished before the wait), then one per completion plus a few retries.
+    assert history_reads <= 3 * len(prompt_ids)
+
+
+def test_dropped_socket_falls_back_to_history(fake_comfy):
+    server = fake_comfy(job_seconds=0.5)
+    client = ComfyClient(server.url)
+    listener = listen(server.url)
+    try:
+        prompt_id = client.queue_prompt(save_graph(), listener.client_id)["prompt_id"]
+        time.sleep(0.1)
+        server.state.drop_sockets()
+        started = time.monotonic()
+        # A 30 s fallback interval would stall this if the lost socket were still trusted.
+        record = wait_for_completion(
+            client, prompt_id, timeout_seconds=10, poll_seconds=0.05, listener=listener, ws_fallback_seconds=30
+        )
+        assert time.monotonic() - started < 5
+        assert not listener.connected
+        assert listener.status(prompt_id) != "success"
+        assert record["status"]["status_str"] == "success"
+    finally:
+        listener.close()
+    # A fresh listener reconnects and sees the next prompt's events.
+    with listen(server.url) as again:
+        prompt_id = client.queue_prompt(save_graph("again"), again.client_id)["prompt_id"]
+        assert again.wait([prompt_id], timeout=10)
+        assert again.status(prompt_id) == "success"
+
+
+def test_unreachable_server_reports_no_socket(fake_comfy):
+    server = fake_comfy()
+    url = server.url
+    server.stop()
+    listener = ComfyEventListener(url, "c1", connect_timeout=2)
+    assert not listener.start()
+    assert listener.last_error
+    assert not listener.wait(["anything"], timeout=0.1)
+
+
+def test_listener_group_spans_servers(fake_comfy):
+    servers = [fake_comfy(), fake_comfy()]
+    client_id = str(uuid.uuid4())
+    group = ListenerGroup([server.url for server in servers], client_id, connect_timeout=5)
+    assert group.start()
+    try:
+        prompt_ids = [ComfyClient(server.url).queue_prompt(save_graph(), client_id)["prompt_id"] for server in servers]
+        deadline = time.monotonic() + 10
+        while any(group.status(pid) != "success" for pid in prompt_ids) and time.monotonic() < deadline:
+            group.wait(prompt_ids, timeout=1)
+        assert [group.status(pid) for pid in prompt_ids] == ["success", "success"]
+        servers[0].state.drop_sockets()
+        time.sleep(0.2)
+        assert group.connected
+        assert not group.connected_for(servers[0].url)
+        assert group.connected_for(servers[1].url)
+    finally:
+        group.close()
+    assert not group.connected
+
+
+def test_batch_polls_jobs_on_a_server_whose_socket_dropped(fake_comfy, tmp_path):
+    # With one socket still up, jobs on the other server must not wait for the 30 s event fallback.
+    servers = [fake_comfy(job_seconds=1.0), fake_comfy(job_seconds=1.0)]
+    books = make_book(tmp_path / "books", pages=2)
+    timer = threading.Timer(0.5, servers[0].state.drop_sockets)
+    timer.start()
+    started = time.monotonic()
+    try:
+        assert run_book(books, servers, "--websocket", "--ws-fallback-seconds", "30", "--no-cache", "--no-model-affinity", "--max-in-flight", "1") == 0
+    finally:
+        timer.cancel()
+    assert time.monotonic() - started < 15
+    assert all(server.state.stats()["requests"].get("POST /prompt") == 1 for server in servers)
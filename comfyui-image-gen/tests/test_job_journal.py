@@ -0,0 +1,42 @@
+"""Job journal durability and `--resume` re-attach."""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import List
+
+import job_journal
+from conftest import BOOK_ID, make_book, run_book
+from job_journal import read_journal, update_journal
+
+
+def test_write_fsyncs_the_directory(tmp_path: Path, monkeypatch) -> None:
+    synced: List[Path] = []
+    monkeypatch.setattr(job_journal, "fsync_dir", synced.append)
+    path = tmp_path / "pages" / "0001" / "jobs" / "run_draft.journal.json"
+    update_journal(path, "compiled", page="0001")
+    # A new jobs/ dir is itself an entry in the page dir.
+    assert synced == [path.parent, path.parent.parent]
+    update_journal(path, "queued", prompt_id="p1")
+    assert synced[2:] == [path.parent]
+    assert read_journal(path)["state"] == "queued"
+    assert not [p for p in path.parent.iterdir() if p != path]
+
+
+def test_resume_reattaches_to_queued_prompt(fake_comfy, tmp_path: Path) -> None:
+    # A run that gives up waiting leaves its journal `queued`; --resume must wait on that prompt, not queue anew.
+    server = fake_comfy(job_seconds=2.5)
+    books = make_book(tmp_path / "books", pages=1)
+    assert run_book(books, [server], "--no-cache", "--timeout-seconds", "1") != 0
+    jobs_dir = books / BOOK_ID / "pages" / "0001" / "jobs"
+    (journal,) = jobs_dir.glob("*.journal.json")
+    queued = read_journal(journal)
+    assert queued["state"] == "queued"
+
+    assert run_book(books, [server], "--no-cache", "--resume") == 0
+    assert server.state.stats()["requests"]["POST /prompt"] == 1
+    done = read_journal(journal)
+    assert done["state"] == "completed"
+    assert done["prompt_id"] == queued["prompt_id"]
+    (manifest,) = jobs_dir.glob(f"*_draft_{queued['prompt_id']}.json")
+    assert manifest.is_file()
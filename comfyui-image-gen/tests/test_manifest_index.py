@@ -0,0 +1,66 @@
+"""Adaptive-poll runtimes read from the manifest index match the manifest scan."""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import uuid
+from pathlib import Path
+
+import pytest
+
+from adaptive_poll import load_phase_runtimes
+from manifest_index import ManifestIndex, index_path_for, load_runtimes, read_only_query
+
+
+def write_manifest(jobs_dir: Path, minute: int, phase: str, seconds: int, **extra: object) -> None:
+    run_id = f"20260101T00{minute:02d}00Z"
+    manifest = {
+        "book_id": "book",
+        "page": "0001",
+        "phase": phase,
+        "run_id": run_id,
+        "queued_at_utc": f"2026-01-01T00:{minute:02d}:00+00:00",
+        "completed_at_utc": f"2026-01-01T00:{minute:02d}:{seconds:02d}+00:00",
+        **extra,
+    }
+    path = jobs_dir / f"{run_id}_{phase}_{uuid.uuid4()}.json"
+    path.write_text(json.dumps(manifest), encoding="utf-8")
+
+
+def make_books(tmp_path: Path) -> Path:
+    books = tmp_path / "books"
+    jobs = books / "book" / "pages" / "0001" / "jobs"
+    jobs.mkdir(parents=True)
+    for minute in range(6):
+        write_manifest(jobs, minute, "draft", 10 + minute)
+    write_manifest(jobs, 7, "refine", 30)
+    write_manifest(jobs, 8, "refine", 40, cache_hit=True)
+    return books
+
+
+def test_index_runtimes_match_scan(tmp_path: Path) -> None:
+    books = make_books(tmp_path)
+    with ManifestIndex(index_path_for(books)) as index:
+        index.scan(books)
+        assert index.phase_runtimes(samples=3) == load_phase_runtimes(books, samples=3)
+    assert load_runtimes(books, samples=3) == {"draft": [15.0, 14.0, 13.0], "refine": [30.0]}
+
+
+def test_load_runtimes_without_index_scans(tmp_path: Path) -> None:
+    books = make_books(tmp_path)
+    assert load_runtimes(books) == load_phase_runtimes(books)
+    assert not index_path_for(books).exists()
+
+
+def test_sql_query_is_read_only(tmp_path: Path) -> None:
+    books = make_books(tmp_path)
+    with ManifestIndex(index_path_for(books)) as index:
+        index.scan(books)
+    columns, rows = read_only_query(index_path_for(books), "SELECT count(*) AS runs FROM runs")
+    assert columns == ["runs"] and rows == [(8,)]
+    for statement in ("DELETE FROM runs", "DROP TABLE runs", f"ATTACH '{tmp_path / 'x.db'}' AS x"):
+        with pytest.raises(sqlite3.DatabaseError):
+            read_only_query(index_path_for(books), statement)
+    assert read_only_query(index_path_for(books), "SELECT count(*) FROM runs")[1] == [(8,)]
+    assert not (tmp_path / "x.db").exists()
@@ -0,0 +1,59 @@
+"""Render cache hits skip ComfyUI; eviction counts only bytes the cache alone keeps on disk."""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from pathlib import Path
+
+from conftest import BOOK_ID, make_book, run_book
+from render_cache import RenderCache, sha256_file
+
+
+def render(page_dir: Path, name: str, size: int) -> dict:
+    page_dir.mkdir(parents=True, exist_ok=True)
+    path = page_dir / name
+    path.write_bytes(os.urandom(size))
+    return {"path": str(path), "bytes": size, "sha256": sha256_file(path)}
+
+
+def last_used(cache: RenderCache, key: str, seconds_ago: float) -> None:
+    stamp = time.time() - seconds_ago
+    os.utime(cache.entry_dir(key) / "entry.json", (stamp, stamp))
+
+
+def test_hardlinked_outputs_are_not_counted(tmp_path: Path) -> None:
+    cache = RenderCache(tmp_path / "cache", max_bytes=1500)
+    first = render(tmp_path / "page1", "a.png", 1000)
+    cache.store("aa" + "0" * 62, [first], {})
+    second = render(tmp_path / "page2", "b.png", 1000)
+    cache.store("bb" + "0" * 62, [second], {})
+    last_used(cache, "aa" + "0" * 62, 60)
+    last_used(cache, "bb" + "0" * 62, 30)
+    # Both files are still linked from their page dirs: 2000 bytes on disk, nothing evictable.
+    assert cache.evict() == []
+    assert (cache.entry_dir("aa" + "0" * 62) / "entry.json").is_file()
+
+    os.unlink(first["path"])
+    os.unlink(second["path"])
+    # Now only the cache holds them; the older entry goes.
+    assert cache.evict() == ["aa" + "0" * 62]
+    assert cache.lookup("bb" + "0" * 62) is not None
+
+
+def test_rerun_is_served_from_cache_without_prompt(fake_comfy, tmp_path: Path) -> None:
+    server = fake_comfy()
+    books = make_book(tmp_path / "books", pages=2)
+    assert run_book(books, [server]) == 0
+    assert server.state.stats()["requests"]["POST /prompt"] == 2
+
+    assert run_book(books, [server]) == 0
+    assert server.state.stats()["requests"]["POST /prompt"] == 2
+    for page in ("0001", "0002"):
+        page_dir = books / BOOK_ID / "pages" / page
+        (hit,) = (page_dir / "jobs").glob("*_draft_cache_hit.json")
+        manifest = json.loads(hit.read_text(encoding="utf-8"))
+        assert manifest["cache_hit"] is True and manifest["output_files"]
+        for item in manifest["output_files"]:
+            assert sha256_file(Path(item["path"])) == item["sha256"]
@@ -0,0 +1,47 @@
+"""Lanes: interactive jobs overtake queued bulk work, within the in-flight bounds."""
+
+from __future__ import annotations
+
+import uuid
+from pathlib import Path
+
+from conftest import BOOK_ID, WORKFLOW_DIR, make_book
+from run_book import BatchRunner
+from run_page import ComfyClient, prepare_page_job
+
+
+def test_interactive_job_overtakes_bulk(fake_comfy, tmp_path: Path) -> None:
+    server = fake_comfy(job_seconds=0.3)
+    books = make_book(tmp_path / "books", pages=4)
+    client_id = str(uuid.uuid4())
+
+    def job(page: str, lane: str) -> dict:
+        return prepare_page_job(
+            book_id=BOOK_ID,
+            page=page,
+            phase="draft",
+            renderspec_path=books / BOOK_ID / "pages" / page / "renderspec.json",
+            books_dir=books,
+            workflow_dir=WORKFLOW_DIR,
+            client_id=client_id,
+            lane=lane,
+        )
+
+    runner = BatchRunner(ComfyClient(server.url), max_in_flight=2, timeout_seconds=60, poll_seconds=0.05)
+    bulk = [job(page, "bulk") for page in ("0001", "0002", "0003")]
+    for item in bulk:
+        runner.add(item)
+    runner._fill()  # pylint: disable=protected-access
+    assert [item.get("prompt_id") is not None for item in bulk] == [True, True, False]
+
+    # The server is at --max-in-flight with one bulk prompt still pending on it.
+    urgent = job("0004", "interactive")
+    runner.add(urgent)
+    runner._fill()  # pylint: disable=protected-access
+    assert urgent.get("prompt_id") and not bulk[2].get("prompt_id")
+
+    results = runner.run()
+    assert sorted(result["status"] for result in results) == ["completed"] * 4
+    timings = server.state.stats()["timings"]
+    started = sorted((timings[item["prompt_id"]]["started"], item["page"]) for item in bulk + [urgent])
+    assert [page for _, page in started] == ["0001", "0004", "0002", "0003"]
@@ -0,0 +1,28 @@
+"""Singleflight: a job whose workflow is already rendering follows the leader's prompt."""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from conftest import BOOK_ID, make_book, run_book
+
+
+def test_follower_attaches_to_leader_prompt(fake_comfy, tmp_path: Path) -> None:
+    server = fake_comfy(job_seconds=0.5)
+    # Pages 1 and 2 compile to the same workflow; page 3 differs.
+    books = make_book(tmp_path / "books", pages=3, same_as={2: 1})
+    assert run_book(books, [server], "--no-cache") == 0
+    assert server.state.stats()["requests"]["POST /prompt"] == 2
+
+    entries = {}
+    for page in ("0001", "0002"):
+        (journal,) = (books / BOOK_ID / "pages" / page / "jobs").glob("*.journal.json")
+        entries[page] = json.loads(journal.read_text(encoding="utf-8"))
+        assert entries[page]["state"] == "completed"
+        # The follower downloads the shared outputs into its own page.
+        assert list((books / BOOK_ID / "pages" / page / "draft").glob("*.png"))
+    leader, follower = entries["0001"], entries["0002"]
+    assert follower["prompt_id"] == leader["prompt_id"]
+    assert follower["run_manifest"]["singleflight"]["leader_run_id"] == leader["run_id"]
+    assert follower["run_manifest"]["workflow_hash"] == leader["run_manifest"]["workflow_hash"]